@@ -0,0 +1,82 @@
+"""
+Runs the benchmark suite on a synthetic registry and prints one json result per line.
+
+    python -m benchmark --components 1000 --scenario parse --scenario set_interface
+
+A scenario is selected by its name or a prefix of it, by default all are run. The database scenarios
+recreate the tables of the database of APP_CONFIG, which defaults to service.config.TestConfig here.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+from benchmark.scenarios import SCENARIOS
+from benchmark.synthetic import generate_components
+from benchmark.timing import print_result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', help=f'one of {", ".join(SCENARIOS)} or a prefix')
+    parser.add_argument('--components', type=int, default=1000)
+    parser.add_argument('--interfaces', type=int, default=10, help='interfaces produced per component')
+    parser.add_argument('--consumed', type=int, default=10, help='interfaces consumed per component')
+    parser.add_argument('--overlap', type=float, default=1.0, help='fraction of the interfaces that are consumed')
+    parser.add_argument('--deprecated-ratio', type=float, default=0.1)
+    parser.add_argument('--optional-ratio', type=float, default=0.1)
+    parser.add_argument('--sample', type=int, default=50, help='components written per run of a write scenario')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write all results as one json document to this file')
+    args = parser.parse_args()
+
+    prefixes = args.scenario or ['']
+    unknown = [prefix for prefix in prefixes if not any(name.startswith(prefix) for name in SCENARIOS)]
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(unknown)}')
+    selected = [name for name in SCENARIOS if any(name.startswith(prefix) for prefix in prefixes)]
+
+    components = generate_components(
+        args.components, args.interfaces, args.consumed, args.seed,
+        overlap=args.overlap, deprecated_ratio=args.deprecated_ratio, optional_ratio=args.optional_ratio,
+    )
+    parameters = dict(
+        components=args.components,
+        interfaces=args.interfaces,
+        consumed=args.consumed,
+        overlap=args.overlap,
+        deprecated_ratio=args.deprecated_ratio,
+        optional_ratio=args.optional_ratio,
+        seed=args.seed,
+    )
+    results = []
+    for name in selected:
+        for result in SCENARIOS[name](components, args, parameters):
+            print_result(result)
+            results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(dict(
+                revision=git_revision(),
+                python=sys.version,
+                platform=platform.platform(),
+                results=results,
+            ), output, indent=2)
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('APP_CONFIG', 'service.config.TestConfig')
+    main()
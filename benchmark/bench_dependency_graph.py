@@ -0,0 +1,41 @@
+"""
+Benchmark of building and traversing the dependency graph of a synthetic registry.
+
+    python -m benchmark.bench_dependency_graph --components 10000
+"""
+import argparse
+import random
+
+from benchmark.synthetic import generate_components
+from benchmark.timing import measure, print_result
+from service.util.dependency_graph import DependencyGraph, DOWNSTREAM, UPSTREAM
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--components', type=int, default=10000)
+    parser.add_argument('--interfaces', type=int, default=5, help='interfaces produced per component')
+    parser.add_argument('--consumed', type=int, default=3, help='interfaces consumed per component')
+    parser.add_argument('--depth', type=int, default=None, help='max depth of the traversals')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    components = generate_components(args.components, args.interfaces, args.consumed)
+    parameters = dict(components=args.components, interfaces=args.interfaces, consumed=args.consumed)
+
+    print_result(measure('dependency_graph.build', lambda: DependencyGraph(components), args.repeat, **parameters))
+    graph = DependencyGraph(components)
+    names = random.Random(0).sample(graph.component_names, min(100, graph.num_components))
+    for direction in (DOWNSTREAM, UPSTREAM):
+        print_result(measure(
+            f'dependency_graph.component_impact.{direction}',
+            lambda: [graph.component_impact(name, direction, args.depth) for name in names],
+            args.repeat,
+            traversals=len(names),
+            depth=args.depth,
+            **parameters,
+        ))
+
+
+if __name__ == '__main__':
+    main()
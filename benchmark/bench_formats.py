@@ -0,0 +1,56 @@
+"""
+Benchmark of the response formats of the component listing: payload size and time to serialize, compress and decode.
+
+    python -m benchmark.bench_formats --components 1000
+"""
+import argparse
+import zlib
+
+from benchmark.synthetic import generate_components
+from benchmark.timing import measure, print_result
+from service.util.component_formats import available_mimetypes, deserialize_components, serialize_components
+
+COMPRESSIONS = (
+    ('identity', None),
+    ('gzip', 16 + zlib.MAX_WBITS),
+    ('deflate', zlib.MAX_WBITS),
+)
+
+
+def compress(body: bytes, wbits: int) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    return compressor.compress(body) + compressor.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--components', type=int, default=1000)
+    parser.add_argument('--interfaces', type=int, default=10, help='interfaces produced per component')
+    parser.add_argument('--consumed', type=int, default=10, help='interfaces consumed per component')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    components = generate_components(args.components, args.interfaces, args.consumed)
+    parameters = dict(
+        components=args.components,
+        records=sum(len(component.consumers) + len(component.producers) for component in components),
+    )
+    for mimetype in available_mimetypes():
+        body = serialize_components(components, mimetype)
+        if deserialize_components(body, mimetype) != components:
+            raise AssertionError(f'{mimetype} does not round trip')
+        result = measure(f'formats.serialize.{mimetype}', lambda: serialize_components(components, mimetype),
+                         args.repeat, **parameters)
+        result['bytes'] = len(body)
+        for encoding, wbits in COMPRESSIONS[1:]:
+            result[f'bytes_{encoding}'] = len(compress(body, wbits))
+        print_result(result)
+        print_result(measure(f'formats.deserialize.{mimetype}', lambda: deserialize_components(body, mimetype),
+                             args.repeat, **parameters))
+        for encoding, wbits in COMPRESSIONS[1:]:
+            print_result(measure(f'formats.compress.{mimetype}.{encoding}', lambda: compress(body, wbits),
+                                 args.repeat, bytes=len(body), **parameters))
+
+
+if __name__ == '__main__':
+    main()
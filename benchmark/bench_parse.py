@@ -0,0 +1,72 @@
+"""
+Benchmark of parsing the interface declarations of a synthetic registry from yaml, json and json lines.
+
+    python -m benchmark.bench_parse --components 1000
+"""
+import argparse
+import json
+
+import yaml
+
+from benchmark.synthetic import declaration_documents, generate_components
+from benchmark.timing import measure, print_result
+from service.util.parse_interfaces import Parser
+from service.util.parse_interfaces_json import JsonParser, JsonLinesParser
+from service.util.parse_interfaces_yaml import YamlParser
+
+
+class PurePythonYamlParser(YamlParser):
+    LOADER = yaml.SafeLoader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--components', type=int, default=1000)
+    parser.add_argument('--interfaces', type=int, default=20, help='interfaces produced per component')
+    parser.add_argument('--consumed', type=int, default=20, help='interfaces consumed per component')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    components = generate_components(args.components, args.interfaces, args.consumed)
+    documents = [declaration_documents(component) for component in components]
+    parameters = dict(
+        components=args.components,
+        records=sum(len(component.consumers) + len(component.producers) for component in components),
+    )
+
+    yaml_files = [yaml.safe_dump_all(declarations).encode() for declarations in documents]
+    json_files = [json.dumps(declarations).encode() for declarations in documents]
+    json_lines_files = [
+        '\n'.join(json.dumps(declaration) for declaration in declarations).encode()
+        for declarations
+        in documents
+    ]
+    for name, file_parser, files in (
+            (f'parse.yaml.{YamlParser.LOADER.__name__}', YamlParser(), yaml_files),
+            (f'parse.yaml.{PurePythonYamlParser.LOADER.__name__}', PurePythonYamlParser(), yaml_files),
+            ('parse.json', JsonParser(), json_files),
+            ('parse.json_lines', JsonLinesParser(), json_lines_files),
+    ):
+        print_result(measure(
+            name,
+            lambda: [file_parser.parse(file) for file in files],
+            args.repeat,
+            bytes=sum(len(file) for file in files),
+            **parameters,
+        ))
+
+    validator = Parser._schema_validator()
+    for name, validate in (
+            ('validate.jsonschema', lambda declarations: list(validator.iter_errors(declarations))),
+            ('validate.v1', lambda declarations: list(Parser._iter_errors_v1(declarations))),
+    ):
+        print_result(measure(
+            name,
+            lambda: [validate(declarations) for declarations in documents],
+            args.repeat,
+            **parameters,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark of the memory and construction time of interface records, compared with records with a __dict__.
+
+    python -m benchmark.bench_records --records 1000000
+"""
+import argparse
+import gc
+import tracemalloc
+from dataclasses import dataclass
+
+from benchmark.synthetic import declaration_documents, generate_components
+from benchmark.timing import measure, print_result
+from service.database.queries import _consumer_record
+from service.util.parse_interfaces import ConsumerRecord, Parser
+
+
+@dataclass
+class DictConsumerRecord:
+    """
+    The consumer record without slots, as a baseline.
+    """
+    primary: str
+    secondary: str
+    tertiary: str
+    optional: bool
+    sub_component: str
+    interface_host: str
+    interface_type: str
+
+
+def allocated_bytes(function) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # rows like the database returns them, the strings are shared between the records like in a real registry
+    rows = [
+        ('component', 'sub', f'service_{i % 1000:06d}', 'rest', 'get', f'/api/v1/entity_{i % 100}', '', False)
+        for i
+        in range(args.records)
+    ]
+    parameters = dict(records=args.records)
+    for name, to_record in (
+            ('records.from_rows.slots', _consumer_record),
+            ('records.from_rows.dict', lambda row: DictConsumerRecord(
+                sub_component=row[1], interface_host=row[2], interface_type=row[3],
+                primary=row[4], secondary=row[5], tertiary=row[6], optional=row[7],
+            )),
+            ('records.from_rows.dict_of_row', lambda row: ConsumerRecord(**{
+                key: value
+                for key, value
+                in zip(('component', 'sub_component', 'interface_host', 'interface_type',
+                        'primary', 'secondary', 'tertiary', 'optional'), row)
+                if key != 'component'
+            })),
+    ):
+        result = measure(name, lambda: [to_record(row) for row in rows], args.repeat, **parameters)
+        result['allocated_bytes'] = allocated_bytes(lambda: [to_record(row) for row in rows])
+        print_result(result)
+
+    consumed = max(1, min(100, args.records // 1000))
+    components = generate_components(max(2, args.records // consumed), 1, consumed)
+    documents = [declaration_documents(component) for component in components]
+    print_result(measure(
+        'records.parse',
+        lambda: [Parser()._parse(declarations) for declarations in documents],
+        args.repeat,
+        records=sum(len(component.consumers) + len(component.producers) for component in components),
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of the snapshot export and import against loading the registry by one set_interface per component.
+Recreates the tables of the database of APP_CONFIG, which defaults to service.config.TestConfig here.
+
+    python -m benchmark.bench_snapshot --components 20000 --interfaces 25 --consumed 25
+"""
+import argparse
+import io
+import os
+import random
+from dataclasses import replace
+from typing import List
+
+from benchmark.synthetic import generate_components
+from benchmark.timing import measure, print_result
+from service.util.parse_interfaces import Component
+
+
+def snapshot_bytes(components: List[Component]) -> bytes:
+    """
+    A snapshot of the components as export_snapshot writes it. The synthetic values need no escaping.
+    """
+    from service.database.queries import build_declaration
+    from service.database.snapshot import SNAPSHOT_FORMAT, SNAPSHOT_VERSION
+
+    consumers = []
+    producers = []
+    fingerprints = []
+    for component in components:
+        for records, rows in ((component.consumers, consumers), (component.producers, producers)):
+            for record in records:
+                flag = record.optional if records is component.consumers else record.deprecated
+                rows.append('\t'.join((
+                    component.name, record.sub_component, record.interface_host, record.interface_type,
+                    record.primary, record.secondary, record.tertiary, 't' if flag else 'f',
+                )))
+        declaration = build_declaration(component.name, component.consumers, component.producers)
+        fingerprints.append(f'{component.name}\t{declaration.fingerprint}')
+    header = (f'{{"format": "{SNAPSHOT_FORMAT}", "version": {SNAPSHOT_VERSION}, "generation": 0, '
+              f'"consumers": {len(consumers)}, "producers": {len(producers)}, "fingerprints": {len(fingerprints)}}}')
+    return '\n'.join([header] + consumers + producers + fingerprints + ['']).encode()
+
+
+def changed_components(components: List[Component], fraction: float, seed: int) -> List[Component]:
+    """
+    The components with the optional flag of the consumers of the given fraction of them inverted.
+    """
+    rng = random.Random(seed)
+    return [
+        replace(component, consumers=[replace(c, optional=not c.optional) for c in component.consumers])
+        if rng.random() < fraction else component
+        for component in components
+    ]
+
+
+def main():
+    os.environ.setdefault('APP_CONFIG', 'service.config.TestConfig')
+    from benchmark.scenarios import connect_database
+    from service.database.initialization_queries import SQL_DROP_ALL, SQL_INIT_TABLES
+    from service.database.queries import set_interface
+    from service.database.snapshot import export_snapshot, import_snapshot
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--components', type=int, default=10000)
+    parser.add_argument('--interfaces', type=int, default=25, help='interfaces produced per component')
+    parser.add_argument('--consumed', type=int, default=25, help='interfaces consumed per component')
+    parser.add_argument('--changed', type=float, default=0.1, help='fraction of components changed by an import')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-replay', action='store_true', help='do not measure the load by set_interface')
+    args = parser.parse_args()
+
+    components = generate_components(args.components, args.interfaces, args.consumed, optional_ratio=0.1)
+    snapshot = snapshot_bytes(components)
+    changed_snapshot = snapshot_bytes(changed_components(components, args.changed, seed=1))
+    parameters = dict(
+        components=args.components,
+        rows=sum(len(component.consumers) + len(component.producers) for component in components),
+        bytes=len(snapshot),
+    )
+    connection = connect_database()
+
+    def reset():
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_DROP_ALL)
+            cursor.execute(SQL_INIT_TABLES)
+        connection.commit()
+
+    def load():
+        reset()
+        import_snapshot(connection, io.BytesIO(snapshot))
+
+    def replay():
+        # one upload per component, the producers first so that every consumer is satisfied
+        for component in components:
+            set_interface(connection, component.name, [], component.producers)
+        for component in components:
+            set_interface(connection, component.name, component.consumers, component.producers)
+
+    if not args.skip_replay:
+        print_result(measure('snapshot.load.set_interface', replay, 1, reset, **parameters))
+    print_result(measure(
+        'snapshot.import.empty', lambda: import_snapshot(connection, io.BytesIO(snapshot)),
+        args.repeat, reset, **parameters,
+    ))
+    load()
+    print_result(measure(
+        'snapshot.import.unchanged', lambda: import_snapshot(connection, io.BytesIO(snapshot)),
+        args.repeat, **parameters,
+    ))
+    print_result(measure(
+        'snapshot.import.changed', lambda: import_snapshot(connection, io.BytesIO(changed_snapshot)),
+        args.repeat, load, changed=args.changed, **parameters,
+    ))
+    load()
+    print_result(measure('snapshot.export', lambda: export_snapshot(connection, io.BytesIO()), args.repeat, **parameters))
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+The scenarios of the benchmark suite, see benchmark/__main__.py.
+
+Every scenario gets the synthetic registry and the command line arguments and yields its results.
+The database scenarios recreate the tables of the configured database.
+"""
+import random
+from dataclasses import replace
+from typing import Callable, Dict, Iterator, List
+
+import yaml
+from psycopg2 import connect
+
+from benchmark.synthetic import declaration_documents
+from benchmark.timing import measure
+from service.config import get_config
+from service.database.initialization_queries import SQL_DROP_ALL, SQL_INIT_TABLES
+from service.database.queries import get_components, set_interface, set_interfaces
+from service.util.parse_interfaces import Component, ProducerRecord
+from service.util.parse_interfaces_yaml import YamlParser
+
+
+def connect_database():
+    config = get_config()
+    return connect(
+        host=config.POSTGRES_DB_HOST,
+        port=config.POSTGRES_DB_PORT,
+        dbname=config.POSTGRES_DB_NAME,
+        user=config.POSTGRES_DB_USER,
+        password=config.POSTGRES_DB_PASS,
+    )
+
+
+def load_registry(connection, components: List[Component]) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_DROP_ALL)
+        cursor.execute(SQL_INIT_TABLES)
+    connection.commit()
+    set_interfaces(connection, {c.name: (c.consumers, c.producers) for c in components})
+    # plans like in a long running registry, where autovacuum has analyzed the tables
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    connection.autocommit = False
+
+
+def sample(components: List[Component], args) -> List[Component]:
+    return random.Random(args.seed).sample(components, min(args.sample, len(components)))
+
+
+def extra_producers(component: Component, num_producers: int) -> List[ProducerRecord]:
+    """
+    Producers of new interfaces of the component, nobody consumes them so they can be removed again.
+    """
+    return [
+        replace(component.producers[0], secondary=f'/api/v1/benchmark_{i}') if component.producers
+        else ProducerRecord(
+            sub_component='', interface_host=component.name, interface_type='rest',
+            primary='get', secondary=f'/api/v1/benchmark_{i}', tertiary='', deprecated=False,
+        )
+        for i
+        in range(num_producers)
+    ]
+
+
+def parse(components: List[Component], args, parameters: dict) -> Iterator[dict]:
+    files = [yaml.safe_dump_all(declaration_documents(component)).encode() for component in components]
+    yield measure(
+        'parse.yaml',
+        lambda: [YamlParser().parse(file) for file in files],
+        args.repeat,
+        bytes=sum(len(file) for file in files),
+        **parameters,
+    )
+
+
+def set_interface_first_write(components: List[Component], args, parameters: dict) -> Iterator[dict]:
+    """
+    Writes components which are not in the registry yet, they consume and produce like the sampled ones.
+    """
+    connection = connect_database()
+    load_registry(connection, components)
+    new_components = [
+        Component(name=f'new_{component.name}', consumers=component.consumers,
+                  producers=extra_producers(component, len(component.producers)))
+        for component
+        in sample(components, args)
+    ]
+
+    def remove_new_components():
+        for component in new_components:
+            set_interface(connection, component.name, [], [])
+
+    yield measure(
+        'set_interface.first_write',
+        lambda: [set_interface(connection, c.name, c.consumers, c.producers) for c in new_components],
+        args.repeat,
+        setup=remove_new_components,
+        operations=len(new_components),
+        **parameters,
+    )
+    connection.close()
+
+
+def set_interface_noop(components: List[Component], args, parameters: dict) -> Iterator[dict]:
+    connection = connect_database()
+    load_registry(connection, components)
+    sampled = sample(components, args)
+    yield measure(
+        'set_interface.noop',
+        lambda: [set_interface(connection, c.name, c.consumers, c.producers) for c in sampled],
+        args.repeat,
+        operations=len(sampled),
+        **parameters,
+    )
+    connection.close()
+
+
+def _set_interface_delta(name: str, delta: Callable[[Component], int], components: List[Component], args,
+                         parameters: dict) -> Iterator[dict]:
+    """
+    Every run alternately adds delta(component) new producers to the sampled components and removes them again.
+    """
+    connection = connect_database()
+    load_registry(connection, components)
+    sampled = sample(components, args)
+    versions = [
+        [(c.name, c.consumers, c.producers) for c in sampled],
+        [(c.name, c.consumers, c.producers + extra_producers(c, delta(c))) for c in sampled],
+    ]
+    runs = 0
+
+    def write_next_version():
+        nonlocal runs
+        runs += 1
+        for component, consumers, producers in versions[runs % 2]:
+            set_interface(connection, component, consumers, producers)
+
+    yield measure(
+        name,
+        write_next_version,
+        args.repeat,
+        operations=len(sampled),
+        delta_records=sum(delta(c) for c in sampled) // len(sampled),
+        **parameters,
+    )
+    connection.close()
+
+
+def set_interface_small_delta(components: List[Component], args, parameters: dict) -> Iterator[dict]:
+    yield from _set_interface_delta('set_interface.small_delta', lambda c: 1, components, args, parameters)
+
+
+def set_interface_large_delta(components: List[Component], args, parameters: dict) -> Iterator[dict]:
+    yield from _set_interface_delta(
+        'set_interface.large_delta',
+        lambda c: 10 * (len(c.consumers) + len(c.producers)),
+        components,
+        args,
+        parameters,
+    )
+
+
+def get_components_all(components: List[Component], args, parameters: dict) -> Iterator[dict]:
+    connection = connect_database()
+    load_registry(connection, components)
+    yield measure('get_components', lambda: get_components(connection), args.repeat, **parameters)
+    connection.close()
+
+
+SCENARIOS: Dict[str, Callable[..., Iterator[dict]]] = {
+    'parse': parse,
+    'set_interface.first_write': set_interface_first_write,
+    'set_interface.noop': set_interface_noop,
+    'set_interface.small_delta': set_interface_small_delta,
+    'set_interface.large_delta': set_interface_large_delta,
+    'get_components': get_components_all,
+}
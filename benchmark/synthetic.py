@@ -0,0 +1,100 @@
+import random
+from typing import List
+
+from service.util.parse_interfaces import Component, ConsumerRecord, ProducerRecord
+
+
+def interface_host(component_index: int) -> str:
+    return f'service_{component_index:06d}'
+
+
+def generate_components(
+        num_components: int,
+        interfaces_per_component: int,
+        consumed_per_component: int,
+        seed: int = 0,
+        overlap: float = 1.0,
+        deprecated_ratio: float = 0.0,
+        optional_ratio: float = 0.0,
+) -> List[Component]:
+    """
+    Generates a registry in which every component produces its own rest interfaces
+    and consumes interfaces of randomly chosen other components.
+
+    overlap is the fraction of the produced interfaces which are consumed at all, the smaller it is
+    the more consumers share an interface. deprecated_ratio and optional_ratio are the fractions of
+    deprecated producers and optional consumers.
+    """
+    rng = random.Random(seed)
+    flags_rng = random.Random(seed + 1)
+    consumable = None
+    if overlap < 1:
+        all_interfaces = [(c, i) for c in range(num_components) for i in range(interfaces_per_component)]
+        consumable = rng.sample(all_interfaces, max(1, int(len(all_interfaces) * overlap)))
+        consumed_per_component = min(consumed_per_component, len(consumable) - interfaces_per_component)
+    components = []
+    for index in range(num_components):
+        producers = [
+            ProducerRecord(
+                sub_component='', interface_host=interface_host(index), interface_type='rest',
+                primary='get', secondary=f'/api/v1/entity_{i}', tertiary='',
+                deprecated=flags_rng.random() < deprecated_ratio,
+            )
+            for i
+            in range(interfaces_per_component)
+        ]
+        consumed = set()
+        while num_components > 1 and len(consumed) < consumed_per_component:
+            if consumable is None:
+                other, i = rng.randrange(num_components), rng.randrange(interfaces_per_component)
+            else:
+                other, i = rng.choice(consumable)
+            if other != index:
+                consumed.add((other, i))
+        consumers = [
+            ConsumerRecord(
+                sub_component='', interface_host=interface_host(other), interface_type='rest',
+                primary='get', secondary=f'/api/v1/entity_{i}', tertiary='',
+                optional=flags_rng.random() < optional_ratio,
+            )
+            for other, i
+            in sorted(consumed)
+        ]
+        components.append(Component(name=f'component_{index:06d}', consumers=consumers, producers=producers))
+    return components
+
+
+def declaration_documents(component: Component) -> List[dict]:
+    """
+    Returns the interface declaration documents of the component, one per sub-component, host and type.
+    """
+    groups = {}
+    for kind, records, flag in (
+            ('consumers', component.consumers, 'optional'),
+            ('producers', component.producers, 'deprecated'),
+    ):
+        for record in records:
+            interfaces = groups.setdefault(record.sub_component, {'consumers': {}, 'producers': {}})[kind]
+            values = interfaces.setdefault((record.interface_host, record.interface_type), [])
+            values.append({
+                'primary': record.primary,
+                'secondary': record.secondary,
+                'tertiary': record.tertiary,
+                flag: getattr(record, flag),
+            })
+    return [
+        {
+            'apiVersion': 1,
+            'kind': 'InterfaceDeclaration',
+            'sub-component': sub_component,
+            **{
+                kind: [{'host': host, 'type': interface_type, 'values': values}
+                       for (host, interface_type), values
+                       in interfaces.items()]
+                for kind, interfaces
+                in groups[sub_component].items()
+            },
+        }
+        for sub_component
+        in sorted(groups)
+    ]
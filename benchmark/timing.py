@@ -0,0 +1,36 @@
+import json
+import statistics
+import time
+from typing import Callable, Optional
+
+
+def measure(
+        name: str,
+        function: Callable[[], object],
+        repeat: int = 5,
+        setup: Optional[Callable[[], object]] = None,
+        **parameters,
+) -> dict:
+    """
+    Runs the function repeat times and returns the timings in seconds together with the given parameters.
+    The setup is run before every run of the function and is not timed.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return dict(
+        name=name,
+        parameters=parameters,
+        repeat=repeat,
+        min=min(timings),
+        median=statistics.median(timings),
+        max=max(timings),
+    )
+
+
+def print_result(result: dict) -> None:
+    print(json.dumps(result))
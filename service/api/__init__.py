@@ -1,7 +1,13 @@
+from .admin import api as admin_api
+from .history import api as history_api
 from .interfaces import api as interfaces_api
+from .status import api as status_api
+from .usage import api as usage_api
 from flask import Blueprint
 from flask_restplus import Api
 
+from service.database import PoolTimeout
+
 api_blueprint = Blueprint('interfaces service', __name__)
 
 api = Api(
@@ -12,3 +18,12 @@ api = Api(
 )
 
 api.add_namespace(interfaces_api, path='/v1')
+api.add_namespace(usage_api, path='/v1')
+api.add_namespace(history_api, path='/v1')
+api.add_namespace(status_api, path='/v1')
+api.add_namespace(admin_api, path='/v1')
+
+
+@api.errorhandler(PoolTimeout)
+def handle_pool_timeout(error):
+    return {'message': f'The service is overloaded: {error}'}, 503
@@ -0,0 +1,106 @@
+import gzip
+import tempfile
+from dataclasses import asdict
+
+from flask import current_app, request, send_file
+from flask_restplus import Namespace, Resource, abort
+
+from service.database import db_connection, read_db_connection
+from service.database.queries import InterfaceEntryConflict, InterfaceEntryDuplication
+from service.database.snapshot import SnapshotFormatError, export_snapshot, import_snapshot
+
+MIMETYPE_SNAPSHOT = 'application/vnd.interfaces.snapshot'
+ENCODING_GZIP = 'gzip'
+BUFFER_CHUNK_BYTES = 1024 * 1024
+
+api = Namespace(
+    name='admin',
+    description='Export and import of the whole registry, enabled by ADMIN_API',
+    path='/',
+)
+
+
+def _require_admin_api():
+    if not current_app.config['ADMIN_API']:
+        abort(403, 'The admin api is disabled, see ADMIN_API.')
+
+
+def _abort_too_large(max_snapshot_bytes: int):
+    abort(413, f'The snapshot is larger than {max_snapshot_bytes} bytes, see ADMIN_SNAPSHOT_MAX_BYTES.')
+
+
+def _buffer_snapshot(max_snapshot_bytes: int):
+    """
+    The decompressed snapshot of the body in a temporary file, so the import does not wait for the client.
+    """
+    if request.content_length is not None and request.content_length > max_snapshot_bytes:
+        _abort_too_large(max_snapshot_bytes)
+    source = request.stream
+    if request.content_encoding == ENCODING_GZIP:
+        source = gzip.GzipFile(fileobj=source, mode='rb')
+    file = tempfile.TemporaryFile()
+    try:
+        size = 0
+        for chunk in iter(lambda: source.read(BUFFER_CHUNK_BYTES), b''):
+            size += len(chunk)
+            if size > max_snapshot_bytes:
+                _abort_too_large(max_snapshot_bytes)
+            file.write(chunk)
+    except (EOFError, OSError) as e:
+        file.close()
+        abort(400, f'The snapshot is not valid: {e}')
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return file
+
+
+@api.route('/admin/snapshot')
+class SnapshotApi(Resource):
+    def get(self):
+        """
+        The whole registry as a snapshot file, see service.database.snapshot. Compressed with gzip if accepted.
+        """
+        _require_admin_api()
+        compressed = bool(request.accept_encodings[ENCODING_GZIP])
+        # the snapshot is written to a temporary file first, so the connection is not held by a slow client
+        file = tempfile.TemporaryFile()
+        if compressed:
+            with gzip.GzipFile(fileobj=file, mode='wb', compresslevel=6) as gzip_file:
+                header = export_snapshot(read_db_connection, gzip_file)
+        else:
+            header = export_snapshot(read_db_connection, file)
+        file.seek(0)
+        response = send_file(
+            file,
+            mimetype=MIMETYPE_SNAPSHOT,
+            as_attachment=True,
+            attachment_filename=f'registry-{header.generation}.snapshot',
+        )
+        if compressed:
+            response.headers['Content-Encoding'] = ENCODING_GZIP
+        response.headers['Cache-Control'] = 'no-store'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    def put(self):
+        """
+        Replaces the whole registry by the snapshot in the body, which may be compressed with gzip.
+        The registry of the snapshot is validated as a whole, either all or nothing is changed.
+        Snapshots larger than ADMIN_SNAPSHOT_MAX_BYTES are rejected.
+        """
+        _require_admin_api()
+        # the registry is locked during the import, so the body is received before
+        with _buffer_snapshot(current_app.config['ADMIN_SNAPSHOT_MAX_BYTES']) as file:
+            try:
+                result = import_snapshot(db_connection, file)
+            except (SnapshotFormatError, InterfaceEntryDuplication) as e:
+                abort(400, f'The snapshot is not valid: {e}')
+            except InterfaceEntryConflict as e:
+                abort(
+                    409,
+                    f'The snapshot is not consistent: {e}',
+                    conflicts=[asdict(conflict) for conflict in e.conflicts],
+                )
+        return asdict(result), 200
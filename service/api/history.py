@@ -0,0 +1,114 @@
+from dataclasses import asdict
+
+from flask_restplus import Namespace, Resource, inputs
+
+from service.database import read_db_connection
+from service.database.history import (
+    HistoryUnavailable,
+    get_components_at,
+    get_generation_at,
+    get_history,
+    get_history_diff,
+)
+from service.util.component_formats import component_dict
+
+ARGUMENT_COMPONENT = 'component'
+ARGUMENT_BEFORE = 'before'
+ARGUMENT_LIMIT = 'limit'
+ARGUMENT_FROM = 'from'
+ARGUMENT_TO = 'to'
+ARGUMENT_GENERATION = 'generation'
+ARGUMENT_TIME = 'time'
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+api = Namespace(
+    name='history',
+    description='The changes of the registry and its state at earlier generations',
+    path='/',
+)
+
+history_get_parser = api.parser()
+history_get_parser.add_argument(ARGUMENT_COMPONENT, type=str, help='Only the changes of this component.')
+history_get_parser.add_argument(
+    ARGUMENT_BEFORE,
+    type=inputs.natural,
+    help='Only changes of generations before this one, see next_before of the response.',
+)
+history_get_parser.add_argument(
+    ARGUMENT_LIMIT,
+    type=inputs.int_range(1, MAX_LIMIT),
+    default=DEFAULT_LIMIT,
+    help='Max number of generations in the response.',
+)
+
+diff_get_parser = api.parser()
+diff_get_parser.add_argument(ARGUMENT_FROM, type=inputs.natural, required=True, help='The generation to compare.')
+diff_get_parser.add_argument(ARGUMENT_TO, type=inputs.natural, required=True, help='The generation to compare with.')
+
+as_of_get_parser = api.parser()
+as_of_get_parser.add_argument(ARGUMENT_GENERATION, type=inputs.natural, help='The generation of the registry.')
+as_of_get_parser.add_argument(
+    ARGUMENT_TIME,
+    type=inputs.datetime_from_iso8601,
+    help='A time in ISO 8601 format, the registry of the last generation before it.',
+)
+
+
+@api.route('/history')
+class HistoryApi(Resource):
+    @api.expect(history_get_parser)
+    def get(self):
+        """
+        The changes of the registry, newest first.
+        """
+        args = history_get_parser.parse_args()
+        entries, next_before = get_history(
+            read_db_connection, args[ARGUMENT_COMPONENT], args[ARGUMENT_BEFORE], args[ARGUMENT_LIMIT])
+        return {
+            'history': [dict(asdict(entry), changed_at=entry.changed_at.isoformat()) for entry in entries],
+            'next_before': next_before,
+        }, 200
+
+
+@api.route('/history/diff')
+class HistoryDiffApi(Resource):
+    @api.expect(diff_get_parser)
+    def get(self):
+        """
+        The records added and removed per component between two generations.
+        """
+        args = diff_get_parser.parse_args()
+        try:
+            diffs = get_history_diff(read_db_connection, args[ARGUMENT_FROM], args[ARGUMENT_TO])
+        except HistoryUnavailable as e:
+            api.abort(404, str(e))
+        return {
+            ARGUMENT_FROM: args[ARGUMENT_FROM],
+            ARGUMENT_TO: args[ARGUMENT_TO],
+            'components': [asdict(diff) for diff in diffs],
+        }, 200
+
+
+@api.route('/history/as-of')
+class HistoryAsOfApi(Resource):
+    @api.expect(as_of_get_parser)
+    def get(self):
+        """
+        The components of the registry at a generation or a time.
+        """
+        args = as_of_get_parser.parse_args()
+        if (args[ARGUMENT_GENERATION] is None) == (args[ARGUMENT_TIME] is None):
+            api.abort(400, f'Expected either {ARGUMENT_GENERATION} or {ARGUMENT_TIME}.')
+        generation = args[ARGUMENT_GENERATION]
+        try:
+            if generation is None:
+                generation = get_generation_at(read_db_connection, args[ARGUMENT_TIME])
+            components = get_components_at(read_db_connection, generation)
+        except HistoryUnavailable as e:
+            api.abort(404, str(e))
+        return {
+            'generation': generation,
+            'components': [component_dict(component) for component in components],
+        }, 200
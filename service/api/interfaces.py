@@ -1,23 +1,48 @@
+import binascii
 import json
+import zlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from dataclasses import asdict
+from typing import Iterator, Optional
 
 import yaml
-from flask import request
-from flask_restplus import Namespace, Resource, abort
+from flask import current_app, request, Response, stream_with_context
+from flask_restplus import Namespace, Resource, abort, inputs
 from jsonschema import ValidationError
 from werkzeug.datastructures import FileStorage
 
-from service.database import db_connection
+from service.database import db_connection, get_registry_model, read_db_connection
 from service.database.queries import (
-    get_components,
+    ComponentFilter,
+    check_interface,
+    get_generation,
+    get_filtered_components,
+    get_components_snapshot,
+    registry_snapshot,
+    stream_components,
     set_interface,
+    set_interfaces,
     InterfaceEntryDuplication,
     InterfaceEntryConflict,
 )
+from service.database.registry_model import RegistryModel
+from service.util.generation_cache import GenerationCache
+from service.util.component_formats import (
+    FORMAT_NAMES,
+    MIMETYPE_JSON,
+    available_mimetypes,
+    component_dict,
+    serialize_components,
+)
+from service.util.metrics import phase
+from service.util.parse_interfaces import DeclarationLimitExceeded
+from service.util.parse_interfaces_json import JsonParser, JsonLinesParser
 from service.util.parse_interfaces_yaml import YamlParser
 
 ARGUMENT_YAML_FILE = 'yaml_file'
 
+MIMETYPES_JSON_LINES = ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines')
+
 api = Namespace(
     name='interfaces',
     description='Service for managing interfaces',
@@ -34,6 +59,40 @@ interfaces_yaml_put_parser.add_argument(
 )
 
 
+def _parser_limits() -> dict:
+    return dict(
+        max_documents=current_app.config['MAX_DECLARATION_DOCUMENTS'],
+        max_records=current_app.config['MAX_DECLARATION_RECORDS'],
+    )
+
+
+def _abort_too_large(max_content_length: int):
+    abort(413, f'The body is larger than {max_content_length} bytes.')
+
+
+def _read_body(max_content_length: int) -> bytes:
+    # without a Content-Length (chunked uploads) only the read size limits the body
+    body = request.stream.read(max_content_length + 1)
+    if len(body) > max_content_length:
+        _abort_too_large(max_content_length)
+    return body
+
+
+def _read_lines(max_content_length: int) -> Iterator[bytes]:
+    """
+    The lines of the body as they arrive, aborts with 413 as soon as the body exceeds max_content_length.
+    """
+    remaining = max_content_length
+    while True:
+        line = request.stream.readline(remaining + 1)
+        if not line:
+            return
+        remaining -= len(line)
+        if remaining < 0:
+            _abort_too_large(max_content_length)
+        yield line
+
+
 @api.route('/components/<string:component_identifier>/interfaces/yaml')
 @api.doc(params={
     'component_identifier': 'The component identifier, e.g. a name.',
@@ -48,29 +107,384 @@ class InterfacesYamlApi(Resource):
         file = request.files[ARGUMENT_YAML_FILE]
 
         try:
-            consumers, producers = YamlParser().parse(file.stream)
-            set_interface(db_connection, component_identifier, consumers, producers)
+            with phase('parse'):
+                consumers, producers = YamlParser(**_parser_limits()).parse(file.stream)
+            update = set_interface(db_connection, component_identifier, consumers, producers)
 
         except (yaml.YAMLError) as e:
             abort(400, f'The file is no valid YAMl: {e}')
-        except (ValidationError, InterfaceEntryDuplication) as e:
+        except (ValidationError, InterfaceEntryDuplication, DeclarationLimitExceeded) as e:
             abort(400, f'The file is not valid: {e}')
         except (InterfaceEntryConflict) as e:
             abort(
                 409,
-                f'Changing the interface of "{component_identifier}" not possible due to conflicting requirements: {e}')
+                f'Changing the interface of "{component_identifier}" not possible due to conflicting requirements: {e}',
+                conflicts=[asdict(conflict) for conflict in e.conflicts],
+            )
+
+        return {'unchanged': update.unchanged, 'added': update.added, 'removed': update.removed}, 200
+
+
+@api.route('/components/<string:component_identifier>/interfaces/json')
+@api.doc(
+    params={'component_identifier': 'The component identifier, e.g. a name.'},
+    description=f'Replaces the interface of the component like the yaml upload. The body is either '
+                f'{MIMETYPE_JSON}: the list of interface declarations or a single declaration, '
+                f'or json lines ({", ".join(MIMETYPES_JSON_LINES)}): one declaration per line.',
+)
+class InterfacesJsonApi(Resource):
+    def put(self, component_identifier: str):
+        max_content_length = current_app.config['MAX_CONTENT_LENGTH']
+        if request.content_length is not None and request.content_length > max_content_length:
+            _abort_too_large(max_content_length)
+        if request.mimetype == MIMETYPE_JSON:
+            parser, content = JsonParser(**_parser_limits()), _read_body(max_content_length)
+        elif request.mimetype in MIMETYPES_JSON_LINES:
+            parser, content = JsonLinesParser(**_parser_limits()), _read_lines(max_content_length)
+        else:
+            abort(415, f'Content type = {request.mimetype}, expected {MIMETYPE_JSON} or json lines.')
+
+        try:
+            with phase('parse'):
+                consumers, producers = parser.parse(content)
+            update = set_interface(db_connection, component_identifier, consumers, producers)
+
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            abort(400, f'The body is no valid JSON: {e}')
+        except (ValidationError, InterfaceEntryDuplication, DeclarationLimitExceeded) as e:
+            abort(400, f'The body is not valid: {e}')
+        except (InterfaceEntryConflict) as e:
+            abort(
+                409,
+                f'Changing the interface of "{component_identifier}" not possible due to conflicting requirements: {e}',
+                conflicts=[asdict(conflict) for conflict in e.conflicts],
+            )
+
+        return {'unchanged': update.unchanged, 'added': update.added, 'removed': update.removed}, 200
+
+
+@api.route('/components/<string:component_identifier>/interfaces/yaml/check')
+@api.doc(params={
+    'component_identifier': 'The component identifier, e.g. a name.',
+    'yaml_file': 'A yaml file with the interface declaration for the given component.'
+})
+class InterfacesYamlCheckApi(Resource):
+    @api.expect(interfaces_yaml_put_parser)
+    def post(self, component_identifier: str):
+        """
+        Checks whether the interface declaration would be accepted, without storing it.
+        Responds like the upload: 200 if it would be accepted, 409 with all conflicts otherwise.
+        """
+        num_files = len(request.files.getlist(ARGUMENT_YAML_FILE))
+        if num_files != 1:
+            abort(400, f'Num files = {num_files}, expected 1.')
+        file = request.files[ARGUMENT_YAML_FILE]
+
+        try:
+            with phase('parse'):
+                consumers, producers = YamlParser(**_parser_limits()).parse(file.stream)
+            check = check_interface(db_connection, component_identifier, consumers, producers)
+        except (yaml.YAMLError) as e:
+            abort(400, f'The file is no valid YAMl: {e}')
+        except (ValidationError, InterfaceEntryDuplication, DeclarationLimitExceeded) as e:
+            abort(400, f'The file is not valid: {e}')
+
+        if check.conflicts:
+            abort(
+                409,
+                f'Changing the interface of "{component_identifier}" not possible due to conflicting requirements: '
+                + '; '.join(conflict.describe([component_identifier]) for conflict in check.conflicts),
+                conflicts=[asdict(conflict) for conflict in check.conflicts],
+            )
+        return {'unchanged': check.unchanged}, 200
 
-        return {}, 200
 
+@api.route('/components/interfaces/yaml')
+@api.doc(
+    description='Replaces the interfaces of several components at once: either all or none are changed. '
+                'Every file of the multipart request is the yaml interface declaration of one component, '
+                'the name of the form field is the component identifier, e.g. '
+                '-F "component1=@interface1.yaml" -F "component2=@interface2.yaml".',
+)
+class InterfacesYamlBulkApi(Resource):
+    def put(self):
+        if not request.files:
+            abort(400, 'No files, expected one yaml file per component.')
+        interfaces = {}
+        for component_identifier, files in request.files.lists():
+            if len(files) != 1:
+                abort(400, f'Num files for "{component_identifier}" = {len(files)}, expected 1.')
+            try:
+                with phase('parse'):
+                    interfaces[component_identifier] = YamlParser(**_parser_limits()).parse(files[0].stream)
+            except (yaml.YAMLError) as e:
+                abort(400, f'The file of "{component_identifier}" is no valid YAMl: {e}')
+            except (ValidationError, DeclarationLimitExceeded) as e:
+                abort(400, f'The file of "{component_identifier}" is not valid: {e}')
+
+        try:
+            updates = set_interfaces(db_connection, interfaces)
+        except (InterfaceEntryDuplication) as e:
+            abort(400, f'The files are not valid: {e}')
+        except (InterfaceEntryConflict) as e:
+            abort(
+                409,
+                f'Changing the interfaces not possible due to conflicting requirements: {e}',
+                conflicts=[asdict(conflict) for conflict in e.conflicts],
+            )
+
+        return {'components': [
+            {'component': u.component, 'unchanged': u.unchanged, 'added': u.added, 'removed': u.removed}
+            for u in updates
+        ]}, 200
+
+
+ARGUMENT_STREAM = 'stream'
+ARGUMENT_COMPONENT = 'component'
+ARGUMENT_SUB_COMPONENT = 'sub-component'
+ARGUMENT_HOST = 'host'
+ARGUMENT_TYPE = 'type'
+ARGUMENT_PRIMARY = 'primary'
+ARGUMENT_SECONDARY = 'secondary'
+ARGUMENT_TERTIARY = 'tertiary'
+ARGUMENT_ONLY = 'only'
+ARGUMENT_LIMIT = 'limit'
+ARGUMENT_CURSOR = 'cursor'
+
+ONLY_CONSUMERS = 'consumers'
+ONLY_PRODUCERS = 'producers'
+
+HEADER_NEXT_CURSOR = 'X-Next-Cursor'
 
 components_get_parser = api.parser()
+components_get_parser.add_argument(
+    ARGUMENT_STREAM,
+    type=inputs.boolean,
+    default=False,
+    help='Stream the response in chunks instead of building it in memory. Meant for large registries. '
+         'Cannot be combined with filters or pagination.',
+)
+for argument, help_text in (
+        (ARGUMENT_COMPONENT, 'Only the component with this identifier.'),
+        (ARGUMENT_SUB_COMPONENT, 'Only records of this sub-component.'),
+        (ARGUMENT_HOST, 'Only records of interfaces of this host.'),
+        (ARGUMENT_TYPE, 'Only records of interfaces of this type.'),
+        (ARGUMENT_PRIMARY, 'Only records whose primary value starts with this prefix.'),
+        (ARGUMENT_SECONDARY, 'Only records whose secondary value starts with this prefix.'),
+        (ARGUMENT_TERTIARY, 'Only records whose tertiary value starts with this prefix.'),
+):
+    components_get_parser.add_argument(argument, type=str, help=help_text)
+components_get_parser.add_argument(
+    ARGUMENT_ONLY,
+    choices=(ONLY_CONSUMERS, ONLY_PRODUCERS),
+    help='Only consumer or only producer records.',
+)
+components_get_parser.add_argument(
+    ARGUMENT_LIMIT,
+    type=inputs.positive,
+    help=f'Max number of components in the response. The header {HEADER_NEXT_CURSOR} contains the cursor '
+         f'for the next page if there are more components.',
+)
+components_get_parser.add_argument(
+    ARGUMENT_CURSOR,
+    type=str,
+    help=f'Continue the listing after the page the cursor was returned for, see {HEADER_NEXT_CURSOR}.',
+)
+
+ENCODING_IDENTITY = 'identity'
+ENCODING_GZIP = 'gzip'
+ENCODING_DEFLATE = 'deflate'
+# in the order of preference
+COMPRESSED_ENCODINGS = (ENCODING_GZIP, ENCODING_DEFLATE)
+
+# size in bytes from which streamed json is sent as a chunk
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# serialized responses of the latest registry generation per format and content encoding
+components_response_cache = GenerationCache()
+
+
+def _compressor(encoding: str):
+    # unlike gzip.compress, the gzip output does not depend on the current time, deflate is the zlib format
+    wbits = 16 + zlib.MAX_WBITS if encoding == ENCODING_GZIP else zlib.MAX_WBITS
+    return zlib.compressobj(6, zlib.DEFLATED, wbits)
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == ENCODING_IDENTITY:
+        return body
+    compressor = _compressor(encoding)
+    return compressor.compress(body) + compressor.flush()
+
+
+def _get_components_body(generation: int, mimetype: str, encoding: str, model: Optional[RegistryModel]):
+    """
+    Returns the generation and the serialized components, from the cache if possible, else from the model if given.
+    The returned generation is newer than the given one if the registry changed in the meantime.
+    """
+    body = components_response_cache.get(generation, (mimetype, encoding))
+    if body is not None:
+        return generation, body
+    body = components_response_cache.get(generation, (mimetype, ENCODING_IDENTITY))
+    if body is None:
+        if model is not None:
+            generation, components = model.get_components_snapshot()
+        else:
+            generation, components = get_components_snapshot(read_db_connection)
+        with phase('serialize'):
+            body = serialize_components(components, mimetype)
+        components_response_cache.set(generation, (mimetype, ENCODING_IDENTITY), body)
+    if encoding != ENCODING_IDENTITY:
+        with phase('compress'):
+            body = _compress(body, encoding)
+        components_response_cache.set(generation, (mimetype, encoding), body)
+    return generation, body
+
+
+def _iter_components_json(components) -> Iterator[bytes]:
+    """
+    Serializes the components to the same json array as serialize_components, chunk by chunk.
+    """
+    chunk = ['[']
+    chunk_size = 1
+    separator = ''
+    for component in components:
+        component_json = separator + json.dumps(component_dict(component))
+        separator = ', '
+        chunk.append(component_json)
+        chunk_size += len(component_json)
+        if chunk_size >= STREAM_CHUNK_SIZE:
+            yield ''.join(chunk).encode()
+            chunk = []
+            chunk_size = 0
+    chunk.append(']')
+    yield ''.join(chunk).encode()
+
+
+def _iter_compressed(chunks: Iterator[bytes], encoding: str) -> Iterator[bytes]:
+    compressor = _compressor(encoding)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _encode_cursor(component: str) -> str:
+    return urlsafe_b64encode(component.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        return urlsafe_b64decode(cursor.encode()).decode()
+    except (binascii.Error, UnicodeError):
+        abort(400, f'Invalid cursor: {cursor}')
+
+
+def _component_filter(args) -> ComponentFilter:
+    return ComponentFilter(
+        component=args[ARGUMENT_COMPONENT],
+        sub_component=args[ARGUMENT_SUB_COMPONENT],
+        interface_host=args[ARGUMENT_HOST],
+        interface_type=args[ARGUMENT_TYPE],
+        primary=args[ARGUMENT_PRIMARY],
+        secondary=args[ARGUMENT_SECONDARY],
+        tertiary=args[ARGUMENT_TERTIARY],
+        include_consumers=args[ARGUMENT_ONLY] != ONLY_PRODUCERS,
+        include_producers=args[ARGUMENT_ONLY] != ONLY_CONSUMERS,
+    )
+
+
+def _accepted_mimetype() -> str:
+    # clients accepting none of the formats get json, like before the formats were negotiated
+    return request.accept_mimetypes.best_match(available_mimetypes(), default=MIMETYPE_JSON)
+
+
+def _accepted_encoding() -> str:
+    for encoding in COMPRESSED_ENCODINGS:
+        if request.accept_encodings[encoding]:
+            return encoding
+    return ENCODING_IDENTITY
+
+
+def _components_etag(generation: int, mimetype: str, encoding: str) -> str:
+    # json responses keep the etags they had before the formats were negotiated
+    parts = ['components', str(generation)]
+    if mimetype != MIMETYPE_JSON:
+        parts.append(FORMAT_NAMES[mimetype])
+    if encoding != ENCODING_IDENTITY:
+        parts.append(encoding)
+    return '-'.join(parts)
+
+
+def _components_response(
+        body,
+        generation: int,
+        mimetype: str,
+        encoding: str,
+        status: int = 200,
+        weak: bool = False,
+) -> Response:
+    response = Response(body, status=status, mimetype=mimetype)
+    response.set_etag(_components_etag(generation, mimetype, encoding), weak=weak)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    if encoding != ENCODING_IDENTITY and body is not None:
+        response.content_encoding = encoding
+    return response
 
 
 @api.route('/components')
-class InterfacesYamlApi(Resource):
+class ComponentsApi(Resource):
     @api.expect(components_get_parser)
+    @api.produces(available_mimetypes())
     def get(self):
-        components = get_components(db_connection)
-        response = [asdict(component) for component in components]
+        """
+        Lists the components. The format is negotiated by the Accept header: json (default), MessagePack and
+        the columnar layouts of service/util/component_formats.py. Responses are compressed if accepted.
+        """
+        mimetype = _accepted_mimetype()
+        encoding = _accepted_encoding()
+        args = components_get_parser.parse_args()
+        component_filter = _component_filter(args)
+        filtered = component_filter != ComponentFilter() or args[ARGUMENT_LIMIT] or args[ARGUMENT_CURSOR]
+        if args[ARGUMENT_STREAM] and filtered:
+            abort(400, 'Streaming cannot be combined with filters or pagination.')
+        if args[ARGUMENT_STREAM] and mimetype != MIMETYPE_JSON:
+            abort(400, 'Streaming is only available as json.')
+        after = _decode_cursor(args[ARGUMENT_CURSOR]) if args[ARGUMENT_CURSOR] else None
+
+        model = get_registry_model()
+        generation = model.generation if model is not None else get_generation(read_db_connection)
+        if request.if_none_match.contains_weak(_components_etag(generation, mimetype, encoding)):
+            return _components_response(None, generation, mimetype, encoding, status=304)
+
+        if filtered:
+            if model is not None:
+                generation, components, next_after = model.get_filtered_components(
+                    component_filter, after, args[ARGUMENT_LIMIT])
+            else:
+                with registry_snapshot(read_db_connection) as generation:
+                    components, next_after = get_filtered_components(
+                        read_db_connection, component_filter, after, args[ARGUMENT_LIMIT])
+            with phase('serialize'):
+                body = serialize_components(components, mimetype)
+            with phase('compress'):
+                body = _compress(body, encoding)
+            response = _components_response(body, generation, mimetype, encoding)
+            if next_after is not None:
+                response.headers[HEADER_NEXT_CURSOR] = _encode_cursor(next_after)
+            return response
+
+        if args[ARGUMENT_STREAM]:
+            if model is not None:
+                generation, components = model.get_components_snapshot()
+            else:
+                generation, components = stream_components(read_db_connection)
+            chunks = _iter_components_json(components)
+            if encoding != ENCODING_IDENTITY:
+                chunks = _iter_compressed(chunks, encoding)
+            # the compressed bytes may differ from the cached response, hence the weak etag
+            return _components_response(stream_with_context(chunks), generation, mimetype, encoding, weak=True)
 
-        return response, 200
+        generation, body = _get_components_body(generation, mimetype, encoding, model)
+        return _components_response(body, generation, mimetype, encoding)
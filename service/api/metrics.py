@@ -0,0 +1,49 @@
+import logging
+
+from flask import Blueprint, Response, current_app, request
+
+from service.util import metrics
+from service.util.metrics import CONTENT_TYPE_PROMETHEUS, HEADER_SERVER_TIMING
+
+logger = logging.getLogger(__name__)
+
+metrics_blueprint = Blueprint('metrics', __name__)
+
+
+@metrics_blueprint.route('/metrics')
+def get_metrics():
+    """
+    The metrics of this worker process in the Prometheus text format.
+    """
+    return Response(metrics.REGISTRY.render(), content_type=CONTENT_TYPE_PROMETHEUS)
+
+
+@metrics_blueprint.before_app_request
+def start_request_timings():
+    metrics.start_request()
+
+
+@metrics_blueprint.after_app_request
+def record_request_timings(response: Response) -> Response:
+    timings = metrics.end_request()
+    if timings is None:
+        return response
+    duration = timings.duration()
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.REQUEST_DURATION.observe(duration, request.method, endpoint, str(response.status_code))
+
+    if current_app.config['SERVER_TIMING_HEADER']:
+        response.headers[HEADER_SERVER_TIMING] = timings.server_timing()
+    slow_request_seconds = current_app.config['SLOW_REQUEST_SECONDS']
+    if slow_request_seconds and duration >= slow_request_seconds:
+        logger.warning(
+            'Slow request %s %s: %d in %.1fms (%s)',
+            request.method, request.path, response.status_code, duration * 1000, timings.describe(),
+        )
+    return response
+
+
+@metrics_blueprint.teardown_app_request
+def clear_request_timings(exception=None):
+    # the timings of requests failing with an unhandled exception are not recorded by after_app_request
+    metrics.end_request()
@@ -0,0 +1,26 @@
+from flask_restplus import Namespace, Resource
+
+from service.database import get_pool, get_registry_replica, get_replica_pools
+
+api = Namespace(
+    name='status',
+    description='Operational status of the service',
+    path='/',
+)
+
+
+@api.route('/status/database-pool')
+class DatabasePoolStatusApi(Resource):
+    def get(self):
+        """
+        Statistics of the pool of the primary, with the statistics of the replica pools if replicas are configured
+        and of the in-memory registry replica if it is enabled.
+        """
+        stats = get_pool().stats_dict()
+        replica_pools = get_replica_pools()
+        if replica_pools is not None:
+            stats['replicas'] = replica_pools.stats_dicts()
+        registry_replica = get_registry_replica()
+        if registry_replica is not None:
+            stats['registry_replica'] = registry_replica.stats_dict()
+        return stats, 200
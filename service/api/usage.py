@@ -0,0 +1,171 @@
+from dataclasses import asdict
+from typing import List
+
+from flask import request
+from flask_restplus import Namespace, Resource, fields, inputs
+
+from service.database import get_registry_model, read_db_connection
+from service.database.queries import (
+    InterfaceQuery,
+    InterfaceUsage,
+    get_components_snapshot,
+    get_generation,
+    get_interface_usages,
+)
+from service.util.dependency_graph import DependencyGraph, Impact, DOWNSTREAM, UPSTREAM
+from service.util.generation_cache import GenerationCache
+
+ARGUMENT_HOST = 'host'
+ARGUMENT_TYPE = 'type'
+ARGUMENT_PRIMARY = 'primary'
+ARGUMENT_SECONDARY = 'secondary'
+ARGUMENT_TERTIARY = 'tertiary'
+ARGUMENT_DIRECTION = 'direction'
+ARGUMENT_DEPTH = 'depth'
+ARGUMENT_INCLUDE_OPTIONAL = 'include-optional'
+
+MAX_BATCH_SIZE = 1000
+
+api = Namespace(
+    name='usage',
+    description='Which components consume and produce an interface',
+    path='/',
+)
+
+interface_usage_get_parser = api.parser()
+interface_usage_get_parser.add_argument(ARGUMENT_HOST, type=str, required=True, help='The host of the interface.')
+interface_usage_get_parser.add_argument(ARGUMENT_TYPE, type=str, required=True, help='The type of the interface.')
+interface_usage_get_parser.add_argument(ARGUMENT_PRIMARY, type=str, help='The primary value, omit to match all.')
+interface_usage_get_parser.add_argument(ARGUMENT_SECONDARY, type=str, help='The secondary value, omit to match all.')
+interface_usage_get_parser.add_argument(ARGUMENT_TERTIARY, type=str, help='The tertiary value, omit to match all.')
+
+interface_model = api.model('Interface', {
+    ARGUMENT_HOST: fields.String(required=True, description='The host of the interface.'),
+    ARGUMENT_TYPE: fields.String(required=True, description='The type of the interface.'),
+    ARGUMENT_PRIMARY: fields.String(description='The primary value, omit to match all.'),
+    ARGUMENT_SECONDARY: fields.String(description='The secondary value, omit to match all.'),
+    ARGUMENT_TERTIARY: fields.String(description='The tertiary value, omit to match all.'),
+})
+
+interfaces_model = api.model('Interfaces', {
+    'interfaces': fields.List(fields.Nested(interface_model), required=True),
+})
+
+
+def _add_impact_arguments(parser):
+    parser.add_argument(
+        ARGUMENT_DIRECTION,
+        choices=(DOWNSTREAM, UPSTREAM),
+        default=DOWNSTREAM,
+        help='downstream: the components depending on it, upstream: the components it depends on.',
+    )
+    parser.add_argument(ARGUMENT_DEPTH, type=inputs.positive, help='Max number of hops, default unlimited.')
+    parser.add_argument(
+        ARGUMENT_INCLUDE_OPTIONAL,
+        type=inputs.boolean,
+        default=False,
+        help='Whether optional consumers are affected downstream.',
+    )
+
+
+impact_get_parser = api.parser()
+_add_impact_arguments(impact_get_parser)
+interface_impact_get_parser = interface_usage_get_parser.copy()
+_add_impact_arguments(interface_impact_get_parser)
+
+dependency_graph_cache = GenerationCache()
+
+
+def _interface_query(args: dict) -> InterfaceQuery:
+    return InterfaceQuery(
+        interface_host=args[ARGUMENT_HOST],
+        interface_type=args[ARGUMENT_TYPE],
+        primary=args.get(ARGUMENT_PRIMARY),
+        secondary=args.get(ARGUMENT_SECONDARY),
+        tertiary=args.get(ARGUMENT_TERTIARY),
+    )
+
+
+def _usage_response(usage: InterfaceUsage) -> dict:
+    return {
+        'consumers': [dict(component=component, **asdict(record)) for component, record in usage.consumers],
+        'producers': [dict(component=component, **asdict(record)) for component, record in usage.producers],
+    }
+
+
+def _get_dependency_graph() -> DependencyGraph:
+    """
+    Returns the dependency graph of the current registry generation. It is only rebuilt if the registry changed.
+    """
+    model = get_registry_model()
+    generation = model.generation if model is not None else get_generation(read_db_connection)
+    graph = dependency_graph_cache.get(generation, DependencyGraph)
+    if graph is None:
+        if model is not None:
+            generation, components = model.get_components_snapshot()
+        else:
+            generation, components = get_components_snapshot(read_db_connection)
+        graph = DependencyGraph(components)
+        dependency_graph_cache.set(generation, DependencyGraph, graph)
+    return graph
+
+
+def _get_interface_usages(queries: List[InterfaceQuery]) -> List[InterfaceUsage]:
+    model = get_registry_model()
+    if model is not None:
+        return model.get_interface_usages(queries)[1]
+    return get_interface_usages(read_db_connection, queries)
+
+
+def _impact_response(impacts: List[Impact]) -> List[dict]:
+    return [asdict(impact) for impact in impacts]
+
+
+@api.route('/interfaces/usage')
+class InterfaceUsageApi(Resource):
+    @api.expect(interface_usage_get_parser)
+    def get(self):
+        query = _interface_query(interface_usage_get_parser.parse_args())
+        usage, = _get_interface_usages([query])
+        return _usage_response(usage), 200
+
+    @api.expect(interfaces_model, validate=True)
+    def post(self):
+        interfaces: List[dict] = request.json['interfaces']
+        if len(interfaces) > MAX_BATCH_SIZE:
+            api.abort(400, f'At most {MAX_BATCH_SIZE} interfaces per request, got {len(interfaces)}.')
+        queries = [_interface_query(interface) for interface in interfaces]
+        usages = _get_interface_usages(queries)
+        return [
+            dict(interface=interface, **_usage_response(usage))
+            for interface, usage
+            in zip(interfaces, usages)
+        ], 200
+
+
+@api.route('/components/<string:component_identifier>/impact')
+@api.doc(params={'component_identifier': 'The component identifier, e.g. a name.'})
+class ComponentImpactApi(Resource):
+    @api.expect(impact_get_parser)
+    def get(self, component_identifier: str):
+        args = impact_get_parser.parse_args()
+        graph = _get_dependency_graph()
+        if not graph.has_component(component_identifier):
+            api.abort(404, f'Unknown component: {component_identifier}')
+        impacts = graph.component_impact(
+            component_identifier, args[ARGUMENT_DIRECTION], args[ARGUMENT_DEPTH], args[ARGUMENT_INCLUDE_OPTIONAL])
+        return {'component': component_identifier, 'impact': _impact_response(impacts)}, 200
+
+
+@api.route('/interfaces/impact')
+class InterfaceImpactApi(Resource):
+    @api.expect(interface_impact_get_parser)
+    def get(self):
+        args = interface_impact_get_parser.parse_args()
+        query = _interface_query(args)
+        graph = _get_dependency_graph()
+        interface_keys = graph.find_interfaces(
+            query.interface_host, query.interface_type, query.primary, query.secondary, query.tertiary)
+        impacts = graph.interface_impact(
+            interface_keys, args[ARGUMENT_DIRECTION], args[ARGUMENT_DEPTH], args[ARGUMENT_INCLUDE_OPTIONAL])
+        return {'interfaces': interface_keys, 'impact': _impact_response(impacts)}, 200
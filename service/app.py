@@ -1,5 +1,6 @@
 from flask import Flask
 from service.api import api_blueprint
+from service.api.metrics import metrics_blueprint
 from service.config import get_config
 from service.database import teardown_db_connection
 import logging
@@ -16,6 +17,7 @@ def create_app():
     app = Flask(import_name='dependencies server')
     app.config.from_object(get_config())
     app.register_blueprint(api_blueprint, url_prefix='/api')
+    app.register_blueprint(metrics_blueprint)
     app.teardown_appcontext(teardown_appcontext)
     return app
 
@@ -0,0 +1,238 @@
+"""
+ASGI entry point, an alternative to the flask app in service/app.py for many concurrent slow clients,
+e.g. `uvicorn service.asgi:app`.
+
+It serves the uploads and the listing of the components on an asyncpg pool, so a request waiting for the database
+does not block a worker. The responses and errors are the same as the ones of the flask app.
+"""
+import json
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+
+import yaml
+from flask import Config
+from jsonschema import ValidationError
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags
+
+from service.config import get_config
+from service.database.async_pool import acquire, create_async_pool
+from service.database.async_queries import get_components_snapshot, get_generation, set_interface
+from service.database.pool import PoolTimeout
+from service.database.queries import InterfaceEntryConflict, InterfaceEntryDuplication
+from service.util import metrics
+from service.util.component_formats import FORMAT_NAMES, MIMETYPE_JSON, available_mimetypes, serialize_components
+from service.util.metrics import CONTENT_TYPE_PROMETHEUS, HEADER_SERVER_TIMING
+from service.util.parse_interfaces import DeclarationLimitExceeded
+from service.util.parse_interfaces_json import JsonLinesParser, JsonParser
+from service.util.parse_interfaces_yaml import YamlParser
+
+logger = logging.getLogger(__name__)
+
+ARGUMENT_YAML_FILE = 'yaml_file'
+MIMETYPES_JSON_LINES = ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+config = Config('.')
+config.from_object(get_config())
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str, **data):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.data = data
+
+
+def _parser_limits() -> dict:
+    return dict(
+        max_documents=config['MAX_DECLARATION_DOCUMENTS'],
+        max_records=config['MAX_DECLARATION_RECORDS'],
+    )
+
+
+def _check_content_length(request: Request) -> None:
+    content_length = request.headers.get('content-length')
+    if content_length is None:
+        return
+    try:
+        content_length = int(content_length)
+    except ValueError:
+        raise HttpError(400, f'Content-Length = {content_length!r}, expected a number of bytes.')
+    if content_length > config['MAX_CONTENT_LENGTH']:
+        raise HttpError(413, f'The body is larger than {config["MAX_CONTENT_LENGTH"]} bytes.')
+
+
+async def _read_body(request: Request) -> bytes:
+    # without a Content-Length (chunked uploads) the body is limited while it is received
+    max_content_length = config['MAX_CONTENT_LENGTH']
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_content_length:
+            raise HttpError(413, f'The body is larger than {max_content_length} bytes.')
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+async def _read_form(request: Request):
+    # the form is parsed from the limited body, not from the unlimited stream of the request
+    body = await _read_body(request)
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    return await Request(request.scope, receive).form()
+
+
+def _parse(parser, content):
+    with metrics.phase('parse'):
+        return parser.parse(content)
+
+
+async def _set_interface(request: Request, component_identifier: str, consumers, producers) -> JSONResponse:
+    try:
+        async with acquire(request.app.state.pool, config['POSTGRES_DB_POOL_TIMEOUT']) as connection:
+            update = await set_interface(connection, component_identifier, consumers, producers)
+    except (InterfaceEntryDuplication) as e:
+        raise HttpError(400, f'The file is not valid: {e}')
+    except (InterfaceEntryConflict) as e:
+        raise HttpError(
+            409,
+            f'Changing the interface of "{component_identifier}" not possible due to conflicting requirements: {e}',
+            conflicts=[asdict(conflict) for conflict in e.conflicts],
+        )
+    return JSONResponse({'unchanged': update.unchanged, 'added': update.added, 'removed': update.removed})
+
+
+async def put_interfaces_yaml(request: Request) -> JSONResponse:
+    component_identifier = request.path_params['component_identifier']
+    _check_content_length(request)
+    form = await _read_form(request)
+    files = form.getlist(ARGUMENT_YAML_FILE)
+    if len(files) != 1:
+        raise HttpError(400, f'Num files = {len(files)}, expected 1.')
+    content = await files[0].read()
+    try:
+        consumers, producers = await run_in_threadpool(_parse, YamlParser(**_parser_limits()), content)
+    except (yaml.YAMLError) as e:
+        raise HttpError(400, f'The file is no valid YAMl: {e}')
+    except (ValidationError, DeclarationLimitExceeded) as e:
+        raise HttpError(400, f'The file is not valid: {e}')
+    return await _set_interface(request, component_identifier, consumers, producers)
+
+
+async def put_interfaces_json(request: Request) -> JSONResponse:
+    component_identifier = request.path_params['component_identifier']
+    _check_content_length(request)
+    mimetype = request.headers.get('content-type', '').split(';')[0].strip()
+    if mimetype == MIMETYPE_JSON:
+        parser = JsonParser(**_parser_limits())
+    elif mimetype in MIMETYPES_JSON_LINES:
+        parser = JsonLinesParser(**_parser_limits())
+    else:
+        raise HttpError(415, f'Content type = {mimetype}, expected {MIMETYPE_JSON} or json lines.')
+    content = await _read_body(request)
+    try:
+        consumers, producers = await run_in_threadpool(_parse, parser, content)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HttpError(400, f'The body is no valid JSON: {e}')
+    except (ValidationError, DeclarationLimitExceeded) as e:
+        raise HttpError(400, f'The body is not valid: {e}')
+    return await _set_interface(request, component_identifier, consumers, producers)
+
+
+def _components_etag(generation: int, mimetype: str) -> str:
+    # the etags of the flask app without the content encoding
+    etag = f'components-{generation}'
+    if mimetype != MIMETYPE_JSON:
+        etag = f'{etag}-{FORMAT_NAMES[mimetype]}'
+    return etag
+
+
+def _components_headers(generation: int, mimetype: str) -> dict:
+    # weak, as GZipMiddleware compresses the response after the etag is set
+    return {'ETag': f'W/"{_components_etag(generation, mimetype)}"', 'Vary': 'Accept'}
+
+
+async def get_components(request: Request) -> Response:
+    accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+    mimetype = accept.best_match(available_mimetypes(), default=MIMETYPE_JSON)
+    async with acquire(request.app.state.pool, config['POSTGRES_DB_POOL_TIMEOUT']) as connection:
+        # polling clients with a current etag cost only the read of the generation
+        generation = await get_generation(connection)
+        if parse_etags(request.headers.get('if-none-match')).contains_weak(_components_etag(generation, mimetype)):
+            return Response(status_code=304, headers=_components_headers(generation, mimetype))
+        generation, components = await get_components_snapshot(connection)
+    body = await run_in_threadpool(serialize_components, components, mimetype)
+    return Response(body, media_type=mimetype, headers=_components_headers(generation, mimetype))
+
+
+async def get_metrics(request: Request) -> Response:
+    return Response(metrics.REGISTRY.render(), headers={'Content-Type': CONTENT_TYPE_PROMETHEUS})
+
+
+async def handle_http_error(request: Request, error: HttpError) -> JSONResponse:
+    return JSONResponse({'message': error.message, **error.data}, status_code=error.status)
+
+
+async def handle_pool_timeout(request: Request, error: PoolTimeout) -> JSONResponse:
+    return JSONResponse({'message': f'The service is overloaded: {error}'}, status_code=503)
+
+
+class TimingMiddleware(BaseHTTPMiddleware):
+    """
+    Records the request metrics and the Server-Timing header like service.api.metrics does for the flask app.
+    """
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        timings = metrics.start_request()
+        try:
+            response = await call_next(request)
+        finally:
+            metrics.end_request()
+        duration = timings.duration()
+        route = request.scope.get('route')
+        endpoint = route.path if route is not None else 'unmatched'
+        metrics.REQUEST_DURATION.observe(duration, request.method, endpoint, str(response.status_code))
+        if config['SERVER_TIMING_HEADER']:
+            response.headers[HEADER_SERVER_TIMING] = timings.server_timing()
+        slow_request_seconds = config['SLOW_REQUEST_SECONDS']
+        if slow_request_seconds and duration >= slow_request_seconds:
+            logger.warning(
+                'Slow request %s %s: %d in %.1fms (%s)',
+                request.method, request.url.path, response.status_code, duration * 1000, timings.describe(),
+            )
+        return response
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    app.state.pool = await create_async_pool(config)
+    try:
+        yield
+    finally:
+        await app.state.pool.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/v1/components/{component_identifier}/interfaces/yaml', put_interfaces_yaml, methods=['PUT']),
+        Route('/api/v1/components/{component_identifier}/interfaces/json', put_interfaces_json, methods=['PUT']),
+        Route('/api/v1/components', get_components, methods=['GET']),
+        Route('/metrics', get_metrics, methods=['GET']),
+    ],
+    middleware=[Middleware(TimingMiddleware), Middleware(GZipMiddleware, minimum_size=1024)],
+    exception_handlers={HttpError: handle_http_error, PoolTimeout: handle_pool_timeout},
+    lifespan=lifespan,
+)
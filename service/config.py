@@ -8,6 +8,33 @@ class DefaultConfig:
     POSTGRES_DB_NAME = os.environ.get('POSTGRES_DB_NAME', 'interfaces')
     POSTGRES_DB_USER = os.environ.get('POSTGRES_DB_USER', 'postgres')
     POSTGRES_DB_PASS = os.environ.get('POSTGRES_DB_PASS', 'postgres')
+    POSTGRES_DB_POOL_MIN_SIZE = int(os.environ.get('POSTGRES_DB_POOL_MIN_SIZE', '1'))
+    POSTGRES_DB_POOL_MAX_SIZE = int(os.environ.get('POSTGRES_DB_POOL_MAX_SIZE', '10'))
+    POSTGRES_DB_POOL_TIMEOUT = float(os.environ.get('POSTGRES_DB_POOL_TIMEOUT', '10'))
+    POSTGRES_DB_POOL_MAX_USES = int(os.environ.get('POSTGRES_DB_POOL_MAX_USES', '1000'))
+    POSTGRES_DB_POOL_MAX_AGE = float(os.environ.get('POSTGRES_DB_POOL_MAX_AGE', '3600'))
+    POSTGRES_DB_POOL_CHECK_ON_CHECKOUT = os.environ.get('POSTGRES_DB_POOL_CHECK_ON_CHECKOUT', 'true').lower() == 'true'
+    # comma separated DSNs of read replicas, e.g. 'host=replica1,postgresql://replica2:5433',
+    # values missing in a DSN are taken from POSTGRES_DB_*
+    POSTGRES_DB_REPLICA_DSNS = [dsn.strip() for dsn in os.environ.get('POSTGRES_DB_REPLICA_DSNS', '').split(',')
+                                if dsn.strip()]
+    # seconds a replica is not used after connecting to it failed
+    POSTGRES_DB_REPLICA_RETRY_SECONDS = float(os.environ.get('POSTGRES_DB_REPLICA_RETRY_SECONDS', '30'))
+    # serve the read endpoints from an in-memory replica of the registry in every worker, false = query the database
+    REGISTRY_REPLICA = os.environ.get('REGISTRY_REPLICA', 'false').lower() == 'true'
+    # seconds the in-memory replica may lag behind, meanwhile the read endpoints query the database
+    REGISTRY_REPLICA_MAX_STALENESS = float(os.environ.get('REGISTRY_REPLICA_MAX_STALENESS', '5'))
+    # larger request bodies are rejected by flask with 413
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_UPLOAD_BYTES', str(16 * 1024 * 1024)))
+    MAX_DECLARATION_DOCUMENTS = int(os.environ.get('MAX_DECLARATION_DOCUMENTS', '1000'))
+    MAX_DECLARATION_RECORDS = int(os.environ.get('MAX_DECLARATION_RECORDS', '100000'))
+    SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'true').lower() == 'true'
+    # requests taking at least this many seconds are logged with their phases, 0 = off
+    SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '0'))
+    # enables the export and import of the whole registry under /api/v1/admin, only behind an authenticating proxy
+    ADMIN_API = os.environ.get('ADMIN_API', 'false').lower() == 'true'
+    # larger decompressed snapshots are rejected by the import with 413
+    ADMIN_SNAPSHOT_MAX_BYTES = int(os.environ.get('ADMIN_SNAPSHOT_MAX_BYTES', str(1024 * 1024 * 1024)))
 
 
 class ProductionConfig(DefaultConfig):
@@ -1,25 +1,176 @@
-from flask import current_app, g
-from psycopg2 import connect
+import os
+import threading
+
+from typing import Optional
+
+from flask import current_app, g, request
+from psycopg2.extensions import parse_dsn
 from werkzeug.local import LocalProxy
 
+from .pool import ConnectionPool, PoolTimeout
+from .registry_model import RegistryModel
+from .registry_replica import RegistryReplica
+from .replicas import ReplicaPools
+
+# requests with this header set to true read from the primary, e.g. to see their own writes
+HEADER_READ_FROM_PRIMARY = 'X-Read-From-Primary'
+
+_POOL = None
+_REPLICA_POOLS = None
+_REGISTRY_REPLICA = None
+_POOL_LOCK = threading.Lock()
+# Pools and registry replicas inherited from a parent process.
+# Their sockets are shared with the parent, so they are never closed.
+_INHERITED_POOLS = []
+
+
+def _connection_kwargs(config) -> dict:
+    return dict(
+        host=config['POSTGRES_DB_HOST'],
+        port=config['POSTGRES_DB_PORT'],
+        dbname=config['POSTGRES_DB_NAME'],
+        user=config['POSTGRES_DB_USER'],
+        password=config['POSTGRES_DB_PASS'],
+    )
+
+
+def _create_pool(config, connection_kwargs: dict = None, min_size: int = None) -> ConnectionPool:
+    return ConnectionPool(
+        connection_kwargs=connection_kwargs or _connection_kwargs(config),
+        min_size=config['POSTGRES_DB_POOL_MIN_SIZE'] if min_size is None else min_size,
+        max_size=config['POSTGRES_DB_POOL_MAX_SIZE'],
+        timeout=config['POSTGRES_DB_POOL_TIMEOUT'],
+        max_uses=config['POSTGRES_DB_POOL_MAX_USES'],
+        max_age=config['POSTGRES_DB_POOL_MAX_AGE'],
+        check_on_checkout=config['POSTGRES_DB_POOL_CHECK_ON_CHECKOUT'],
+    )
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the connection pool of the current process, created lazily as pre-forked workers (uwsgi) must not share one.
+    """
+    global _POOL
+    pool = _POOL
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _POOL_LOCK:
+        if _POOL is not None and _POOL.pid != os.getpid():
+            _INHERITED_POOLS.append(_POOL)
+            _POOL = None
+        if _POOL is None:
+            _POOL = _create_pool(current_app.config)
+        return _POOL
+
+
+def _create_replica_pools(config) -> Optional[ReplicaPools]:
+    dsns = config['POSTGRES_DB_REPLICA_DSNS']
+    if not dsns:
+        return None
+    connection_kwargs = [{**_connection_kwargs(config), **parse_dsn(dsn)} for dsn in dsns]
+    return ReplicaPools(
+        # connections are opened on first use, so an unreachable replica does not prevent the start
+        pools=[_create_pool(config, kwargs, min_size=0) for kwargs in connection_kwargs],
+        names=[f'{kwargs["host"]}:{kwargs["port"]}/{kwargs["dbname"]}' for kwargs in connection_kwargs],
+        retry_seconds=config['POSTGRES_DB_REPLICA_RETRY_SECONDS'],
+    )
+
+
+def get_replica_pools() -> Optional[ReplicaPools]:
+    """
+    Returns the pools of the read replicas of the current process, None if no replicas are configured.
+    """
+    global _REPLICA_POOLS
+    replica_pools = _REPLICA_POOLS
+    if replica_pools is not None and replica_pools.pid == os.getpid():
+        return replica_pools
+    if not current_app.config['POSTGRES_DB_REPLICA_DSNS']:
+        return None
+    with _POOL_LOCK:
+        if _REPLICA_POOLS is not None and _REPLICA_POOLS.pid != os.getpid():
+            _INHERITED_POOLS.append(_REPLICA_POOLS)
+            _REPLICA_POOLS = None
+        if _REPLICA_POOLS is None:
+            _REPLICA_POOLS = _create_replica_pools(current_app.config)
+        return _REPLICA_POOLS
+
+
+def get_registry_replica() -> Optional[RegistryReplica]:
+    """
+    Returns the in-memory registry replica of the current process, started lazily, None if REGISTRY_REPLICA is disabled.
+    """
+    global _REGISTRY_REPLICA
+    if not current_app.config['REGISTRY_REPLICA']:
+        return None
+    registry_replica = _REGISTRY_REPLICA
+    if registry_replica is not None and registry_replica.pid == os.getpid():
+        return registry_replica
+    with _POOL_LOCK:
+        if _REGISTRY_REPLICA is not None and _REGISTRY_REPLICA.pid != os.getpid():
+            # the thread of the parent does not run in this process
+            _INHERITED_POOLS.append(_REGISTRY_REPLICA)
+            _REGISTRY_REPLICA = None
+        if _REGISTRY_REPLICA is None:
+            _REGISTRY_REPLICA = RegistryReplica(
+                # notifications are not sent on read replicas, so the replica listens on the primary
+                _connection_kwargs(current_app.config),
+                max_staleness=current_app.config['REGISTRY_REPLICA_MAX_STALENESS'],
+            )
+            _REGISTRY_REPLICA.start()
+        return _REGISTRY_REPLICA
+
 
 def get_db_connection():
     connection = getattr(g, 'connection', None)
     if connection is None:
-        config = current_app.config
-        connection = g.connection = connect(
-            host=config['POSTGRES_DB_HOST'],
-            port=config['POSTGRES_DB_PORT'],
-            dbname=config['POSTGRES_DB_NAME'],
-            user=config['POSTGRES_DB_USER'],
-            password=config['POSTGRES_DB_PASS'],
-        )
+        connection = g.connection = get_pool().getconn()
     return connection
 
 
+def _reads_from_primary() -> bool:
+    return request.headers.get(HEADER_READ_FROM_PRIMARY, '').lower() in ('1', 'true', 'yes')
+
+
+def get_read_db_connection():
+    """
+    Returns the connection for read only queries: a connection to a replica if replicas are configured,
+    the primary connection if the request reads from the primary or no replica is available.
+    """
+    if 'read_connection' in g:
+        return g.read_connection
+    replica_pools = get_replica_pools()
+    checkout = replica_pools.getconn() if replica_pools is not None and not _reads_from_primary() else None
+    if checkout is None:
+        g.read_pool, g.read_connection = None, get_db_connection()
+    else:
+        g.read_pool, g.read_connection = checkout
+    return g.read_connection
+
+
+def get_registry_model() -> Optional[RegistryModel]:
+    """
+    Returns the in-memory registry for the read endpoints. None if they query read_db_connection instead:
+    the replica is disabled or not current within REGISTRY_REPLICA_MAX_STALENESS seconds,
+    or the request reads from the primary.
+    """
+    if _reads_from_primary():
+        return None
+    registry_replica = get_registry_replica()
+    return registry_replica.current_model() if registry_replica is not None else None
+
+
 def teardown_db_connection(exception):
-    connection = g.get('connection')
+    read_pool = g.pop('read_pool', None)
+    read_connection = g.pop('read_connection', None)
+    if read_pool is not None:
+        if read_connection.closed:
+            get_replica_pools().eject(read_pool)
+        read_pool.putconn(read_connection)
+    connection = g.pop('connection', None)
     if connection is not None:
-        connection.close()
+        get_pool().putconn(connection)
+
 
 db_connection = LocalProxy(get_db_connection)
+# for queries which may see a slightly outdated registry, writes and checks use db_connection
+read_db_connection = LocalProxy(get_read_db_connection)
@@ -0,0 +1,40 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import asyncpg
+
+from .async_queries import create_staging_tables
+from .pool import PoolTimeout
+
+
+async def create_async_pool(config) -> asyncpg.pool.Pool:
+    """
+    Creates the asyncpg pool of the ASGI app from the same configuration as the connection pool of the flask app.
+    """
+    return await asyncpg.create_pool(
+        host=config['POSTGRES_DB_HOST'],
+        port=config['POSTGRES_DB_PORT'],
+        database=config['POSTGRES_DB_NAME'],
+        user=config['POSTGRES_DB_USER'],
+        password=config['POSTGRES_DB_PASS'],
+        min_size=config['POSTGRES_DB_POOL_MIN_SIZE'],
+        max_size=config['POSTGRES_DB_POOL_MAX_SIZE'],
+        max_inactive_connection_lifetime=config['POSTGRES_DB_POOL_MAX_AGE'],
+        init=create_staging_tables,
+    )
+
+
+@asynccontextmanager
+async def acquire(pool: asyncpg.pool.Pool, timeout: float) -> AsyncIterator[asyncpg.Connection]:
+    """
+    Acquires a connection like ConnectionPool.getconn: PoolTimeout if none is available within timeout seconds.
+    """
+    try:
+        connection = await pool.acquire(timeout=timeout)
+    except asyncio.TimeoutError:
+        raise PoolTimeout(f'No database connection available within {timeout} seconds.')
+    try:
+        yield connection
+    finally:
+        await pool.release(connection)
@@ -0,0 +1,245 @@
+"""
+The writes and reads of service.database.queries on asyncpg connections, prepared by create_staging_tables.
+"""
+import re
+from collections import Counter
+from functools import lru_cache
+from itertools import count
+from typing import Collection, Dict, Iterable, List, Tuple
+
+from asyncpg.exceptions import UniqueViolationError
+
+from service.database.queries import (
+    SQL_ADVISORY_LOCKS,
+    SQL_ANALYZE_STAGED_DECLARATIONS,
+    SQL_CREATE_STAGED_DECLARATIONS,
+    SQL_DELETE_UNSTAGED_CONSUMERS,
+    SQL_DELETE_UNSTAGED_PRODUCERS,
+    SQL_DELETE_UNUSED_INTERFACES,
+    SQL_GET_COMPONENT_CONSUMERS,
+    SQL_GET_COMPONENT_PRODUCERS,
+    SQL_GET_CONSUMERS,
+    SQL_GET_FINGERPRINTS,
+    SQL_GET_GENERATION,
+    SQL_GET_PRODUCERS,
+    SQL_GET_UNSATISFIED_CONSUMERS,
+    SQL_INCREMENT_GENERATION,
+    SQL_INSERT_HISTORY,
+    SQL_INSERT_STAGED_CONSUMERS,
+    SQL_INSERT_STAGED_PRODUCERS,
+    SQL_NOTIFY_CHANGE,
+    SQL_RESOLVE_STAGED_INTERFACE_IDS,
+    SQL_SET_FINGERPRINT,
+    STAGED_ANALYZE_ROWS,
+    STAGED_CONSUMER_COLUMNS,
+    STAGED_PRODUCER_COLUMNS,
+    REGISTRY_CHANNEL,
+    Declaration,
+    Delta,
+    InterfaceEntryConflict,
+    InterfaceEntryDuplication,
+    InterfaceUpdate,
+    UnsatisfiedConsumer,
+    build_declaration,
+    build_declarations,
+    build_delta,
+    change_notification,
+    component_lock_id,
+    components_from_rows,
+    history_columns,
+    interface_lock_id,
+    interface_updates,
+    staged_rows,
+)
+from service.util.metrics import count_rows, phase
+from service.util.parse_interfaces import Component, ConsumerRecord, ProducerRecord
+
+PLACEHOLDER = re.compile('%[s%]')
+
+
+@lru_cache(maxsize=None)
+def _sql(query: str) -> str:
+    """
+    Renders the %s placeholders of a query of service.database.queries as the numbered placeholders of asyncpg.
+    """
+    numbers = count(1)
+    return PLACEHOLDER.sub(lambda match: '%' if match.group() == '%%' else f'${next(numbers)}', query)
+
+
+async def _acquire_advisory_locks(connection, lock_ids: Iterable[int]) -> None:
+    lock_ids = sorted(set(lock_ids))
+    with phase('lock'):
+        await connection.fetchval(_sql(SQL_ADVISORY_LOCKS), lock_ids)
+
+
+async def _get_delta(connection, declaration: Declaration, interface_ids: Dict[Tuple, int]) -> Delta:
+    current_consumers = await connection.fetch(_sql(SQL_GET_COMPONENT_CONSUMERS), declaration.component)
+    current_producers = await connection.fetch(_sql(SQL_GET_COMPONENT_PRODUCERS), declaration.component)
+    interface_ids.update((tuple(row[1:6]), row[7]) for row in current_consumers + current_producers)
+    return build_delta(
+        declaration,
+        (tuple(row[:7]) for row in current_consumers),
+        (tuple(row[:7]) for row in current_producers),
+    )
+
+
+async def create_staging_tables(connection) -> None:
+    """
+    Creates the staging tables of the writes in the session, the init of the pool of create_async_pool.
+    """
+    await connection.execute(SQL_CREATE_STAGED_DECLARATIONS)
+
+
+async def _stage_declarations(connection, declarations: List[Declaration], interface_ids: Dict[Tuple, int]) -> None:
+    consumers, producers = staged_rows(declarations, interface_ids)
+    if consumers:
+        await connection.copy_records_to_table('staged_consumers', records=consumers, columns=STAGED_CONSUMER_COLUMNS)
+    if producers:
+        await connection.copy_records_to_table('staged_producers', records=producers, columns=STAGED_PRODUCER_COLUMNS)
+    if any(row[-1] is None for row in consumers + producers):
+        await connection.execute(SQL_RESOLVE_STAGED_INTERFACE_IDS)
+    if len(consumers) + len(producers) > STAGED_ANALYZE_ROWS:
+        await connection.execute(SQL_ANALYZE_STAGED_DECLARATIONS)
+
+
+async def _write_interfaces(
+        connection,
+        declarations: List[Declaration],
+) -> Tuple[List[int], List[Delta], Counter, Counter]:
+    """
+    Like service.database.queries._write_interfaces.
+    """
+    await _acquire_advisory_locks(connection, (component_lock_id(d.component) for d in declarations))
+    interface_ids = {}
+    deltas = []
+    with phase('diff'):
+        for declaration in declarations:
+            deltas.append(await _get_delta(connection, declaration, interface_ids))
+    changed_keys = set().union(*(delta.interface_keys() for delta in deltas))
+    await _acquire_advisory_locks(connection, (interface_lock_id(*key) for key in changed_keys))
+    components = [d.component for d in declarations]
+    with phase('write'):
+        await _stage_declarations(connection, declarations, interface_ids)
+        # delete consumers before deleting producers, insert producers before inserting consumers
+        deleted_rows = await connection.fetch(_sql(SQL_DELETE_UNSTAGED_CONSUMERS), components)
+        deleted_rows += await connection.fetch(_sql(SQL_DELETE_UNSTAGED_PRODUCERS), components)
+        inserted_rows = await connection.fetch(_sql(SQL_INSERT_STAGED_PRODUCERS), components)
+        inserted_rows += await connection.fetch(_sql(SQL_INSERT_STAGED_CONSUMERS), components)
+        for declaration in declarations:
+            await connection.execute(_sql(SQL_SET_FINGERPRINT), declaration.component, declaration.fingerprint)
+    return (
+        sorted({row[1] for row in deleted_rows + inserted_rows}),
+        deltas,
+        Counter(row[0] for row in deleted_rows),
+        Counter(row[0] for row in inserted_rows),
+    )
+
+
+async def _validate_interfaces(connection, components: Collection[str], changed_interface_ids: List[int]) -> None:
+    if not changed_interface_ids:
+        return
+    with phase('conflicts'):
+        rows = await connection.fetch(_sql(SQL_GET_UNSATISFIED_CONSUMERS), changed_interface_ids)
+    unsatisfied_consumers = [UnsatisfiedConsumer(*row) for row in sorted(map(tuple, rows))]
+    if unsatisfied_consumers:
+        raise InterfaceEntryConflict(
+            'Error: ' + '; '.join(c.describe(components) for c in unsatisfied_consumers),
+            unsatisfied_consumers,
+        )
+
+
+async def _record_history(connection, generation: int, deltas: List[Delta]) -> None:
+    columns = history_columns(deltas)
+    if columns[0]:
+        await connection.execute(_sql(SQL_INSERT_HISTORY), generation, *columns)
+
+
+async def _set_interfaces(connection, declarations: List[Declaration]) -> List[InterfaceUpdate]:
+    transaction = connection.transaction()
+    await transaction.start()
+    try:
+        # unchanged declarations need neither locks nor writes
+        with phase('diff'):
+            rows = await connection.fetch(_sql(SQL_GET_FINGERPRINTS), [d.component for d in declarations])
+            stored_fingerprints = {row[0]: row[1] for row in rows}
+        changed_declarations = [
+            d
+            for d in declarations
+            if stored_fingerprints.get(d.component) != d.fingerprint
+        ]
+        if not changed_declarations:
+            with phase('commit'):
+                await transaction.commit()
+            return interface_updates(declarations, stored_fingerprints, None)
+
+        changed_interface_ids, deltas, deleted, inserted = await _write_interfaces(connection, changed_declarations)
+        if not deleted and not inserted:
+            # stored meanwhile by a concurrent upload of the same declarations, only the fingerprints were written
+            with phase('commit'):
+                await transaction.commit()
+            return interface_updates(declarations, {d.component: d.fingerprint for d in declarations}, None)
+        await _validate_interfaces(connection, [d.component for d in changed_declarations], changed_interface_ids)
+        with phase('write'):
+            await connection.execute(_sql(SQL_DELETE_UNUSED_INTERFACES), changed_interface_ids)
+        # the generation row is locked until commit, so it is incremented as late as possible
+        generation = await connection.fetchval(SQL_INCREMENT_GENERATION)
+        with phase('write'):
+            await _record_history(connection, generation, deltas)
+        await connection.execute(
+            _sql(SQL_NOTIFY_CHANGE),
+            REGISTRY_CHANNEL,
+            change_notification(generation, [d.component for d in changed_declarations]),
+        )
+        with phase('commit'):
+            await transaction.commit()
+        count_rows('deleted', sum(deleted.values()))
+        count_rows('inserted', sum(inserted.values()))
+    except UniqueViolationError as e:
+        await transaction.rollback()
+        raise InterfaceEntryDuplication(f'The interface specification contains one value multiple times: {e}')
+    except BaseException:
+        await transaction.rollback()
+        raise
+
+    return interface_updates(declarations, stored_fingerprints, generation, inserted, deleted)
+
+
+async def set_interface(
+        connection,
+        component: str,
+        consumers: List[ConsumerRecord],
+        producers: List[ProducerRecord],
+) -> InterfaceUpdate:
+    update, = await _set_interfaces(connection, [build_declaration(component, consumers, producers)])
+    return update
+
+
+async def set_interfaces(
+        connection,
+        interfaces: Dict[str, Tuple[List[ConsumerRecord], List[ProducerRecord]]],
+) -> List[InterfaceUpdate]:
+    """
+    Replaces the interfaces of several components in one transaction: either all or none are changed.
+    """
+    return await _set_interfaces(connection, build_declarations(interfaces))
+
+
+async def get_components(connection) -> List[Component]:
+    with phase('query'):
+        consumer_rows = await connection.fetch(SQL_GET_CONSUMERS)
+        producer_rows = await connection.fetch(SQL_GET_PRODUCERS)
+    with phase('build'):
+        return components_from_rows(consumer_rows, producer_rows)
+
+
+async def get_generation(connection) -> int:
+    return await connection.fetchval(SQL_GET_GENERATION)
+
+
+async def get_components_snapshot(connection) -> Tuple[int, List[Component]]:
+    """
+    Returns the generation of the registry together with the components of exactly this generation.
+    """
+    async with connection.transaction(isolation='repeatable_read', readonly=True):
+        generation = await connection.fetchval(SQL_GET_GENERATION)
+        return generation, await get_components(connection)
@@ -0,0 +1,241 @@
+"""
+Reads of the change history.
+
+set_interface records the rows every change added to and removed from each component together with the generation
+and the time of the change. The scheduled service.database.maintenance stores the whole registry as a checkpoint
+every queries.HISTORY_CHECKPOINT_INTERVAL generations, so the registry of any generation after the oldest checkpoint
+is the checkpoint before it together with about HISTORY_CHECKPOINT_INTERVAL generations of changes.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from service.util.parse_interfaces import Component, ConsumerRecord, ProducerRecord
+
+from .queries import components_from_rows, _consumer_record, _producer_record, registry_snapshot
+
+SQL_GET_HISTORY = '''
+SELECT generation, changed_at, component, added_consumers, removed_consumers, added_producers, removed_producers
+FROM history
+WHERE generation IN (
+    SELECT DISTINCT generation
+    FROM history
+    WHERE (%(component)s IS NULL OR component = %(component)s)
+    AND (%(before)s IS NULL OR generation < %(before)s)
+    ORDER BY generation DESC
+    LIMIT %(limit)s
+)
+AND (%(component)s IS NULL OR component = %(component)s)
+ORDER BY generation DESC, component;
+'''
+
+SQL_GET_DELTAS = '''
+SELECT generation, component, added_consumers, removed_consumers, added_producers, removed_producers
+FROM history
+WHERE generation > %s
+AND generation <= %s
+ORDER BY generation, component;
+'''
+
+SQL_GET_OLDEST_CHECKPOINT = 'SELECT min(generation) FROM history_checkpoints;'
+
+SQL_GET_CHECKPOINT_BEFORE = '''
+SELECT max(generation)
+FROM history_checkpoints
+WHERE generation <= %s;
+'''
+
+SQL_GET_CHECKPOINT_COMPONENTS = '''
+SELECT component, consumers, producers
+FROM history_checkpoint_components
+WHERE generation = %s;
+'''
+
+# the checkpoints count, as a generation without changes has no history rows
+SQL_GET_GENERATION_AT = '''
+SELECT greatest(
+    (SELECT max(generation) FROM history WHERE changed_at <= %(time)s),
+    (SELECT max(generation) FROM history_checkpoints WHERE created_at <= %(time)s)
+);
+'''
+
+
+class HistoryUnavailable(Exception):
+    """
+    The history does not reach back to the requested generation or time, or the generation does not exist yet.
+    """
+
+
+@dataclass
+class HistoryEntry:
+    generation: int
+    changed_at: datetime
+    component: str
+    added_consumers: List[ConsumerRecord]
+    removed_consumers: List[ConsumerRecord]
+    added_producers: List[ProducerRecord]
+    removed_producers: List[ProducerRecord]
+
+
+@dataclass
+class ComponentDiff:
+    component: str
+    added_consumers: List[ConsumerRecord]
+    removed_consumers: List[ConsumerRecord]
+    added_producers: List[ProducerRecord]
+    removed_producers: List[ProducerRecord]
+
+
+def _consumers(rows: Iterable[list]) -> List[ConsumerRecord]:
+    return [_consumer_record([None] + list(row)) for row in rows]
+
+
+def _producers(rows: Iterable[list]) -> List[ProducerRecord]:
+    return [_producer_record([None] + list(row)) for row in rows]
+
+
+def get_history(
+        connection,
+        component: Optional[str] = None,
+        before: Optional[int] = None,
+        limit: int = 100,
+) -> Tuple[List[HistoryEntry], Optional[int]]:
+    """
+    Returns the changes of the limit latest generations before the given one, newest first,
+    optionally only those of one component. The second value is the generation to continue with, if there are more.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_GET_HISTORY, dict(component=component, before=before, limit=limit + 1))
+        rows = cursor.fetchall()
+    connection.commit()
+    generations = sorted({row[0] for row in rows}, reverse=True)
+    next_before = None
+    if len(generations) > limit:
+        next_before = generations[limit - 1]
+        rows = [row for row in rows if row[0] >= next_before]
+    entries = [
+        HistoryEntry(
+            generation=row[0],
+            changed_at=row[1],
+            component=row[2],
+            added_consumers=_consumers(row[3]),
+            removed_consumers=_consumers(row[4]),
+            added_producers=_producers(row[5]),
+            removed_producers=_producers(row[6]),
+        )
+        for row
+        in rows
+    ]
+    return entries, next_before
+
+
+class _NetDelta:
+    """
+    The rows added and removed by a sequence of changes of one component.
+    """
+
+    def __init__(self):
+        self.added: Tuple[Set[tuple], Set[tuple]] = (set(), set())
+        self.removed: Tuple[Set[tuple], Set[tuple]] = (set(), set())
+
+    def apply(self, index: int, added: Iterable[list], removed: Iterable[list]) -> None:
+        # a row removed and added again is unchanged, as is a row added and removed again
+        for row in map(tuple, removed):
+            if row in self.added[index]:
+                self.added[index].remove(row)
+            else:
+                self.removed[index].add(row)
+        for row in map(tuple, added):
+            if row in self.removed[index]:
+                self.removed[index].remove(row)
+            else:
+                self.added[index].add(row)
+
+    def is_empty(self) -> bool:
+        return not any(self.added + self.removed)
+
+
+def _check_range(cursor, from_generation: int, to_generation: int) -> None:
+    cursor.execute(SQL_GET_OLDEST_CHECKPOINT)
+    oldest = cursor.fetchone()[0]
+    if oldest is None or min(from_generation, to_generation) < oldest:
+        raise HistoryUnavailable(f'The history starts at generation {oldest}')
+
+
+def _net_deltas(cursor, from_generation: int, to_generation: int) -> Dict[str, _NetDelta]:
+    cursor.execute(SQL_GET_DELTAS, (from_generation, to_generation))
+    deltas: Dict[str, _NetDelta] = {}
+    for _, component, added_consumers, removed_consumers, added_producers, removed_producers in cursor:
+        delta = deltas.setdefault(component, _NetDelta())
+        delta.apply(0, added_consumers, removed_consumers)
+        delta.apply(1, added_producers, removed_producers)
+    return deltas
+
+
+def get_history_diff(connection, from_generation: int, to_generation: int) -> List[ComponentDiff]:
+    """
+    Returns the rows which differ between the registry of from_generation and of to_generation per changed component,
+    sorted by component. from_generation may be newer than to_generation.
+    """
+    with registry_snapshot(connection) as current:
+        if max(from_generation, to_generation) > current:
+            raise HistoryUnavailable(f'The registry is at generation {current}')
+        with connection.cursor() as cursor:
+            _check_range(cursor, from_generation, to_generation)
+            deltas = _net_deltas(cursor, min(from_generation, to_generation), max(from_generation, to_generation))
+    diffs = []
+    for component, delta in sorted(deltas.items()):
+        if delta.is_empty():
+            continue
+        added, removed = delta.added, delta.removed
+        if from_generation > to_generation:
+            added, removed = removed, added
+        diffs.append(ComponentDiff(
+            component=component,
+            added_consumers=_consumers(sorted(added[0])),
+            removed_consumers=_consumers(sorted(removed[0])),
+            added_producers=_producers(sorted(added[1])),
+            removed_producers=_producers(sorted(removed[1])),
+        ))
+    return diffs
+
+
+def get_generation_at(connection, time: datetime) -> int:
+    """
+    Returns the generation of the registry at the given time.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_GET_GENERATION_AT, dict(time=time))
+        generation = cursor.fetchone()[0]
+    connection.commit()
+    if generation is None:
+        raise HistoryUnavailable(f'The history does not reach back to {time.isoformat()}')
+    return generation
+
+
+def get_components_at(connection, generation: int) -> List[Component]:
+    """
+    Returns the components of the registry at the given generation, like queries.get_components.
+    """
+    with registry_snapshot(connection) as current:
+        if generation > current:
+            raise HistoryUnavailable(f'The registry is at generation {current}')
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_GET_CHECKPOINT_BEFORE, (generation,))
+            checkpoint = cursor.fetchone()[0]
+            if checkpoint is None:
+                raise HistoryUnavailable(f'The history does not reach back to generation {generation}')
+            cursor.execute(SQL_GET_CHECKPOINT_COMPONENTS, (checkpoint,))
+            states = {
+                component: ({tuple(row) for row in consumers}, {tuple(row) for row in producers})
+                for component, consumers, producers in cursor.fetchall()
+            }
+            deltas = _net_deltas(cursor, checkpoint, generation)
+    for component, delta in deltas.items():
+        state = states.setdefault(component, (set(), set()))
+        for index in (0, 1):
+            state[index].difference_update(delta.removed[index])
+            state[index].update(delta.added[index])
+    consumer_rows = sorted((component,) + row for component, state in states.items() for row in state[0])
+    producer_rows = sorted((component,) + row for component, state in states.items() for row in state[1])
+    return components_from_rows(consumer_rows, producer_rows)
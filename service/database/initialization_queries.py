@@ -1,106 +1,293 @@
-SQL_INIT_TABLES_AND_TRIGGERS = '''
+from .queries import SQL_CREATE_CHECKPOINT, SQL_CREATE_CHECKPOINT_COMPONENTS
+
+# The change history, see service.database.history. It is partitioned by month, create_history_partitions creates
+# the partitions of the coming months and is scheduled with service.database.maintenance.
+# Rows of months without a partition go to the default partition. Old months are removed by dropping their partitions.
+SQL_INIT_HISTORY = '''
+    -- the rows a change of the registry added to and removed from a component,
+    -- as json arrays of rows (subcomponent, host, type, primary, secondary, tertiary, optional or deprecated)
+    CREATE TABLE history
+    (
+        generation BIGINT NOT NULL,
+        changed_at TIMESTAMPTZ NOT NULL,
+        component TEXT COLLATE "C" NOT NULL,
+        added_consumers JSONB NOT NULL,
+        removed_consumers JSONB NOT NULL,
+        added_producers JSONB NOT NULL,
+        removed_producers JSONB NOT NULL
+    ) PARTITION BY RANGE (changed_at);
+    CREATE TABLE history_default PARTITION OF history DEFAULT;
+    CREATE INDEX history_generation on history (generation);
+    CREATE INDEX history_component on history (component, generation);
+
+    CREATE FUNCTION history_append_only() RETURNS trigger AS $$
+    BEGIN
+        RAISE EXCEPTION 'The history is append only';
+    END;
+    $$ LANGUAGE plpgsql;
+    CREATE TRIGGER history_append_only BEFORE UPDATE OR DELETE ON history
+        FOR EACH ROW EXECUTE FUNCTION history_append_only();
+
+    -- the whole registry at some generations, the history is complete after the oldest checkpoint
+    CREATE TABLE history_checkpoints
+    (
+        generation BIGINT PRIMARY KEY,
+        created_at TIMESTAMPTZ NOT NULL
+    );
+    CREATE TABLE history_checkpoint_components
+    (
+        generation BIGINT NOT NULL REFERENCES history_checkpoints (generation) ON DELETE CASCADE,
+        component TEXT COLLATE "C" NOT NULL,
+        consumers JSONB NOT NULL,
+        producers JSONB NOT NULL,
+        PRIMARY KEY (generation, component)
+    );
+
+    -- a partition cannot be created while the default partition has rows of its month, so they are moved into it
+    CREATE FUNCTION create_history_partitions(months_ahead INTEGER) RETURNS VOID AS $$
+    DECLARE
+        month DATE;
+        name TEXT;
+    BEGIN
+        FOR i IN 0..months_ahead LOOP
+            month := date_trunc('month', now()) + make_interval(months => i);
+            name := 'history_' || to_char(month, 'YYYY_MM');
+            IF to_regclass(name) IS NOT NULL THEN
+                CONTINUE;
+            END IF;
+            IF NOT EXISTS (
+                SELECT FROM history_default WHERE changed_at >= month AND changed_at < month + interval '1 month'
+            ) THEN
+                EXECUTE format('CREATE TABLE %I PARTITION OF history FOR VALUES FROM (%L) TO (%L)',
+                               name, month, month + interval '1 month');
+                CONTINUE;
+            END IF;
+            EXECUTE format('CREATE TABLE %I (LIKE history)', name);
+            ALTER TABLE history_default DISABLE TRIGGER history_append_only;
+            EXECUTE format('WITH moved AS (DELETE FROM history_default WHERE changed_at >= %L AND changed_at < %L '
+                           'RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                           month, month + interval '1 month', name);
+            ALTER TABLE history_default ENABLE TRIGGER history_append_only;
+            EXECUTE format('ALTER TABLE history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           name, month, month + interval '1 month');
+        END LOOP;
+    END;
+    $$ LANGUAGE plpgsql;
+    SELECT create_history_partitions(2);
+'''
+
+# The text columns use the C collation: the listing and the in-memory registry order and page like python strings.
+SQL_INIT_TABLES = '''
+    -- every distinct interface key once, consumers and producers refer to it by id
+    CREATE TABLE interfaces
+    (
+        id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        host TEXT COLLATE "C" NOT NULL,
+        itype TEXT COLLATE "C" NOT NULL,
+        iprimary TEXT COLLATE "C" NOT NULL,
+        isecondary TEXT COLLATE "C" NOT NULL,
+        itertiary TEXT COLLATE "C" NOT NULL
+    );
+
     CREATE TABLE consumers
     (
-        component TEXT NOT NULL,
-        subcomponent TEXT NOT NULL,
-        host TEXT NOT NULL,
-        itype TEXT NOT NULL,
-        iprimary TEXT NOT NULL,
-        isecondary TEXT NOT NULL,
-        itertiary TEXT NOT NULL,
+        component TEXT COLLATE "C" NOT NULL,
+        subcomponent TEXT COLLATE "C" NOT NULL,
+        interface_id INTEGER NOT NULL REFERENCES interfaces (id),
         optional BOOLEAN NOT NULL,
-        unique (component, subcomponent, host, itype, iprimary, isecondary, itertiary)
+        unique (component, subcomponent, interface_id)
     );
 
     CREATE TABLE producers
     (
-        component TEXT NOT NULL,
-        subcomponent TEXT NOT NULL,
-        host TEXT NOT NULL,
-        itype TEXT NOT NULL,
-        iprimary TEXT NOT NULL,
-        isecondary TEXT NOT NULL,
-        itertiary TEXT NOT NULL,
+        component TEXT COLLATE "C" NOT NULL,
+        subcomponent TEXT COLLATE "C" NOT NULL,
+        interface_id INTEGER NOT NULL REFERENCES interfaces (id),
         deprecated BOOLEAN NOT NULL,
-        unique (component, subcomponent, host, itype, iprimary, isecondary, itertiary)    
+        unique (component, subcomponent, interface_id)
     );
 
-    CREATE OR REPLACE FUNCTION ensure_producer_exists()
-    RETURNS TRIGGER AS $producers_check$
-    BEGIN
-        IF (
-            NEW.optional
-            OR
-            EXISTS(
-                SELECT 1
-                FROM producers as other
-                WHERE other.host = NEW.host
-                AND other.itype = NEW.itype
-                AND other.iprimary = NEW.iprimary
-                AND other.isecondary = NEW.isecondary
-                AND other.itertiary = NEW.itertiary
-            )
-        ) THEN
-            RETURN NEW;
-        END IF;
-        RAISE EXCEPTION 'no producer for interface "%" "%" "%" "%" "%"', 
-            NEW.host, NEW.itype, NEW.iprimary, NEW.isecondary, NEW.itertiary;
-    END;
-    $producers_check$ LANGUAGE plpgsql;
-    
-    CREATE OR REPLACE FUNCTION ensure_no_consumer_exists()
-    RETURNS TRIGGER AS $consumers_check$
-    BEGIN
-        IF (
-            EXISTS(
-                SELECT 1
-                FROM consumers as other
-                WHERE other.host = OLD.host
-                AND other.itype = OLD.itype
-                AND other.iprimary = OLD.iprimary
-                AND other.isecondary = OLD.isecondary
-                AND other.itertiary = OLD.itertiary
-                AND other.optional = FALSE
-            )    
-        ) THEN
-            IF (
-                NOT EXISTS(
-                    SELECT 1
-                    FROM producers as other
-                    WHERE other.host = OLD.host
-                    AND other.itype = OLD.itype
-                    AND other.iprimary = OLD.iprimary
-                    AND other.isecondary = OLD.isecondary
-                    AND other.itertiary = OLD.itertiary
-                    AND other.component <> OLD.component
-                    AND other.subcomponent <> OLD.subcomponent
-                )    
-            ) THEN
-                RAISE EXCEPTION 'no other producer for used interface "%" "%" "%" "%" "%"', 
-                    OLD.host, OLD.itype, OLD.iprimary, OLD.isecondary, OLD.itertiary;
-            END IF;    
-        END IF;
-        RETURN OLD;
-    END;
-    $consumers_check$ LANGUAGE plpgsql;
-    
-    CREATE TRIGGER producers_check BEFORE INSERT ON consumers
-        FOR each row execute procedure ensure_producer_exists();
-    
-    CREATE TRIGGER consumers_check BEFORE DELETE ON producers
-        FOR each row execute procedure ensure_no_consumer_exists();
-        
+    -- hash of the last accepted declaration per component, see set_interface
+    CREATE TABLE fingerprints
+    (
+        component TEXT COLLATE "C" PRIMARY KEY,
+        fingerprint TEXT NOT NULL
+    );
+
+    -- incremented by every successful change of the registry, see set_interface
+    CREATE TABLE registry_generation
+    (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        generation BIGINT NOT NULL
+    );
+    INSERT INTO registry_generation (generation) VALUES (0);
+
+    -- the pattern operator classes serve equality as well as prefix matches (LIKE 'prefix%')
+    CREATE UNIQUE INDEX interfaces_key on interfaces
+        (host, itype, iprimary text_pattern_ops, isecondary text_pattern_ops, itertiary text_pattern_ops);
     CREATE INDEX consumers_component on consumers (component);
     CREATE INDEX producers_component on producers (component);
+    CREATE INDEX consumers_interface on consumers (interface_id) INCLUDE (optional);
+    CREATE INDEX producers_interface on producers (interface_id);
+    CREATE INDEX consumers_subcomponent on consumers (subcomponent);
+    CREATE INDEX producers_subcomponent on producers (subcomponent);
+''' + SQL_INIT_HISTORY + '''
+    INSERT INTO history_checkpoints (generation, created_at) VALUES (0, now());
+'''
+
+# Databases created before the consistency checks moved into set_interface still have row level triggers.
+SQL_MIGRATE_SET_BASED_VALIDATION = '''
+    DROP TRIGGER IF EXISTS consumers_check ON producers;
+    DROP TRIGGER IF EXISTS producers_check ON consumers;
+    DROP FUNCTION IF EXISTS ensure_no_consumer_exists();
+    DROP FUNCTION IF EXISTS ensure_producer_exists();
+    CREATE INDEX IF NOT EXISTS consumers_interface
+        on consumers (host, itype, iprimary, isecondary, itertiary) INCLUDE (optional);
+    CREATE INDEX IF NOT EXISTS producers_interface on producers (host, itype, iprimary, isecondary, itertiary);
 '''
 
 SQL_DROP_ALL = '''
     DROP INDEX IF EXISTS consumers_component;
     DROP INDEX IF EXISTS producers_component;
+    DROP INDEX IF EXISTS consumers_interface;
+    DROP INDEX IF EXISTS producers_interface;
+    DROP INDEX IF EXISTS consumers_subcomponent;
+    DROP INDEX IF EXISTS producers_subcomponent;
+    DROP INDEX IF EXISTS interfaces_key;
     DROP TRIGGER IF EXISTS consumers_check ON producers;
     DROP TRIGGER IF EXISTS producers_check ON consumers;
     DROP FUNCTION If EXISTS ensure_no_consumer_exists();
     DROP FUNCTION IF EXISTS ensure_producer_exists();
     DROP TABLE IF EXISTS consumers;
     DROP TABLE IF EXISTS producers;
+    DROP TABLE IF EXISTS interfaces;
+    DROP TABLE IF EXISTS fingerprints;
+    DROP TABLE IF EXISTS registry_generation;
+    DROP TABLE IF EXISTS history;
+    DROP TABLE IF EXISTS history_checkpoint_components;
+    DROP TABLE IF EXISTS history_checkpoints;
+    DROP FUNCTION IF EXISTS history_append_only();
+    DROP FUNCTION IF EXISTS create_history_partitions(INTEGER);
+'''
+
+SQL_MIGRATE_FINGERPRINTS = '''
+    CREATE TABLE IF NOT EXISTS fingerprints
+    (
+        component TEXT COLLATE "C" PRIMARY KEY,
+        fingerprint TEXT NOT NULL
+    );
+'''
+
+SQL_MIGRATE_REGISTRY_GENERATION = '''
+    CREATE TABLE IF NOT EXISTS registry_generation
+    (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        generation BIGINT NOT NULL
+    );
+    INSERT INTO registry_generation (generation) VALUES (0) ON CONFLICT DO NOTHING;
+'''
+
+SQL_MIGRATE_COMPONENT_FILTERS = '''
+    DROP INDEX IF EXISTS consumers_interface;
+    DROP INDEX IF EXISTS producers_interface;
+    CREATE INDEX consumers_interface on consumers
+        (host, itype, iprimary text_pattern_ops, isecondary text_pattern_ops, itertiary text_pattern_ops)
+        INCLUDE (optional);
+    CREATE INDEX producers_interface on producers
+        (host, itype, iprimary text_pattern_ops, isecondary text_pattern_ops, itertiary text_pattern_ops);
+    CREATE INDEX IF NOT EXISTS consumers_subcomponent on consumers (subcomponent);
+    CREATE INDEX IF NOT EXISTS producers_subcomponent on producers (subcomponent);
+'''
+
+# Databases created before the interface keys were normalized store the keys in every consumer and producer row.
+# Run in one transaction after the other migrations, the writers must be stopped meanwhile.
+SQL_MIGRATE_INTERFACE_IDS = '''
+    CREATE TABLE interfaces
+    (
+        id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        host TEXT NOT NULL,
+        itype TEXT NOT NULL,
+        iprimary TEXT NOT NULL,
+        isecondary TEXT NOT NULL,
+        itertiary TEXT NOT NULL
+    );
+    INSERT INTO interfaces (host, itype, iprimary, isecondary, itertiary)
+    SELECT host, itype, iprimary, isecondary, itertiary FROM consumers
+    UNION
+    SELECT host, itype, iprimary, isecondary, itertiary FROM producers
+    ORDER BY host, itype, iprimary, isecondary, itertiary;
+    CREATE UNIQUE INDEX interfaces_key on interfaces
+        (host, itype, iprimary text_pattern_ops, isecondary text_pattern_ops, itertiary text_pattern_ops);
+
+    ALTER TABLE consumers RENAME TO consumers_before_interface_ids;
+    ALTER TABLE producers RENAME TO producers_before_interface_ids;
+    DROP INDEX IF EXISTS consumers_component;
+    DROP INDEX IF EXISTS producers_component;
+    DROP INDEX IF EXISTS consumers_interface;
+    DROP INDEX IF EXISTS producers_interface;
+    DROP INDEX IF EXISTS consumers_subcomponent;
+    DROP INDEX IF EXISTS producers_subcomponent;
+
+    CREATE TABLE consumers
+    (
+        component TEXT NOT NULL,
+        subcomponent TEXT NOT NULL,
+        interface_id INTEGER NOT NULL REFERENCES interfaces (id),
+        optional BOOLEAN NOT NULL,
+        unique (component, subcomponent, interface_id)
+    );
+    INSERT INTO consumers (component, subcomponent, interface_id, optional)
+    SELECT c.component, c.subcomponent, i.id, c.optional
+    FROM consumers_before_interface_ids as c
+    JOIN interfaces as i
+    USING (host, itype, iprimary, isecondary, itertiary);
+
+    CREATE TABLE producers
+    (
+        component TEXT NOT NULL,
+        subcomponent TEXT NOT NULL,
+        interface_id INTEGER NOT NULL REFERENCES interfaces (id),
+        deprecated BOOLEAN NOT NULL,
+        unique (component, subcomponent, interface_id)
+    );
+    INSERT INTO producers (component, subcomponent, interface_id, deprecated)
+    SELECT p.component, p.subcomponent, i.id, p.deprecated
+    FROM producers_before_interface_ids as p
+    JOIN interfaces as i
+    USING (host, itype, iprimary, isecondary, itertiary);
+
+    DROP TABLE consumers_before_interface_ids;
+    DROP TABLE producers_before_interface_ids;
+    CREATE INDEX consumers_component on consumers (component);
+    CREATE INDEX producers_component on producers (component);
+    CREATE INDEX consumers_interface on consumers (interface_id) INCLUDE (optional);
+    CREATE INDEX producers_interface on producers (interface_id);
+    CREATE INDEX consumers_subcomponent on consumers (subcomponent);
+    CREATE INDEX producers_subcomponent on producers (subcomponent);
+    ANALYZE interfaces, consumers, producers;
+'''
+
+# Databases created before the change history start it with a checkpoint of their current state.
+# Run after SQL_MIGRATE_INTERFACE_IDS.
+SQL_MIGRATE_HISTORY = SQL_INIT_HISTORY + SQL_CREATE_CHECKPOINT + SQL_CREATE_CHECKPOINT_COMPONENTS
+
+# Databases created before the text columns were declared in the C collation sort in the collation of the database.
+# Run after SQL_MIGRATE_HISTORY, the indexes are rebuilt, so the writers should be stopped meanwhile.
+SQL_MIGRATE_C_COLLATION = '''
+    ALTER TABLE interfaces
+        ALTER COLUMN host TYPE TEXT COLLATE "C",
+        ALTER COLUMN itype TYPE TEXT COLLATE "C",
+        ALTER COLUMN iprimary TYPE TEXT COLLATE "C",
+        ALTER COLUMN isecondary TYPE TEXT COLLATE "C",
+        ALTER COLUMN itertiary TYPE TEXT COLLATE "C";
+    ALTER TABLE consumers
+        ALTER COLUMN component TYPE TEXT COLLATE "C",
+        ALTER COLUMN subcomponent TYPE TEXT COLLATE "C";
+    ALTER TABLE producers
+        ALTER COLUMN component TYPE TEXT COLLATE "C",
+        ALTER COLUMN subcomponent TYPE TEXT COLLATE "C";
+    ALTER TABLE fingerprints ALTER COLUMN component TYPE TEXT COLLATE "C";
+    ALTER TABLE history ALTER COLUMN component TYPE TEXT COLLATE "C";
+    ALTER TABLE history_checkpoint_components ALTER COLUMN component TYPE TEXT COLLATE "C";
+    ANALYZE interfaces, consumers, producers, fingerprints, history, history_checkpoint_components;
 '''
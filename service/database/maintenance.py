@@ -0,0 +1,38 @@
+"""
+Maintenance of the change history outside of the requests, to be scheduled e.g. hourly by cron or a kubernetes CronJob.
+
+It creates the partitions of the history for the coming months, and a checkpoint of the whole registry
+if queries.HISTORY_CHECKPOINT_INTERVAL generations passed since the last one. Runs without effect are cheap.
+
+    python -m service.database.maintenance
+"""
+import argparse
+import json
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+from .queries import maintain_history
+
+
+def main():
+    from service.config import get_config
+    from service.database import _connection_kwargs
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default='', help='The database, values missing in the DSN are taken from '
+                                                  'POSTGRES_DB_* of the config, like the replica DSNs.')
+    args = parser.parse_args()
+
+    config = get_config()
+    config = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    connection = psycopg2.connect(**{**_connection_kwargs(config), **parse_dsn(args.dsn)})
+    try:
+        checkpoint = maintain_history(connection)
+    finally:
+        connection.close()
+    print(json.dumps({'checkpoint': checkpoint}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+
+from psycopg2 import connect, OperationalError, InterfaceError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+@dataclass
+class PoolStats:
+    size: int
+    in_use: int
+    idle: int
+    waiting: int
+    checkouts: int
+    checkout_failures: int
+    wait_time_total: float
+    wait_time_max: float
+    connections_opened: int
+    connections_discarded: int
+    connections_recycled: int
+
+
+class _PooledConnection:
+    __slots__ = ('connection', 'created_at', 'uses')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.uses = 0
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of psycopg2 connections, health checked on checkout and recycled after max_uses or max_age.
+    """
+
+    def __init__(
+            self,
+            connection_kwargs: dict,
+            min_size: int = 1,
+            max_size: int = 10,
+            timeout: float = 10.0,
+            max_uses: int = 0,
+            max_age: float = 0.0,
+            check_on_checkout: bool = True,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f'Invalid pool size: min_size={min_size}, max_size={max_size}')
+        self._connection_kwargs = connection_kwargs
+        self._min_size = min_size
+        self._max_size = max_size
+        self._timeout = timeout
+        self._max_uses = max_uses
+        self._max_age = max_age
+        self._check_on_checkout = check_on_checkout
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._waiting = 0
+
+        self._checkouts = 0
+        self._checkout_failures = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._connections_opened = 0
+        self._connections_discarded = 0
+        self._connections_recycled = 0
+
+        self.pid = os.getpid()
+        for _ in range(min_size):
+            self._idle.append(self._open())
+            self._size += 1
+
+    def _open(self) -> _PooledConnection:
+        connection = connect(**self._connection_kwargs)
+        with self._lock:
+            self._connections_opened += 1
+        return _PooledConnection(connection)
+
+    def _is_expired(self, pooled: _PooledConnection) -> bool:
+        if self._max_uses and pooled.uses >= self._max_uses:
+            return True
+        if self._max_age and time.monotonic() - pooled.created_at >= self._max_age:
+            return True
+        return False
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        connection = pooled.connection
+        if connection.closed:
+            return False
+        if not self._check_on_checkout:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1;')
+            connection.rollback()
+        except (OperationalError, InterfaceError):
+            return False
+        return True
+
+    @staticmethod
+    def _close(pooled: _PooledConnection) -> None:
+        try:
+            pooled.connection.close()
+        except (OperationalError, InterfaceError):
+            pass
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self._timeout
+        with self._lock:
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._size < self._max_size:
+                    self._size += 1
+                    pooled = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._checkout_failures += 1
+                    raise PoolTimeout(f'No database connection available within {self._timeout} seconds.')
+                self._waiting += 1
+                try:
+                    self._available.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        # connecting and health checks are done without holding the lock
+        try:
+            if pooled is not None and (self._is_expired(pooled) or not self._is_healthy(pooled)):
+                recycled = self._is_expired(pooled)
+                self._close(pooled)
+                with self._lock:
+                    if recycled:
+                        self._connections_recycled += 1
+                    else:
+                        self._connections_discarded += 1
+                pooled = None
+            if pooled is None:
+                pooled = self._open()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._checkout_failures += 1
+                self._available.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._lock:
+            pooled.uses += 1
+            self._in_use[id(pooled.connection)] = pooled
+            self._checkouts += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+        return pooled.connection
+
+    def putconn(self, connection, discard: bool = False) -> None:
+        with self._lock:
+            pooled = self._in_use.pop(id(connection), None)
+        if pooled is None:
+            raise ValueError('The connection does not belong to this pool.')
+
+        if not discard and not connection.closed:
+            try:
+                if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except (OperationalError, InterfaceError):
+                discard = True
+        discard = discard or connection.closed
+
+        with self._lock:
+            if discard:
+                self._connections_discarded += 1
+            elif self._is_expired(pooled):
+                self._connections_recycled += 1
+                discard = True
+            else:
+                self._idle.append(pooled)
+            if discard:
+                self._size -= 1
+            self._available.notify()
+        if discard:
+            self._close(pooled)
+
+    def closeall(self) -> None:
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            return PoolStats(
+                size=self._size,
+                in_use=len(self._in_use),
+                idle=len(self._idle),
+                waiting=self._waiting,
+                checkouts=self._checkouts,
+                checkout_failures=self._checkout_failures,
+                wait_time_total=self._wait_time_total,
+                wait_time_max=self._wait_time_max,
+                connections_opened=self._connections_opened,
+                connections_discarded=self._connections_discarded,
+                connections_recycled=self._connections_recycled,
+            )
+
+    def stats_dict(self) -> dict:
+        return asdict(self.stats())
@@ -1,97 +1,465 @@
+import io
+import json
+import weakref
 from collections import Counter, defaultdict
-from typing import List
+from contextlib import contextmanager
+from dataclasses import dataclass
+from hashlib import blake2b, sha256
+from itertools import groupby
+from typing import Collection, Dict, List, Iterable, Iterator, Tuple, Optional
 
 import psycopg2
 from psycopg2.extras import execute_values
-from psycopg2.sql import SQL, Literal
-from psycopg2.errors import UniqueViolation, RaiseException
+from psycopg2.sql import SQL, Identifier
+from psycopg2.errors import UniqueViolation
 
+from service.util.metrics import count_rows, phase
 from service.util.parse_interfaces import (
     Component,
     ConsumerRecord,
     ProducerRecord,
 )
 
-SQL_LOCK_EXCLUSIVE_CONSUMERS = 'LOCK TABLE consumers IN EXCLUSIVE MODE;'
-
-SQL_DELETE_CONSUMERS = '''
-DELETE FROM consumers
-WHERE component={component}
+# transaction scoped advisory locks, acquired in the given order
+SQL_ADVISORY_LOCKS = '''
+SELECT count(pg_advisory_xact_lock(lock_id))
+FROM unnest(%s::bigint[]) AS lock_id;
 '''
-SQL_CONSUMERS_NOT_IN = '''
-AND (subcomponent, host, itype, iprimary, isecondary, itertiary, optional) NOT IN (VALUES %s)
+
+SQL_GET_COMPONENT_CONSUMERS = '''
+SELECT c.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary, c.optional, i.id
+FROM consumers as c
+JOIN interfaces as i
+ON i.id = c.interface_id
+WHERE c.component = %s;
 '''
 
-SQL_DELETE_PRODUCERS = '''
-DELETE FROM producers
-WHERE component={component}
+SQL_GET_COMPONENT_PRODUCERS = '''
+SELECT p.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary, p.deprecated, i.id
+FROM producers as p
+JOIN interfaces as i
+ON i.id = p.interface_id
+WHERE p.component = %s;
 '''
 
-SQL_PRODUCERS_NOT_IN = '''
-AND (subcomponent, host, itype, iprimary, isecondary, itertiary, deprecated) NOT IN (VALUES %s)
+# interface keys nobody consumes or produces anymore
+SQL_DELETE_UNUSED_INTERFACES = '''
+DELETE FROM interfaces as i
+WHERE i.id = ANY(%s)
+AND NOT EXISTS (SELECT 1 FROM consumers as c WHERE c.interface_id = i.id)
+AND NOT EXISTS (SELECT 1 FROM producers as p WHERE p.interface_id = i.id);
 '''
 
-SQL_INSERT_CONSUMERS = '''
-INSERT INTO consumers (component, subcomponent, host, itype, iprimary, isecondary, itertiary, optional)
+# the declarations of a write are copied into these tables of the session, emptied by every commit and rollback.
+# They are created once per connection, see _create_staging_tables.
+SQL_CREATE_STAGED_DECLARATIONS = '''
+CREATE TEMPORARY TABLE IF NOT EXISTS staged_consumers
 (
-    SELECT {component}, v.subcomponent, v.host, v.itype, v.iprimary, v.isecondary, v.itertiary, v.optional
-    FROM (VALUES %s) as v (subcomponent, host, itype, iprimary, isecondary, itertiary, optional)
-    WHERE (v.subcomponent, v.host, v.itype, v.iprimary, v.isecondary, v.itertiary, v.optional)
-    NOT IN (
-        SELECT c.subcomponent, c.host, c.itype, c.iprimary, c.isecondary, c.itertiary, c.optional
-        FROM consumers as c
-        WHERE c.component = {component}
-    )
-);
+    component TEXT NOT NULL,
+    subcomponent TEXT NOT NULL,
+    host TEXT NOT NULL,
+    itype TEXT NOT NULL,
+    iprimary TEXT NOT NULL,
+    isecondary TEXT NOT NULL,
+    itertiary TEXT NOT NULL,
+    optional BOOLEAN NOT NULL,
+    interface_id INTEGER
+) ON COMMIT DELETE ROWS;
+CREATE TEMPORARY TABLE IF NOT EXISTS staged_producers
+(
+    component TEXT NOT NULL,
+    subcomponent TEXT NOT NULL,
+    host TEXT NOT NULL,
+    itype TEXT NOT NULL,
+    iprimary TEXT NOT NULL,
+    isecondary TEXT NOT NULL,
+    itertiary TEXT NOT NULL,
+    deprecated BOOLEAN NOT NULL,
+    interface_id INTEGER
+) ON COMMIT DELETE ROWS;
 '''
 
-SQL_INSERT_PRODUCERS = '''
-INSERT INTO producers (component, subcomponent, host, itype, iprimary, isecondary, itertiary, deprecated)
-(
-    SELECT {component}, v.subcomponent, v.host, v.itype, v.iprimary, v.isecondary, v.itertiary, v.deprecated
-    FROM (VALUES %s) as v (subcomponent, host, itype, iprimary, isecondary, itertiary, deprecated)
-    WHERE (v.subcomponent, v.host, v.itype, v.iprimary, v.isecondary, v.itertiary, v.deprecated)
-    NOT IN (
-        SELECT p.subcomponent, p.host, p.itype, p.iprimary, p.isecondary, p.itertiary, p.deprecated
-        FROM producers as p
-        WHERE p.component = {component}
-    )
-);
+STAGED_KEY_COLUMNS = ('component', 'subcomponent', 'host', 'itype', 'iprimary', 'isecondary', 'itertiary')
+STAGED_CONSUMER_COLUMNS = STAGED_KEY_COLUMNS + ('optional', 'interface_id')
+STAGED_PRODUCER_COLUMNS = STAGED_KEY_COLUMNS + ('deprecated', 'interface_id')
+
+# the characters escaped in the text format of COPY
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+SQL_COPY_STAGED_CONSUMERS = f'COPY staged_consumers ({", ".join(STAGED_CONSUMER_COLUMNS)}) FROM STDIN;'
+SQL_COPY_STAGED_PRODUCERS = f'COPY staged_producers ({", ".join(STAGED_PRODUCER_COLUMNS)}) FROM STDIN;'
+
+# sets the missing interface ids of the staged rows, unknown interface keys are added. The ids are known if
+# the component uses the interface already, the others are added keys, so their advisory locks are held
+# and no other writer adds them concurrently.
+SQL_RESOLVE_STAGED_INTERFACE_IDS = '''
+INSERT INTO interfaces (host, itype, iprimary, isecondary, itertiary)
+SELECT k.host, k.itype, k.iprimary, k.isecondary, k.itertiary
+FROM (
+    SELECT host, itype, iprimary, isecondary, itertiary FROM staged_consumers WHERE interface_id IS NULL
+    UNION
+    SELECT host, itype, iprimary, isecondary, itertiary FROM staged_producers WHERE interface_id IS NULL
+) as k
+WHERE NOT EXISTS (
+    SELECT 1
+    FROM interfaces as i
+    WHERE i.host = k.host
+    AND i.itype = k.itype
+    AND i.iprimary = k.iprimary
+    AND i.isecondary = k.isecondary
+    AND i.itertiary = k.itertiary
+)
+ORDER BY k.host, k.itype, k.iprimary, k.isecondary, k.itertiary
+ON CONFLICT DO NOTHING;
+UPDATE staged_consumers as s
+SET interface_id = i.id
+FROM interfaces as i
+WHERE i.host = s.host
+AND i.itype = s.itype
+AND i.iprimary = s.iprimary
+AND i.isecondary = s.isecondary
+AND i.itertiary = s.itertiary
+AND s.interface_id IS NULL;
+UPDATE staged_producers as s
+SET interface_id = i.id
+FROM interfaces as i
+WHERE i.host = s.host
+AND i.itype = s.itype
+AND i.iprimary = s.iprimary
+AND i.isecondary = s.isecondary
+AND i.itertiary = s.itertiary
+AND s.interface_id IS NULL;
+'''
+
+# temporary tables are not analyzed automatically, without statistics large anti-joins are planned as nested loops
+SQL_ANALYZE_STAGED_DECLARATIONS = 'ANALYZE staged_consumers, staged_producers;'
+
+# the stored rows of the given components which are not staged
+SQL_DELETE_UNSTAGED_CONSUMERS = '''
+DELETE FROM consumers as c
+WHERE c.component = ANY(%s)
+AND NOT EXISTS (
+    SELECT 1
+    FROM staged_consumers as s
+    WHERE s.component = c.component
+    AND s.subcomponent = c.subcomponent
+    AND s.interface_id = c.interface_id
+    AND s.optional = c.optional
+)
+RETURNING c.component, c.interface_id;
+'''
+
+SQL_DELETE_UNSTAGED_PRODUCERS = '''
+DELETE FROM producers as p
+WHERE p.component = ANY(%s)
+AND NOT EXISTS (
+    SELECT 1
+    FROM staged_producers as s
+    WHERE s.component = p.component
+    AND s.subcomponent = p.subcomponent
+    AND s.interface_id = p.interface_id
+    AND s.deprecated = p.deprecated
+)
+RETURNING p.component, p.interface_id;
+'''
+
+# the staged rows which are not stored yet, only the stored rows of the given components are compared
+SQL_INSERT_STAGED_CONSUMERS = '''
+INSERT INTO consumers (component, subcomponent, interface_id, optional)
+SELECT s.component, s.subcomponent, s.interface_id, s.optional
+FROM staged_consumers as s
+WHERE NOT EXISTS (
+    SELECT 1
+    FROM consumers as c
+    WHERE c.component = ANY(%s)
+    AND c.component = s.component
+    AND c.subcomponent = s.subcomponent
+    AND c.interface_id = s.interface_id
+    AND c.optional = s.optional
+)
+RETURNING component, interface_id;
+'''
+
+SQL_INSERT_STAGED_PRODUCERS = '''
+INSERT INTO producers (component, subcomponent, interface_id, deprecated)
+SELECT s.component, s.subcomponent, s.interface_id, s.deprecated
+FROM staged_producers as s
+WHERE NOT EXISTS (
+    SELECT 1
+    FROM producers as p
+    WHERE p.component = ANY(%s)
+    AND p.component = s.component
+    AND p.subcomponent = s.subcomponent
+    AND p.interface_id = s.interface_id
+    AND p.deprecated = s.deprecated
+)
+RETURNING component, interface_id;
+'''
+
+SQL_GET_FINGERPRINTS = '''
+SELECT component, fingerprint
+FROM fingerprints
+WHERE component = ANY(%s);
+'''
+
+SQL_SET_FINGERPRINT = '''
+INSERT INTO fingerprints (component, fingerprint)
+VALUES (%s, %s)
+ON CONFLICT (component) DO UPDATE SET fingerprint = EXCLUDED.fingerprint;
 '''
 
-SQL_GET_CONSUMERS = '''
+SQL_INCREMENT_GENERATION = '''
+UPDATE registry_generation
+SET generation = generation + 1
+RETURNING generation;
+'''
+
+SQL_GET_GENERATION = '''
+SELECT generation
+FROM registry_generation;
+'''
+
+# Functions beginning a transaction of their own, like the snapshots, must not be called within a transaction.
+SQL_BEGIN_SNAPSHOT = 'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;'
+
+# one row per changed component, the records are json arrays of rows
+# (subcomponent, host, type, primary, secondary, tertiary, optional or deprecated).
+# The statement starts after the generation was incremented, so the timestamps increase with the generations.
+SQL_INSERT_HISTORY = '''
+INSERT INTO history
+(generation, changed_at, component, added_consumers, removed_consumers, added_producers, removed_producers)
+SELECT %s, statement_timestamp(), component, ac::jsonb, rc::jsonb, ap::jsonb, rp::jsonb
+FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::text[]) AS d (component, ac, rc, ap, rp);
+'''
+
+SQL_BEGIN_CHECKPOINT = 'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;'
+
+SQL_CREATE_CHECKPOINT = '''
+INSERT INTO history_checkpoints (generation, created_at)
+SELECT generation, statement_timestamp()
+FROM registry_generation
+ON CONFLICT DO NOTHING
+RETURNING generation;
+'''
+
+# the state of every component at the generation of the checkpoint, as in the history
+SQL_CREATE_CHECKPOINT_COMPONENTS = '''
+INSERT INTO history_checkpoint_components (generation, component, consumers, producers)
+SELECT (SELECT generation FROM registry_generation), component, coalesce(c.rows, '[]'), coalesce(p.rows, '[]')
+FROM (
+    SELECT c.component, jsonb_agg(jsonb_build_array(
+        c.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary, c.optional)) as rows
+    FROM consumers as c
+    JOIN interfaces as i
+    ON i.id = c.interface_id
+    GROUP BY c.component
+) as c
+FULL JOIN (
+    SELECT p.component, jsonb_agg(jsonb_build_array(
+        p.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary, p.deprecated)) as rows
+    FROM producers as p
+    JOIN interfaces as i
+    ON i.id = p.interface_id
+    GROUP BY p.component
+) as p
+USING (component);
+'''
+
+SQL_CREATE_HISTORY_PARTITIONS = 'SELECT create_history_partitions(%s);'
+
+# NULL if there is no checkpoint
+SQL_GET_GENERATIONS_SINCE_CHECKPOINT = '''
+SELECT generation - (SELECT max(generation) FROM history_checkpoints)
+FROM registry_generation;
+'''
+
+# sent within the writing transaction, so listeners receive the changes in the order of the generations
+REGISTRY_CHANNEL = 'registry_changes'
+SQL_NOTIFY_CHANGE = 'SELECT pg_notify(%s, %s);'
+SQL_LISTEN = 'LISTEN registry_changes;'
+# postgres rejects payloads of 8000 bytes and more
+MAX_NOTIFY_PAYLOAD_BYTES = 7900
+
+# non optional consumers of the given interfaces without any producer
+SQL_GET_UNSATISFIED_CONSUMERS = '''
+SELECT c.component, c.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary
+FROM consumers as c
+JOIN interfaces as i
+ON i.id = c.interface_id
+WHERE c.interface_id = ANY(%s)
+AND NOT c.optional
+AND NOT EXISTS (
+    SELECT 1
+    FROM producers as p
+    WHERE p.interface_id = c.interface_id
+)
+'''
+
+SQL_GET_FILTERED_CONSUMERS = '''
 SELECT
     c.component as component,
     c.subcomponent as sub_component,
-    c.host as interface_host,
-    c.itype as interface_type,
-    c.iprimary as primary,
-    c.isecondary as secondary,
-    c.itertiary as tertiary,
+    i.host as interface_host,
+    i.itype as interface_type,
+    i.iprimary as primary,
+    i.isecondary as secondary,
+    i.itertiary as tertiary,
     c.optional as optional
-FROM consumers as c;
+FROM consumers as c
+JOIN interfaces as i
+ON i.id = c.interface_id
+WHERE {conditions}
+ORDER BY c.component COLLATE "C", c.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary;
 '''
 
-SQL_GET_PRODUCERS = '''
+SQL_GET_FILTERED_PRODUCERS = '''
 SELECT
     p.component as component,
     p.subcomponent as sub_component,
-    p.host as interface_host,
-    p.itype as interface_type,
-    p.iprimary as primary,
-    p.isecondary as secondary,
-    p.itertiary as tertiary,
+    i.host as interface_host,
+    i.itype as interface_type,
+    i.iprimary as primary,
+    i.isecondary as secondary,
+    i.itertiary as tertiary,
     p.deprecated as deprecated
-FROM producers as p;
+FROM producers as p
+JOIN interfaces as i
+ON i.id = p.interface_id
+WHERE {conditions}
+ORDER BY p.component COLLATE "C", p.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary;
+'''
+
+SQL_GET_CONSUMERS = SQL_GET_FILTERED_CONSUMERS.format(conditions='TRUE')
+
+SQL_GET_PRODUCERS = SQL_GET_FILTERED_PRODUCERS.format(conditions='TRUE')
+
+# a NULL part of a requested interface key matches every value
+SQL_GET_INTERFACE_RECORDS = '''
+SELECT k.position, r.component, r.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary, r.{flag}
+FROM (VALUES %s) as k (position, host, itype, iprimary, isecondary, itertiary)
+JOIN interfaces as i
+ON i.host = k.host
+AND i.itype = k.itype
+AND (k.iprimary IS NULL OR i.iprimary = k.iprimary)
+AND (k.isecondary IS NULL OR i.isecondary = k.isecondary)
+AND (k.itertiary IS NULL OR i.itertiary = k.itertiary)
+JOIN {table} as r
+ON r.interface_id = i.id
+ORDER BY k.position, r.component, r.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary;
+'''
+
+SQL_INTERFACE_KEY_TEMPLATE = '(%s, %s, %s, %s::text, %s::text, %s::text)'
+
+# ordered in the C collation, the order of python strings, so the names of both tables merge and page consistently
+SQL_GET_FILTERED_COMPONENT_NAMES = '''
+SELECT DISTINCT component COLLATE "C" as component
+FROM {table} as r
+JOIN interfaces as i
+ON i.id = r.interface_id
+WHERE {conditions}
+ORDER BY component COLLATE "C"
+LIMIT %s;
 '''
 
 
+@dataclass
+class InterfaceUpdate:
+    component: str
+    unchanged: bool
+    generation: Optional[int] = None
+    # the number of consumers and producers added and removed by the update
+    added: int = 0
+    removed: int = 0
+
+
+# rows fetched per round trip by server side cursors
+STREAM_ITERSIZE = 2000
+
+# staged declarations with more rows are analyzed before they are applied
+STAGED_ANALYZE_ROWS = 1000
+
+# the connections whose session has the staging tables
+_STAGING_CONNECTIONS = weakref.WeakSet()
+
+# a checkpoint of the whole registry is stored every this many generations, see service.database.history
+HISTORY_CHECKPOINT_INTERVAL = 1000
+# monthly partitions of the history created in advance
+HISTORY_PARTITIONS_AHEAD = 2
+
+
+@dataclass
+class ComponentFilter:
+    """
+    Restricts the listed records. primary, secondary and tertiary match prefixes, all other fields match exactly.
+    """
+    component: Optional[str] = None
+    sub_component: Optional[str] = None
+    interface_host: Optional[str] = None
+    interface_type: Optional[str] = None
+    primary: Optional[str] = None
+    secondary: Optional[str] = None
+    tertiary: Optional[str] = None
+    include_consumers: bool = True
+    include_producers: bool = True
+
+
+@dataclass
+class InterfaceQuery:
+    """
+    Identifies one or, if primary, secondary or tertiary are omitted, several interfaces.
+    """
+    interface_host: str
+    interface_type: str
+    primary: Optional[str] = None
+    secondary: Optional[str] = None
+    tertiary: Optional[str] = None
+
+
+@dataclass
+class InterfaceUsage:
+    """
+    The consumers and producers of the interfaces of an InterfaceQuery as pairs of component and record.
+    """
+    consumers: List[Tuple[str, ConsumerRecord]]
+    producers: List[Tuple[str, ProducerRecord]]
+
+
 class InterfaceEntryDuplication(Exception):
     pass
 
 
+@dataclass(frozen=True, order=True)
+class UnsatisfiedConsumer:
+    component: str
+    sub_component: str
+    interface_host: str
+    interface_type: str
+    primary: str
+    secondary: str
+    tertiary: str
+
+    def describe(self, changed_components: Collection[str]) -> str:
+        interface = ' '.join(
+            f'"{part}"'
+            for part
+            in (self.interface_host, self.interface_type, self.primary, self.secondary, self.tertiary)
+        )
+        if self.component in changed_components:
+            return f'no producer for interface {interface}'
+        return f'no other producer for interface {interface} used by "{self.component}" "{self.sub_component}"'
+
+
+@dataclass
+class InterfaceCheck:
+    component: str
+    unchanged: bool
+    conflicts: List[UnsatisfiedConsumer]
+
+
 class InterfaceEntryConflict(Exception):
-    pass
+    def __init__(self, message: str, conflicts: List[UnsatisfiedConsumer] = ()):
+        super().__init__(message)
+        self.conflicts = list(conflicts)
 
 
 def _guarantee_consumer_uniqueness(consumers: List[ConsumerRecord]) -> None:
@@ -118,73 +486,442 @@ def _guarantee_producer_uniqueness(producers: List[ProducerRecord]) -> None:
             f'The following producer was specified multiple times: {non_unique_producers[0]}')
 
 
-def set_interface(connection, component: str, consumers: List[ConsumerRecord], producers: List[ProducerRecord]) -> None:
-    _guarantee_consumer_uniqueness(consumers)
-    _guarantee_producer_uniqueness(producers)
+def _advisory_lock_id(*key: str) -> int:
+    digest = blake2b('\x1f'.join(key).encode(), digest_size=8, person=b'interfaces').digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def component_lock_id(component: str) -> int:
+    return _advisory_lock_id('component', component)
+
+
+def interface_lock_id(host: str, itype: str, iprimary: str, isecondary: str, itertiary: str) -> int:
+    return _advisory_lock_id('interface', host, itype, iprimary, isecondary, itertiary)
+
 
-    consumers_for_db = [
+def _acquire_advisory_locks(cursor, lock_ids: Iterable[int]) -> None:
+    lock_ids = sorted(set(lock_ids))
+    with phase('lock'):
+        cursor.execute(SQL_ADVISORY_LOCKS, (lock_ids,))
+
+
+def _get_unsatisfied_consumers(cursor, interface_ids: Collection[int]) -> List[UnsatisfiedConsumer]:
+    if not interface_ids:
+        return []
+    cursor.execute(SQL_GET_UNSATISFIED_CONSUMERS, (list(interface_ids),))
+    return [UnsatisfiedConsumer(*row) for row in sorted(cursor.fetchall())]
+
+
+def _consumers_for_db(consumers: List[ConsumerRecord]) -> List[Tuple]:
+    return [
         (c.sub_component, c.interface_host, c.interface_type, c.primary, c.secondary, c.tertiary, c.optional)
         for c
         in consumers
     ]
-    producers_for_db = [
+
+
+def _producers_for_db(producers: List[ProducerRecord]) -> List[Tuple]:
+    return [
         (p.sub_component, p.interface_host, p.interface_type, p.primary, p.secondary, p.tertiary, p.deprecated)
         for p
         in producers
     ]
 
-    try:
-        sql_delete_consumers = SQL(SQL_DELETE_CONSUMERS).format(component=Literal(component))
-        sql_delete_producers = SQL(SQL_DELETE_PRODUCERS).format(component=Literal(component))
-        sql_insert_consumers = SQL(SQL_INSERT_CONSUMERS).format(component=Literal(component))
-        sql_insert_producers = SQL(SQL_INSERT_PRODUCERS).format(component=Literal(component))
 
+def _fingerprint(consumers_for_db: List[Tuple], producers_for_db: List[Tuple]) -> str:
+    """
+    Hash of the declaration, independent of the order of its entries.
+    """
+    canonical = json.dumps([sorted(consumers_for_db), sorted(producers_for_db)], separators=(',', ':'))
+    return sha256(canonical.encode()).hexdigest()
+
+
+@dataclass
+class Declaration:
+    component: str
+    consumers_for_db: List[Tuple]
+    producers_for_db: List[Tuple]
+    fingerprint: str
+
+
+def build_declaration(component: str, consumers: List[ConsumerRecord], producers: List[ProducerRecord]) -> Declaration:
+    _guarantee_consumer_uniqueness(consumers)
+    _guarantee_producer_uniqueness(producers)
+    consumers_for_db = _consumers_for_db(consumers)
+    producers_for_db = _producers_for_db(producers)
+    return Declaration(
+        component=component,
+        consumers_for_db=consumers_for_db,
+        producers_for_db=producers_for_db,
+        fingerprint=_fingerprint(consumers_for_db, producers_for_db),
+    )
+
+
+@dataclass
+class Delta:
+    """
+    The rows (subcomponent, host, type, primary, secondary, tertiary, flag) a declaration adds and removes.
+    """
+    component: str
+    added_consumers: List[Tuple]
+    removed_consumers: List[Tuple]
+    added_producers: List[Tuple]
+    removed_producers: List[Tuple]
+
+    def interface_keys(self) -> set:
+        """
+        The interface keys (host, type, primary, secondary, tertiary) of all added and removed rows.
+        """
+        return {
+            row[1:6]
+            for rows in (self.added_consumers, self.removed_consumers, self.added_producers, self.removed_producers)
+            for row in rows
+        }
+
+
+def build_delta(
+        declaration: Declaration,
+        current_consumers: Iterable[Tuple],
+        current_producers: Iterable[Tuple],
+) -> Delta:
+    current_consumers = set(current_consumers)
+    current_producers = set(current_producers)
+    declared_consumers = set(declaration.consumers_for_db)
+    declared_producers = set(declaration.producers_for_db)
+    return Delta(
+        component=declaration.component,
+        added_consumers=sorted(declared_consumers - current_consumers),
+        removed_consumers=sorted(current_consumers - declared_consumers),
+        added_producers=sorted(declared_producers - current_producers),
+        removed_producers=sorted(current_producers - declared_producers),
+    )
+
+
+def _get_delta(cursor, declaration: Declaration, interface_ids: Optional[Dict[Tuple, int]] = None) -> Delta:
+    """
+    The ids of the interfaces the component currently uses are added to interface_ids.
+    """
+    cursor.execute(SQL_GET_COMPONENT_CONSUMERS, (declaration.component,))
+    current_consumers = cursor.fetchall()
+    cursor.execute(SQL_GET_COMPONENT_PRODUCERS, (declaration.component,))
+    current_producers = cursor.fetchall()
+    if interface_ids is not None:
+        interface_ids.update((row[1:6], row[7]) for row in current_consumers + current_producers)
+    return build_delta(declaration, (row[:7] for row in current_consumers), (row[:7] for row in current_producers))
+
+
+def _get_changed_interface_keys(cursor, declaration: Declaration) -> set:
+    return _get_delta(cursor, declaration).interface_keys()
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, int):
+        return str(value)
+    return value.translate(COPY_ESCAPES)
+
+
+def _copy_rows(cursor, sql: str, rows: List[Tuple]) -> None:
+    """
+    Sends the rows with COPY ... FROM STDIN in its text format.
+    """
+    if rows:
+        cursor.copy_expert(sql, io.StringIO(''.join('\t'.join(map(_copy_value, row)) + '\n' for row in rows)))
+
+
+def staged_rows(declarations: List[Declaration], interface_ids: Dict[Tuple, int]) -> Tuple[List[Tuple], List[Tuple]]:
+    """
+    The declarations as rows of the staging tables, see STAGED_CONSUMER_COLUMNS, interface ids not known are None.
+    """
+    consumers = [
+        (d.component,) + row + (interface_ids.get(row[1:6]),)
+        for d in declarations
+        for row in d.consumers_for_db
+    ]
+    producers = [
+        (d.component,) + row + (interface_ids.get(row[1:6]),)
+        for d in declarations
+        for row in d.producers_for_db
+    ]
+    return consumers, producers
+
+
+def _create_staging_tables(connection) -> None:
+    # in a transaction of its own, a rollback of a write would drop tables created within it
+    if connection in _STAGING_CONNECTIONS:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_CREATE_STAGED_DECLARATIONS)
+    connection.commit()
+    _STAGING_CONNECTIONS.add(connection)
+
+
+def _stage_declarations(cursor, declarations: List[Declaration], interface_ids: Dict[Tuple, int]) -> None:
+    consumers, producers = staged_rows(declarations, interface_ids)
+    _copy_rows(cursor, SQL_COPY_STAGED_CONSUMERS, consumers)
+    _copy_rows(cursor, SQL_COPY_STAGED_PRODUCERS, producers)
+    if any(row[-1] is None for row in consumers + producers):
+        cursor.execute(SQL_RESOLVE_STAGED_INTERFACE_IDS)
+    if len(consumers) + len(producers) > STAGED_ANALYZE_ROWS:
+        cursor.execute(SQL_ANALYZE_STAGED_DECLARATIONS)
+
+
+def _write_interfaces(cursor, declarations: List[Declaration]) -> Tuple[List[int], List[Delta], Counter, Counter]:
+    """
+    Replaces the interfaces in the transaction, returns the changed interface ids, deltas, deleted and inserted rows.
+    """
+    # Writers lock their components and the interface keys they change, so writers with disjoint changes run
+    # concurrently. Component locks before interface locks, both sorted, so writers cannot deadlock.
+    _acquire_advisory_locks(cursor, (component_lock_id(d.component) for d in declarations))
+    interface_ids = {}
+    with phase('diff'):
+        deltas = [_get_delta(cursor, declaration, interface_ids) for declaration in declarations]
+    changed_keys = set().union(*(delta.interface_keys() for delta in deltas))
+    _acquire_advisory_locks(cursor, (interface_lock_id(*key) for key in changed_keys))
+    components = [d.component for d in declarations]
+    with phase('write'):
+        _stage_declarations(cursor, declarations, interface_ids)
+        # delete consumers before deleting producers, insert producers before inserting consumers
+        cursor.execute(SQL_DELETE_UNSTAGED_CONSUMERS, (components,))
+        deleted_rows = cursor.fetchall()
+        cursor.execute(SQL_DELETE_UNSTAGED_PRODUCERS, (components,))
+        deleted_rows += cursor.fetchall()
+        cursor.execute(SQL_INSERT_STAGED_PRODUCERS, (components,))
+        inserted_rows = cursor.fetchall()
+        cursor.execute(SQL_INSERT_STAGED_CONSUMERS, (components,))
+        inserted_rows += cursor.fetchall()
+        for declaration in declarations:
+            cursor.execute(SQL_SET_FINGERPRINT, (declaration.component, declaration.fingerprint))
+    return (
+        sorted({row[1] for row in deleted_rows + inserted_rows}),
+        deltas,
+        Counter(row[0] for row in deleted_rows),
+        Counter(row[0] for row in inserted_rows),
+    )
+
+
+def _validate_interfaces(cursor, components: Collection[str], changed_interface_ids: Collection[int]) -> None:
+    """
+    Raises InterfaceEntryConflict with all non optional consumers of the changed interfaces without a producer.
+    """
+    with phase('conflicts'):
+        unsatisfied_consumers = _get_unsatisfied_consumers(cursor, changed_interface_ids)
+    if unsatisfied_consumers:
+        raise InterfaceEntryConflict(
+            'Error: ' + '; '.join(c.describe(components) for c in unsatisfied_consumers),
+            unsatisfied_consumers,
+        )
+
+
+def change_notification(generation: int, components: List[str]) -> str:
+    """
+    The payload announcing the changed components of a generation, null if they are too many to name.
+    """
+    payload = json.dumps({'generation': generation, 'components': components})
+    if len(payload.encode()) > MAX_NOTIFY_PAYLOAD_BYTES:
+        payload = json.dumps({'generation': generation, 'components': None})
+    return payload
+
+
+def history_columns(deltas: List[Delta]) -> List[List[str]]:
+    """
+    The changed components and their rows as json, one list per column of SQL_INSERT_HISTORY after the generation.
+    """
+    deltas = [delta for delta in deltas if delta.interface_keys()]
+    return [
+        [delta.component for delta in deltas],
+        [json.dumps(delta.added_consumers) for delta in deltas],
+        [json.dumps(delta.removed_consumers) for delta in deltas],
+        [json.dumps(delta.added_producers) for delta in deltas],
+        [json.dumps(delta.removed_producers) for delta in deltas],
+    ]
+
+
+def _record_history(cursor, generation: int, deltas: List[Delta]) -> None:
+    columns = history_columns(deltas)
+    if columns[0]:
+        cursor.execute(SQL_INSERT_HISTORY, (generation, *columns))
+
+
+def create_history_checkpoint(connection) -> Optional[int]:
+    """
+    Stores the whole registry as a checkpoint of the history, returns its generation, None if there already is one.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_BEGIN_CHECKPOINT)
+        cursor.execute(SQL_CREATE_CHECKPOINT)
+        row = cursor.fetchone()
+        if row is not None:
+            cursor.execute(SQL_CREATE_CHECKPOINT_COMPONENTS)
+    connection.commit()
+    return row[0] if row is not None else None
+
+
+def create_history_partitions(connection) -> None:
+    """
+    Creates the partitions of the history for the current and the next HISTORY_PARTITIONS_AHEAD months.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_CREATE_HISTORY_PARTITIONS, (HISTORY_PARTITIONS_AHEAD,))
+    connection.commit()
+
+
+def maintain_history(connection) -> Optional[int]:
+    """
+    Creates the upcoming partitions of the history and a checkpoint if one is due, returns its generation or None.
+    """
+    # in a transaction of its own, as creating a partition locks the history
+    create_history_partitions(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_GET_GENERATIONS_SINCE_CHECKPOINT)
+        generations, = cursor.fetchone()
+    connection.commit()
+    if generations is not None and generations < HISTORY_CHECKPOINT_INTERVAL:
+        return None
+    return create_history_checkpoint(connection)
+
+
+def interface_updates(
+        declarations: List[Declaration],
+        stored_fingerprints: Dict[str, str],
+        generation: Optional[int],
+        added: Optional[Dict[str, int]] = None,
+        removed: Optional[Dict[str, int]] = None,
+) -> List[InterfaceUpdate]:
+    added = added or {}
+    removed = removed or {}
+    return [
+        InterfaceUpdate(
+            component=d.component,
+            unchanged=False,
+            generation=generation,
+            added=added.get(d.component, 0),
+            removed=removed.get(d.component, 0),
+        )
+        if stored_fingerprints.get(d.component) != d.fingerprint
+        else InterfaceUpdate(component=d.component, unchanged=True)
+        for d
+        in declarations
+    ]
+
+
+def _set_interfaces(connection, declarations: List[Declaration]) -> List[InterfaceUpdate]:
+    _create_staging_tables(connection)
+    try:
         with connection.cursor() as cursor:
-            # delete consumers before deleting producers
-            cursor.execute(SQL_LOCK_EXCLUSIVE_CONSUMERS)
-            if consumers_for_db:
-                execute_values(
-                    cursor,
-                    sql_delete_consumers + SQL(SQL_CONSUMERS_NOT_IN),
-                    consumers_for_db,
-                    page_size=len(consumers_for_db),  # sending chunkwise would delete all elements not in chunk
-                )
-            else:
-                cursor.execute(sql_delete_consumers)
-            if producers_for_db:
-                execute_values(
-                    cursor,
-                    sql_delete_producers + SQL(SQL_PRODUCERS_NOT_IN),
-                    producers_for_db,
-                    page_size=len(producers_for_db),  # sending chunkwise would delete all elements not in chunk
-                )
-            else:
-                cursor.execute(sql_delete_producers)
-            # insert producers before inserting consumers
-            execute_values(cursor, sql_insert_producers, producers_for_db)
-            execute_values(cursor, sql_insert_consumers, consumers_for_db)
-        connection.commit()
+            # unchanged declarations need neither locks nor writes
+            with phase('diff'):
+                cursor.execute(SQL_GET_FINGERPRINTS, ([d.component for d in declarations],))
+                stored_fingerprints = dict(cursor.fetchall())
+            changed_declarations = [
+                d
+                for d in declarations
+                if stored_fingerprints.get(d.component) != d.fingerprint
+            ]
+            if not changed_declarations:
+                with phase('commit'):
+                    connection.commit()
+                return interface_updates(declarations, stored_fingerprints, None)
+
+            changed_interface_ids, deltas, deleted, inserted = _write_interfaces(cursor, changed_declarations)
+            if not deleted and not inserted:
+                # stored meanwhile by a concurrent upload of the same declarations, only the fingerprints were written
+                with phase('commit'):
+                    connection.commit()
+                return interface_updates(declarations, {d.component: d.fingerprint for d in declarations}, None)
+            _validate_interfaces(cursor, [d.component for d in changed_declarations], changed_interface_ids)
+            with phase('write'):
+                cursor.execute(SQL_DELETE_UNUSED_INTERFACES, (changed_interface_ids,))
+            # the generation row is locked until commit, so it is incremented as late as possible
+            cursor.execute(SQL_INCREMENT_GENERATION)
+            generation = cursor.fetchone()[0]
+            with phase('write'):
+                _record_history(cursor, generation, deltas)
+            cursor.execute(SQL_NOTIFY_CHANGE, (
+                REGISTRY_CHANNEL,
+                change_notification(generation, [d.component for d in changed_declarations]),
+            ))
+        with phase('commit'):
+            connection.commit()
+        count_rows('deleted', sum(deleted.values()))
+        count_rows('inserted', sum(inserted.values()))
     except UniqueViolation as e:
+        connection.rollback()
         raise InterfaceEntryDuplication(f'The interface specification contains one value multiple times: {e}')
-    except RaiseException as e:
-        raise InterfaceEntryConflict(f'Error: {e.pgerror.splitlines()[0]}')
+    except InterfaceEntryConflict:
+        connection.rollback()
+        raise
 
+    return interface_updates(declarations, stored_fingerprints, generation, inserted, deleted)
+
+
+def set_interface(
+        connection,
+        component: str,
+        consumers: List[ConsumerRecord],
+        producers: List[ProducerRecord],
+) -> InterfaceUpdate:
+    update, = _set_interfaces(connection, [build_declaration(component, consumers, producers)])
+    return update
+
+
+def build_declarations(
+        interfaces: Dict[str, Tuple[List[ConsumerRecord], List[ProducerRecord]]],
+) -> List[Declaration]:
+    declarations = []
+    for component, (consumers, producers) in interfaces.items():
+        try:
+            declarations.append(build_declaration(component, consumers, producers))
+        except InterfaceEntryDuplication as e:
+            raise InterfaceEntryDuplication(f'Component "{component}": {e}')
+    return declarations
+
+
+def set_interfaces(
+        connection,
+        interfaces: Dict[str, Tuple[List[ConsumerRecord], List[ProducerRecord]]],
+) -> List[InterfaceUpdate]:
+    """
+    Replaces the interfaces of several components in one transaction, validated as a whole: all or none are changed.
+    """
+    return _set_interfaces(connection, build_declarations(interfaces))
+
+
+def _consumer_record(row: tuple) -> ConsumerRecord:
+    """
+    Maps a row (component, sub_component, host, type, primary, secondary, tertiary, optional) to its record.
+    """
+    return ConsumerRecord(
+        sub_component=row[1], interface_host=row[2], interface_type=row[3],
+        primary=row[4], secondary=row[5], tertiary=row[6], optional=row[7],
+    )
+
+
+def _producer_record(row: tuple) -> ProducerRecord:
+    """
+    Like _consumer_record, the last column is deprecated.
+    """
+    return ProducerRecord(
+        sub_component=row[1], interface_host=row[2], interface_type=row[3],
+        primary=row[4], secondary=row[5], tertiary=row[6], deprecated=row[7],
+    )
 
-def get_components(connection) -> List[Component]:
-    with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
-        cursor.execute(SQL_GET_CONSUMERS)
-        consumers = cursor.fetchall()
-        cursor.execute(SQL_GET_PRODUCERS)
-        producers = cursor.fetchall()
 
+def components_from_rows(consumer_rows: Iterable[tuple], producer_rows: Iterable[tuple]) -> List[Component]:
+    """
+    Groups the rows of SQL_GET_CONSUMERS and SQL_GET_PRODUCERS to the components, sorted by name.
+    """
     consumers_by_component = defaultdict(list)
-    for c in consumers:
-        consumers_by_component[c['component']].append(ConsumerRecord(**{k: v for k, v in c.items() if k != 'component'}))
+    for row in consumer_rows:
+        consumers_by_component[row[0]].append(_consumer_record(row))
     producers_by_component = defaultdict(list)
-    for p in producers:
-        producers_by_component[p['component']].append(ProducerRecord(**{k: v for k, v in p.items() if k != 'component'}))
+    for row in producer_rows:
+        producers_by_component[row[0]].append(_producer_record(row))
 
-    components = set(consumers_by_component.keys()).union(producers_by_component.keys())
+    components = sorted(set(consumers_by_component.keys()).union(producers_by_component.keys()))
 
     return [
         Component(
@@ -195,3 +932,274 @@ def get_components(connection) -> List[Component]:
         for component
         in components
     ]
+
+
+def get_components(connection) -> List[Component]:
+    with connection.cursor() as cursor:
+        with phase('query'):
+            cursor.execute(SQL_GET_CONSUMERS)
+            consumer_rows = cursor.fetchall()
+            cursor.execute(SQL_GET_PRODUCERS)
+            producer_rows = cursor.fetchall()
+    with phase('build'):
+        return components_from_rows(consumer_rows, producer_rows)
+
+
+def get_named_components(connection, names: Collection[str]) -> List[Component]:
+    """
+    Returns the components with the given names, sorted by name. Names without any records are left out.
+    """
+    conditions = 'component = ANY(%s)'
+    with connection.cursor() as cursor:
+        with phase('query'):
+            cursor.execute(SQL_GET_FILTERED_CONSUMERS.format(conditions=conditions), (list(names),))
+            consumer_rows = cursor.fetchall()
+            cursor.execute(SQL_GET_FILTERED_PRODUCERS.format(conditions=conditions), (list(names),))
+            producer_rows = cursor.fetchall()
+    with phase('build'):
+        return components_from_rows(consumer_rows, producer_rows)
+
+
+def _like_prefix(prefix: str) -> str:
+    return prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _filter_conditions(component_filter: ComponentFilter) -> Tuple[str, list]:
+    conditions = ['TRUE']
+    params = []
+    for column, value in (
+            ('component', component_filter.component),
+            ('subcomponent', component_filter.sub_component),
+            ('host', component_filter.interface_host),
+            ('itype', component_filter.interface_type),
+    ):
+        if value is not None:
+            conditions.append(f'{column} = %s')
+            params.append(value)
+    for column, prefix in (
+            ('iprimary', component_filter.primary),
+            ('isecondary', component_filter.secondary),
+            ('itertiary', component_filter.tertiary),
+    ):
+        if prefix:
+            conditions.append(f'{column} LIKE %s')
+            params.append(_like_prefix(prefix))
+    return ' AND '.join(conditions), params
+
+
+def _get_component_names(cursor, table: str, conditions: str, params: list, limit: Optional[int]) -> List[str]:
+    cursor.execute(
+        SQL(SQL_GET_FILTERED_COMPONENT_NAMES).format(table=Identifier(table), conditions=SQL(conditions)),
+        params + [limit],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_filtered_components(
+        connection,
+        component_filter: ComponentFilter,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+) -> Tuple[List[Component], Optional[str]]:
+    """
+    Returns up to limit components after the name after with their records matching the filter, and the next after.
+    """
+    conditions, params = _filter_conditions(component_filter)
+    if after is not None:
+        page_conditions = f'{conditions} AND component COLLATE "C" > %s'
+        page_params = params + [after]
+    else:
+        page_conditions = conditions
+        page_params = params
+    tables = []
+    if component_filter.include_consumers:
+        tables.append('consumers')
+    if component_filter.include_producers:
+        tables.append('producers')
+
+    # fetching one more component than requested tells whether there is a next page
+    page_limit = limit + 1 if limit is not None else None
+    with connection.cursor() as cursor:
+        names = set()
+        for table in tables:
+            names.update(_get_component_names(cursor, table, page_conditions, page_params, page_limit))
+    names = sorted(names)[:page_limit]
+    next_after = None
+    if limit is not None and len(names) > limit:
+        names = names[:limit]
+        next_after = names[-1]
+
+    conditions = f'{conditions} AND component = ANY(%s)'
+    params = params + [names]
+    consumers_by_component = defaultdict(list)
+    producers_by_component = defaultdict(list)
+    with connection.cursor() as cursor:
+        if component_filter.include_consumers:
+            cursor.execute(SQL_GET_FILTERED_CONSUMERS.format(conditions=conditions), params)
+            for row in cursor:
+                consumers_by_component[row[0]].append(_consumer_record(row))
+        if component_filter.include_producers:
+            cursor.execute(SQL_GET_FILTERED_PRODUCERS.format(conditions=conditions), params)
+            for row in cursor:
+                producers_by_component[row[0]].append(_producer_record(row))
+
+    components = [
+        Component(
+            name=component,
+            consumers=consumers_by_component.get(component, []),
+            producers=producers_by_component.get(component, []),
+        )
+        for component
+        in names
+    ]
+    return components, next_after
+
+
+def get_interface_usages(connection, queries: List[InterfaceQuery]) -> List[InterfaceUsage]:
+    """
+    Returns the consumers and producers for every query, in the order of the queries. All queries are resolved at once.
+    """
+    usages = [InterfaceUsage(consumers=[], producers=[]) for _ in queries]
+    if not queries:
+        return usages
+    keys = [
+        (position, q.interface_host, q.interface_type, q.primary, q.secondary, q.tertiary)
+        for position, q
+        in enumerate(queries)
+    ]
+    with connection.cursor() as cursor:
+        for table, flag, to_record, attribute in (
+                ('consumers', 'optional', _consumer_record, 'consumers'),
+                ('producers', 'deprecated', _producer_record, 'producers'),
+        ):
+            rows = execute_values(
+                cursor,
+                SQL(SQL_GET_INTERFACE_RECORDS).format(table=Identifier(table), flag=Identifier(flag)),
+                keys,
+                template=SQL_INTERFACE_KEY_TEMPLATE,
+                page_size=len(keys),
+                fetch=True,
+            )
+            for row in rows:
+                getattr(usages[row[0]], attribute).append((row[1], to_record(row[1:])))
+    return usages
+
+
+def check_interface(
+        connection,
+        component: str,
+        consumers: List[ConsumerRecord],
+        producers: List[ProducerRecord],
+) -> InterfaceCheck:
+    """
+    Reports the conflicts set_interface would report, against a read only snapshot and without taking locks.
+    """
+    declaration = build_declaration(component, consumers, producers)
+    with registry_snapshot(connection):
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_GET_FINGERPRINTS, ([component],))
+            stored_fingerprint = dict(cursor.fetchall()).get(component)
+            if stored_fingerprint == declaration.fingerprint:
+                return InterfaceCheck(component=component, unchanged=True, conflicts=[])
+            changed_keys = sorted(_get_changed_interface_keys(cursor, declaration))
+        usages = get_interface_usages(connection, [InterfaceQuery(*key) for key in changed_keys])
+
+    # the end state of a changed interface: the records of the other components plus the declared ones
+    declared_producer_keys = {row[1:6] for row in declaration.producers_for_db}
+    declared_required_consumers = defaultdict(list)
+    for row in declaration.consumers_for_db:
+        if not row[6]:
+            declared_required_consumers[row[1:6]].append(row[0])
+    conflicts = []
+    for key, usage in zip(changed_keys, usages):
+        if key in declared_producer_keys or any(c != component for c, _ in usage.producers):
+            continue
+        conflicts.extend(
+            UnsatisfiedConsumer(c, record.sub_component, *key)
+            for c, record
+            in usage.consumers
+            if c != component and not record.optional
+        )
+        conflicts.extend(
+            UnsatisfiedConsumer(component, sub_component, *key)
+            for sub_component
+            in declared_required_consumers[key]
+        )
+    return InterfaceCheck(component=component, unchanged=False, conflicts=sorted(conflicts))
+
+
+def get_generation(connection) -> int:
+    """
+    Returns the generation of the registry. The read is committed, so a snapshot can be started afterwards.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_GET_GENERATION)
+        generation = cursor.fetchone()[0]
+    connection.commit()
+    return generation
+
+
+def _begin_snapshot(connection) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_BEGIN_SNAPSHOT)
+        cursor.execute(SQL_GET_GENERATION)
+        return cursor.fetchone()[0]
+
+
+@contextmanager
+def registry_snapshot(connection) -> Iterator[int]:
+    """
+    Runs the reads within the context in one read only snapshot and yields the generation of the snapshot.
+    """
+    generation = _begin_snapshot(connection)
+    try:
+        yield generation
+    finally:
+        connection.commit()
+
+
+def get_components_snapshot(connection) -> Tuple[int, List[Component]]:
+    """
+    Returns the generation of the registry together with the components of exactly this generation.
+    """
+    with registry_snapshot(connection) as generation:
+        return generation, get_components(connection)
+
+
+def _iter_rows_by_component(connection, name: str, query: str) -> Iterator[Tuple[str, list]]:
+    with connection.cursor(name=name) as cursor:
+        cursor.itersize = STREAM_ITERSIZE
+        cursor.execute(query)
+        for component, rows in groupby(cursor, key=lambda row: row[0]):
+            yield component, list(rows)
+
+
+def _iter_components(connection) -> Iterator[Component]:
+    consumers_iter = _iter_rows_by_component(connection, 'stream_consumers', SQL_GET_CONSUMERS)
+    producers_iter = _iter_rows_by_component(connection, 'stream_producers', SQL_GET_PRODUCERS)
+    consumers = next(consumers_iter, None)
+    producers = next(producers_iter, None)
+    # both queries are ordered by component in the C collation, the order of python strings,
+    # so they are merged like sorted lists
+    while consumers is not None or producers is not None:
+        if producers is None or (consumers is not None and consumers[0] <= producers[0]):
+            name = consumers[0]
+        else:
+            name = producers[0]
+        component = Component(name=name, consumers=[], producers=[])
+        if consumers is not None and consumers[0] == name:
+            component.consumers = [_consumer_record(row) for row in consumers[1]]
+            consumers = next(consumers_iter, None)
+        if producers is not None and producers[0] == name:
+            component.producers = [_producer_record(row) for row in producers[1]]
+            producers = next(producers_iter, None)
+        yield component
+    connection.commit()
+
+
+def stream_components(connection) -> Tuple[int, Iterator[Component]]:
+    """
+    Like get_components_snapshot, the components are read through server side cursors until the iterator is exhausted.
+    """
+    generation = _begin_snapshot(connection)
+    return generation, _iter_components(connection)
@@ -0,0 +1,207 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Collection, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from service.util.parse_interfaces import Component, ConsumerRecord, ProducerRecord
+
+from .queries import ComponentFilter, InterfaceQuery, InterfaceUsage
+
+InterfaceKey = Tuple[str, str, str, str, str]
+Record = Union[ConsumerRecord, ProducerRecord]
+
+
+def _interface_key(record: Record) -> InterfaceKey:
+    return record.interface_host, record.interface_type, record.primary, record.secondary, record.tertiary
+
+
+def _usage_order(usage: Tuple[str, Record]) -> tuple:
+    # the order of SQL_GET_INTERFACE_RECORDS, the text columns are declared in the C collation like python strings
+    component, record = usage
+    return (component, record.sub_component) + _interface_key(record)
+
+
+def _matches(record: Record, component_filter: ComponentFilter) -> bool:
+    """
+    Whether get_filtered_components would list the record.
+    """
+    for value, expected in (
+            (record.sub_component, component_filter.sub_component),
+            (record.interface_host, component_filter.interface_host),
+            (record.interface_type, component_filter.interface_type),
+    ):
+        if expected is not None and value != expected:
+            return False
+    for value, prefix in (
+            (record.primary, component_filter.primary),
+            (record.secondary, component_filter.secondary),
+            (record.tertiary, component_filter.tertiary),
+    ):
+        if prefix and not value.startswith(prefix):
+            return False
+    return True
+
+
+def _key_matches(key: InterfaceKey, query: InterfaceQuery) -> bool:
+    return all(
+        expected is None or value == expected
+        for value, expected
+        in zip(key[2:], (query.primary, query.secondary, query.tertiary))
+    )
+
+
+class RegistryModel:
+    """
+    Thread safe, in-memory registry of one generation answering the reads of service.database.queries alike.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.generation: Optional[int] = None
+        self._components: Dict[str, Component] = {}
+        self._names: List[str] = []
+        # per interface key and component: the records of the component with this key
+        self._consumers: Dict[InterfaceKey, Dict[str, List[ConsumerRecord]]] = {}
+        self._producers: Dict[InterfaceKey, Dict[str, List[ProducerRecord]]] = {}
+        self._keys_by_host_type: Dict[Tuple[str, str], Set[InterfaceKey]] = defaultdict(set)
+
+    def _add(self, component: Component) -> None:
+        self._components[component.name] = component
+        insort(self._names, component.name)
+        for records, index in ((component.consumers, self._consumers), (component.producers, self._producers)):
+            for record in records:
+                key = _interface_key(record)
+                index.setdefault(key, {}).setdefault(component.name, []).append(record)
+                self._keys_by_host_type[key[:2]].add(key)
+
+    def _remove(self, name: str) -> None:
+        component = self._components.pop(name, None)
+        if component is None:
+            return
+        del self._names[bisect_left(self._names, name)]
+        for records, index in ((component.consumers, self._consumers), (component.producers, self._producers)):
+            for record in records:
+                key = _interface_key(record)
+                records_by_component = index.get(key)
+                if records_by_component is None:
+                    continue
+                records_by_component.pop(name, None)
+                if not records_by_component:
+                    del index[key]
+                    if key not in self._consumers and key not in self._producers:
+                        self._discard_key(key)
+
+    def _discard_key(self, key: InterfaceKey) -> None:
+        keys = self._keys_by_host_type[key[:2]]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_host_type[key[:2]]
+
+    def load(self, generation: int, components: Iterable[Component]) -> None:
+        """
+        Replaces the whole registry. The indexes are built before the lock is taken, so reads are not blocked meanwhile.
+        """
+        loaded = RegistryModel()
+        for component in components:
+            loaded._add(component)
+        with self._lock:
+            self._components = loaded._components
+            self._names = loaded._names
+            self._consumers = loaded._consumers
+            self._producers = loaded._producers
+            self._keys_by_host_type = loaded._keys_by_host_type
+            self.generation = generation
+
+    def update(self, generation: int, names: Collection[str], components: Iterable[Component]) -> None:
+        """
+        Replaces the components with the given names by the given components of the generation.
+        A name without a given component was removed from the registry.
+        """
+        with self._lock:
+            for name in names:
+                self._remove(name)
+            for component in components:
+                self._remove(component.name)
+                self._add(component)
+            self.generation = generation
+
+    def get_components_snapshot(self) -> Tuple[int, List[Component]]:
+        """
+        Like queries.get_components_snapshot.
+        """
+        with self._lock:
+            return self.generation, [self._components[name] for name in self._names]
+
+    def get_filtered_components(
+            self,
+            component_filter: ComponentFilter,
+            after: Optional[str] = None,
+            limit: Optional[int] = None,
+    ) -> Tuple[int, List[Component], Optional[str]]:
+        """
+        Like queries.get_filtered_components within a registry_snapshot, the generation is returned first.
+        """
+        components = []
+        with self._lock:
+            names = self._names
+            if component_filter.component is not None:
+                names = [name for name in (component_filter.component,) if name in self._components]
+            start = bisect_right(names, after) if after is not None else 0
+            for index in range(start, len(names)):
+                component = self._components[names[index]]
+                consumers = [
+                    record for record in component.consumers if _matches(record, component_filter)
+                ] if component_filter.include_consumers else []
+                producers = [
+                    record for record in component.producers if _matches(record, component_filter)
+                ] if component_filter.include_producers else []
+                if consumers or producers:
+                    components.append(Component(name=component.name, consumers=consumers, producers=producers))
+                    # one more component than requested tells whether there is a next page
+                    if limit is not None and len(components) > limit:
+                        break
+            generation = self.generation
+        next_after = None
+        if limit is not None and len(components) > limit:
+            components = components[:limit]
+            next_after = components[-1].name
+        return generation, components, next_after
+
+    def get_interface_usages(self, queries: List[InterfaceQuery]) -> Tuple[int, List[InterfaceUsage]]:
+        """
+        Like queries.get_interface_usages, the generation is returned first.
+        """
+        usages = []
+        with self._lock:
+            for query in queries:
+                keys = [
+                    key
+                    for key in self._keys_by_host_type.get((query.interface_host, query.interface_type), ())
+                    if _key_matches(key, query)
+                ]
+                usages.append(InterfaceUsage(
+                    consumers=self._usages(self._consumers, keys),
+                    producers=self._usages(self._producers, keys),
+                ))
+            generation = self.generation
+        return generation, usages
+
+    @staticmethod
+    def _usages(index: Dict[InterfaceKey, Dict[str, List[Record]]], keys: List[InterfaceKey]) -> List[tuple]:
+        return sorted(
+            (
+                (component, record)
+                for key in keys
+                for component, records in index.get(key, {}).items()
+                for record in records
+            ),
+            key=_usage_order,
+        )
+
+    def stats_dict(self) -> dict:
+        with self._lock:
+            return dict(
+                generation=self.generation,
+                components=len(self._components),
+                interfaces=len(set(self._consumers).union(self._producers)),
+            )
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import select
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from psycopg2 import InterfaceError, OperationalError, connect
+
+from .queries import SQL_LISTEN, get_components_snapshot, get_named_components, registry_snapshot
+from .registry_model import RegistryModel
+
+logger = logging.getLogger(__name__)
+
+# how long a notification may arrive after the commit of its generation became visible
+NOTIFICATION_DELAY_SECONDS = 1.0
+
+
+class RegistryReplica:
+    """
+    Keeps the RegistryModel current by reading the components of the notified changes, see synchronize.
+    """
+
+    def __init__(
+            self,
+            connection_kwargs: dict,
+            max_staleness: float = 5.0,
+            retry_seconds: float = 5.0,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.model = RegistryModel()
+        self._connection_kwargs = connection_kwargs
+        self._max_staleness = max_staleness
+        self._retry_seconds = retry_seconds
+        self._clock = clock
+        self._connection = None
+        # the notified generations newer than the model with their changed components, None means all
+        self._pending: Dict[int, Optional[Set[str]]] = {}
+        self._confirmed_at: Optional[float] = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='registry-replica', daemon=True)
+        self.reloads = 0
+        self.updates = 0
+        self.pid = os.getpid()
+
+    def current_model(self) -> Optional[RegistryModel]:
+        """
+        Returns the model if it is current within max_staleness seconds, otherwise None.
+        """
+        confirmed_at = self._confirmed_at
+        if confirmed_at is None or self._clock() - confirmed_at > self._max_staleness:
+            return None
+        return self.model
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.close()
+
+    def open(self) -> None:
+        """
+        Connects, listens for changes and loads the whole registry.
+        """
+        self._connection = connect(**self._connection_kwargs)
+        with self._connection.cursor() as cursor:
+            cursor.execute(SQL_LISTEN)
+        self._connection.commit()
+        self._pending = {}
+        self._reload()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _receive_notifications(self) -> None:
+        self._connection.poll()
+        while self._connection.notifies:
+            payload = json.loads(self._connection.notifies.pop(0).payload)
+            components = payload['components']
+            self._pending[payload['generation']] = set(components) if components is not None else None
+
+    def _confirm(self, generation: int, started_at: float) -> None:
+        self._pending = {g: names for g, names in self._pending.items() if g > generation}
+        self._confirmed_at = started_at
+
+    def _reload(self) -> None:
+        started_at = self._clock()
+        generation, components = get_components_snapshot(self._connection)
+        self.model.load(generation, components)
+        self._receive_notifications()
+        self._confirm(generation, started_at)
+        self.reloads += 1
+
+    def _required_notifications(self, known: int, generation: int) -> List[Optional[Set[str]]]:
+        """
+        Returns the changed components of the generations after known up to generation, None for missing ones.
+        A notification is delivered shortly after the commit of its generation, so it is awaited for a moment.
+        """
+        deadline = time.monotonic() + NOTIFICATION_DELAY_SECONDS
+        while True:
+            self._receive_notifications()
+            required = [self._pending.get(g) for g in range(known + 1, generation + 1)]
+            timeout = deadline - time.monotonic()
+            if all(changed is not None for changed in required) or None in self._pending.values() or timeout <= 0:
+                return required
+            select.select([self._connection], [], [], timeout)
+
+    def synchronize(self) -> None:
+        """
+        Brings the model to the current generation, the whole registry is read only if a notification is missing.
+        """
+        self._receive_notifications()
+        known = self.model.generation
+        names = set()
+        while True:
+            pending = [changed for generation, changed in self._pending.items() if generation > known]
+            if any(changed is None for changed in pending):
+                self._reload()
+                return
+            names.update(*pending)
+            started_at = self._clock()
+            with registry_snapshot(self._connection) as generation:
+                components = get_named_components(self._connection, names) if names else []
+            required = self._required_notifications(known, generation)
+            if any(changed is None for changed in required):
+                self._reload()
+                return
+            # a notification arriving after the snapshot started may name further components
+            if set().union(*required) <= names:
+                break
+        self.model.update(generation, names, components)
+        self._confirm(generation, started_at)
+        if required:
+            self.updates += 1
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                if self._connection is None:
+                    self.open()
+                if not self._connection.notifies:
+                    select.select([self._connection], [], [], self._max_staleness / 2)
+                self.synchronize()
+            except (OperationalError, InterfaceError) as e:
+                logger.warning('The registry replica lost its database connection: %s', e)
+                self.close()
+                self._stopped.wait(self._retry_seconds)
+            except Exception:
+                logger.exception('The registry replica failed, it reloads the registry')
+                self.close()
+                self._stopped.wait(self._retry_seconds)
+
+    def stats_dict(self) -> dict:
+        confirmed_at = self._confirmed_at
+        return dict(
+            current=self.current_model() is not None,
+            seconds_since_confirmed=self._clock() - confirmed_at if confirmed_at is not None else None,
+            reloads=self.reloads,
+            updates=self.updates,
+            **self.model.stats_dict(),
+        )
@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from psycopg2 import OperationalError
+
+from .pool import ConnectionPool
+
+
+class ReplicaPools:
+    """
+    Round robin over the connection pools of the read replicas, a failing replica is ejected for retry_seconds.
+    """
+
+    def __init__(
+            self,
+            pools: List[ConnectionPool],
+            names: List[str],
+            retry_seconds: float = 30.0,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.pools = pools
+        self.names = names
+        self._retry_seconds = retry_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next = 0
+        self._ejected_until = [0.0] * len(pools)
+        self._ejections = [0] * len(pools)
+        self.pid = os.getpid()
+
+    def _candidates(self) -> List[int]:
+        with self._lock:
+            start = self._next
+            self._next = (start + 1) % len(self.pools)
+            now = self._clock()
+            order = [(start + offset) % len(self.pools) for offset in range(len(self.pools))]
+            return [index for index in order if self._ejected_until[index] <= now]
+
+    def eject(self, pool: ConnectionPool) -> None:
+        index = self.pools.index(pool)
+        with self._lock:
+            self._ejected_until[index] = self._clock() + self._retry_seconds
+            self._ejections[index] += 1
+
+    def getconn(self) -> Optional[Tuple[ConnectionPool, object]]:
+        """
+        Returns the pool and a connection of the next available replica, None if all replicas are ejected or failing.
+        The connection must be returned to the returned pool.
+        """
+        for index in self._candidates():
+            pool = self.pools[index]
+            try:
+                return pool, pool.getconn()
+            except OperationalError:
+                self.eject(pool)
+        return None
+
+    def closeall(self) -> None:
+        for pool in self.pools:
+            pool.closeall()
+
+    def stats_dicts(self) -> List[dict]:
+        with self._lock:
+            now = self._clock()
+            ejected = [until > now for until in self._ejected_until]
+            ejections = list(self._ejections)
+        return [
+            dict(replica=name, ejected=is_ejected, ejections=num_ejections, **pool.stats_dict())
+            for name, pool, is_ejected, num_ejections
+            in zip(self.names, self.pools, ejected, ejections)
+        ]
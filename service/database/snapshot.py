@@ -0,0 +1,527 @@
+"""
+Export and import of the whole registry as one snapshot file, e.g. to seed a test database or to restore a backup.
+
+The file is a json header line followed by the consumers, the producers and the fingerprints in the text format
+of COPY, one row per line, the header contains the number of rows of each table. Both directions use COPY,
+the import loads the file into temporary tables, validates the complete registry once, recomputes the fingerprints
+from the rows and replaces the changed rows within one transaction. It counts as one change of the registry:
+the generation is incremented, the history records the difference per component and listeners are notified.
+
+    python -m service.database.snapshot export registry.snapshot.gz
+    python -m service.database.snapshot import registry.snapshot.gz
+"""
+import argparse
+import gzip
+import json
+import logging
+from dataclasses import asdict, dataclass
+from itertools import groupby
+from typing import List, Optional
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+from service.util.metrics import count_rows, phase
+
+from .queries import (
+    REGISTRY_CHANNEL,
+    SQL_INCREMENT_GENERATION,
+    SQL_NOTIFY_CHANGE,
+    STREAM_ITERSIZE,
+    InterfaceEntryConflict,
+    InterfaceEntryDuplication,
+    UnsatisfiedConsumer,
+    change_notification,
+    create_history_checkpoint,
+    registry_snapshot,
+    _copy_rows,
+    _fingerprint,
+)
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 'interfaces-snapshot'
+SNAPSHOT_VERSION = 1
+
+SQL_COUNT_ROWS = '''
+SELECT (SELECT count(*) FROM consumers), (SELECT count(*) FROM producers), (SELECT count(*) FROM fingerprints);
+'''
+
+SQL_COPY_CONSUMERS_TO = '''
+COPY (
+    SELECT c.component, c.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary, c.optional
+    FROM consumers as c
+    JOIN interfaces as i
+    ON i.id = c.interface_id
+    ORDER BY c.component, c.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary
+) TO STDOUT;
+'''
+
+SQL_COPY_PRODUCERS_TO = '''
+COPY (
+    SELECT p.component, p.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary, p.deprecated
+    FROM producers as p
+    JOIN interfaces as i
+    ON i.id = p.interface_id
+    ORDER BY p.component, p.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary
+) TO STDOUT;
+'''
+
+SQL_COPY_FINGERPRINTS_TO = 'COPY (SELECT component, fingerprint FROM fingerprints ORDER BY component) TO STDOUT;'
+
+# Writers read the fingerprints first, before they take any other lock. Locking the fingerprints waits for the
+# running writers and makes new ones wait for the import, without a chance of a deadlock.
+SQL_LOCK_REGISTRY = 'LOCK TABLE fingerprints IN ACCESS EXCLUSIVE MODE;'
+
+SQL_CREATE_IMPORT_TABLES = '''
+CREATE TEMPORARY TABLE import_consumers
+(
+    component TEXT NOT NULL,
+    subcomponent TEXT NOT NULL,
+    host TEXT NOT NULL,
+    itype TEXT NOT NULL,
+    iprimary TEXT NOT NULL,
+    isecondary TEXT NOT NULL,
+    itertiary TEXT NOT NULL,
+    optional BOOLEAN NOT NULL
+) ON COMMIT DROP;
+CREATE TEMPORARY TABLE import_producers
+(
+    component TEXT NOT NULL,
+    subcomponent TEXT NOT NULL,
+    host TEXT NOT NULL,
+    itype TEXT NOT NULL,
+    iprimary TEXT NOT NULL,
+    isecondary TEXT NOT NULL,
+    itertiary TEXT NOT NULL,
+    deprecated BOOLEAN NOT NULL
+) ON COMMIT DROP;
+CREATE TEMPORARY TABLE import_fingerprints
+(
+    component TEXT NOT NULL,
+    fingerprint TEXT NOT NULL
+) ON COMMIT DROP;
+'''
+
+SQL_COPY_CONSUMERS_FROM = 'COPY import_consumers FROM STDIN;'
+SQL_COPY_PRODUCERS_FROM = 'COPY import_producers FROM STDIN;'
+SQL_COPY_FINGERPRINTS_FROM = 'COPY import_fingerprints FROM STDIN;'
+
+# temporary tables are not analyzed automatically, the planner needs their sizes for the joins
+SQL_ANALYZE_IMPORT_TABLES = 'ANALYZE import_consumers, import_producers, import_fingerprints;'
+
+SQL_GET_IMPORT_DUPLICATES = '''
+SELECT component, subcomponent, host, itype, iprimary, isecondary, itertiary
+FROM {table}
+GROUP BY component, subcomponent, host, itype, iprimary, isecondary, itertiary
+HAVING count(*) > 1
+ORDER BY component, subcomponent, host, itype, iprimary, isecondary, itertiary
+LIMIT 10;
+'''
+
+# the rows of every component of the snapshot, including the ones with only a fingerprint, grouped by component
+SQL_GET_IMPORT_DECLARATIONS = '''
+SELECT component, kind, subcomponent, host, itype, iprimary, isecondary, itertiary, flag
+FROM (
+    SELECT component, 'c' as kind, subcomponent, host, itype, iprimary, isecondary, itertiary, optional as flag
+    FROM import_consumers
+    UNION ALL
+    SELECT component, 'p', subcomponent, host, itype, iprimary, isecondary, itertiary, deprecated
+    FROM import_producers
+    UNION ALL
+    SELECT component, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+    FROM import_fingerprints
+) as r
+ORDER BY component;
+'''
+
+SQL_TRUNCATE_IMPORT_FINGERPRINTS = 'TRUNCATE import_fingerprints;'
+
+SQL_GET_IMPORT_UNSATISFIED_CONSUMERS = '''
+SELECT c.component, c.subcomponent, c.host, c.itype, c.iprimary, c.isecondary, c.itertiary
+FROM import_consumers as c
+WHERE NOT c.optional
+AND NOT EXISTS (
+    SELECT 1
+    FROM import_producers as p
+    WHERE p.host = c.host
+    AND p.itype = c.itype
+    AND p.iprimary = c.iprimary
+    AND p.isecondary = c.isecondary
+    AND p.itertiary = c.itertiary
+)
+ORDER BY c.component, c.subcomponent, c.host, c.itype, c.iprimary, c.isecondary, c.itertiary;
+'''
+
+SQL_INSERT_IMPORT_INTERFACES = '''
+INSERT INTO interfaces (host, itype, iprimary, isecondary, itertiary)
+SELECT k.host, k.itype, k.iprimary, k.isecondary, k.itertiary
+FROM (
+    SELECT host, itype, iprimary, isecondary, itertiary FROM import_consumers
+    UNION
+    SELECT host, itype, iprimary, isecondary, itertiary FROM import_producers
+) as k
+WHERE NOT EXISTS (
+    SELECT 1
+    FROM interfaces as i
+    WHERE i.host = k.host
+    AND i.itype = k.itype
+    AND i.iprimary = k.iprimary
+    AND i.isecondary = k.isecondary
+    AND i.itertiary = k.itertiary
+)
+ORDER BY k.host, k.itype, k.iprimary, k.isecondary, k.itertiary;
+'''
+
+# the rows to remove and to add, as rows of the consumers and producers tables
+SQL_CREATE_IMPORT_DELTAS = '''
+CREATE TEMPORARY TABLE import_consumer_rows ON COMMIT DROP AS
+SELECT s.component, s.subcomponent, i.id as interface_id, s.optional
+FROM import_consumers as s
+JOIN interfaces as i
+ON i.host = s.host AND i.itype = s.itype AND i.iprimary = s.iprimary
+AND i.isecondary = s.isecondary AND i.itertiary = s.itertiary;
+CREATE TEMPORARY TABLE import_producer_rows ON COMMIT DROP AS
+SELECT s.component, s.subcomponent, i.id as interface_id, s.deprecated
+FROM import_producers as s
+JOIN interfaces as i
+ON i.host = s.host AND i.itype = s.itype AND i.iprimary = s.iprimary
+AND i.isecondary = s.isecondary AND i.itertiary = s.itertiary;
+
+CREATE TEMPORARY TABLE import_removed_consumers ON COMMIT DROP AS
+SELECT component, subcomponent, interface_id, optional FROM consumers
+EXCEPT
+SELECT component, subcomponent, interface_id, optional FROM import_consumer_rows;
+CREATE TEMPORARY TABLE import_added_consumers ON COMMIT DROP AS
+SELECT component, subcomponent, interface_id, optional FROM import_consumer_rows
+EXCEPT
+SELECT component, subcomponent, interface_id, optional FROM consumers;
+CREATE TEMPORARY TABLE import_removed_producers ON COMMIT DROP AS
+SELECT component, subcomponent, interface_id, deprecated FROM producers
+EXCEPT
+SELECT component, subcomponent, interface_id, deprecated FROM import_producer_rows;
+CREATE TEMPORARY TABLE import_added_producers ON COMMIT DROP AS
+SELECT component, subcomponent, interface_id, deprecated FROM import_producer_rows
+EXCEPT
+SELECT component, subcomponent, interface_id, deprecated FROM producers;
+ANALYZE import_removed_consumers, import_added_consumers, import_removed_producers, import_added_producers;
+'''
+
+SQL_APPLY_IMPORT_DELTAS = '''
+DELETE FROM consumers as c
+USING import_removed_consumers as r
+WHERE c.component = r.component AND c.subcomponent = r.subcomponent AND c.interface_id = r.interface_id;
+DELETE FROM producers as p
+USING import_removed_producers as r
+WHERE p.component = r.component AND p.subcomponent = r.subcomponent AND p.interface_id = r.interface_id;
+INSERT INTO producers (component, subcomponent, interface_id, deprecated)
+SELECT component, subcomponent, interface_id, deprecated FROM import_added_producers
+ORDER BY component, subcomponent, interface_id;
+INSERT INTO consumers (component, subcomponent, interface_id, optional)
+SELECT component, subcomponent, interface_id, optional FROM import_added_consumers
+ORDER BY component, subcomponent, interface_id;
+'''
+
+SQL_DELETE_UNUSED_IMPORT_INTERFACES = '''
+DELETE FROM interfaces as i
+WHERE i.id IN (
+    SELECT interface_id FROM import_removed_consumers
+    UNION
+    SELECT interface_id FROM import_removed_producers
+)
+AND NOT EXISTS (SELECT 1 FROM consumers as c WHERE c.interface_id = i.id)
+AND NOT EXISTS (SELECT 1 FROM producers as p WHERE p.interface_id = i.id);
+'''
+
+SQL_COUNT_IMPORT_DELTAS = '''
+SELECT
+    (SELECT count(*) FROM import_removed_consumers) + (SELECT count(*) FROM import_removed_producers),
+    (SELECT count(*) FROM import_added_consumers) + (SELECT count(*) FROM import_added_producers);
+'''
+
+SQL_DELETE_IMPORT_FINGERPRINTS = '''
+DELETE FROM fingerprints as f
+WHERE NOT EXISTS (SELECT 1 FROM import_fingerprints as s WHERE s.component = f.component)
+RETURNING component;
+'''
+
+SQL_SET_IMPORT_FINGERPRINTS = '''
+INSERT INTO fingerprints (component, fingerprint)
+SELECT component, fingerprint FROM import_fingerprints
+ON CONFLICT (component) DO UPDATE SET fingerprint = EXCLUDED.fingerprint
+WHERE fingerprints.fingerprint <> EXCLUDED.fingerprint
+RETURNING component;
+'''
+
+# one history row per component with added or removed rows, like set_interface records them
+SQL_INSERT_IMPORT_HISTORY = '''
+INSERT INTO history
+(generation, changed_at, component, added_consumers, removed_consumers, added_producers, removed_producers)
+SELECT %(generation)s, statement_timestamp(), component,
+    coalesce(ac.rows, '[]'), coalesce(rc.rows, '[]'), coalesce(ap.rows, '[]'), coalesce(rp.rows, '[]')
+FROM {added_consumers} as ac
+FULL JOIN {removed_consumers} as rc USING (component)
+FULL JOIN {added_producers} as ap USING (component)
+FULL JOIN {removed_producers} as rp USING (component)
+RETURNING component;
+'''
+SQL_HISTORY_ROWS = '''(
+    SELECT r.component, jsonb_agg(jsonb_build_array(
+        r.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary, r.{flag})
+        ORDER BY r.subcomponent, i.host, i.itype, i.iprimary, i.isecondary, i.itertiary) as rows
+    FROM {table} as r
+    JOIN interfaces as i
+    ON i.id = r.interface_id
+    GROUP BY r.component
+)'''
+SQL_INSERT_IMPORT_HISTORY = SQL_INSERT_IMPORT_HISTORY.format(
+    added_consumers=SQL_HISTORY_ROWS.format(table='import_added_consumers', flag='optional'),
+    removed_consumers=SQL_HISTORY_ROWS.format(table='import_removed_consumers', flag='optional'),
+    added_producers=SQL_HISTORY_ROWS.format(table='import_added_producers', flag='deprecated'),
+    removed_producers=SQL_HISTORY_ROWS.format(table='import_removed_producers', flag='deprecated'),
+)
+
+
+class SnapshotFormatError(Exception):
+    pass
+
+
+@dataclass
+class SnapshotHeader:
+    generation: int
+    consumers: int
+    producers: int
+    fingerprints: int
+
+
+@dataclass
+class SnapshotImport:
+    """
+    The generation of the exported registry, the generation the import created, None if nothing changed,
+    the changed components and the number of removed and added rows.
+    """
+    source_generation: int
+    generation: Optional[int]
+    components: List[str]
+    removed: int
+    added: int
+
+
+def export_snapshot(connection, file) -> SnapshotHeader:
+    """
+    Writes the registry of one generation to the binary file.
+    """
+    with registry_snapshot(connection) as generation:
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_COUNT_ROWS)
+            header = SnapshotHeader(generation, *cursor.fetchone())
+            file.write(json.dumps(dict(format=SNAPSHOT_FORMAT, version=SNAPSHOT_VERSION, **asdict(header))).encode())
+            file.write(b'\n')
+            with phase('query'):
+                cursor.copy_expert(SQL_COPY_CONSUMERS_TO, file)
+                cursor.copy_expert(SQL_COPY_PRODUCERS_TO, file)
+                cursor.copy_expert(SQL_COPY_FINGERPRINTS_TO, file)
+    return header
+
+
+def _read_header(file) -> SnapshotHeader:
+    try:
+        data = json.loads(file.readline())
+        if data.get('format') != SNAPSHOT_FORMAT or data.get('version') != SNAPSHOT_VERSION:
+            raise SnapshotFormatError(f'Expected a {SNAPSHOT_FORMAT} of version {SNAPSHOT_VERSION}.')
+        return SnapshotHeader(
+            generation=int(data['generation']),
+            consumers=int(data['consumers']),
+            producers=int(data['producers']),
+            fingerprints=int(data['fingerprints']),
+        )
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise SnapshotFormatError(f'The header of the snapshot is invalid: {e}')
+
+
+class _SectionReader:
+    """
+    Reads the given number of lines from the file, the rows of one table for COPY ... FROM STDIN.
+    """
+
+    def __init__(self, file, rows: int):
+        self._file = file
+        self._remaining = rows
+        # psycopg2 cancels the COPY if read raises, without the exception
+        self.error: Optional[Exception] = None
+
+    def read(self, size: int = -1) -> bytes:
+        try:
+            return self._read(size)
+        except Exception as e:
+            self.error = e
+            raise
+
+    def _read(self, size: int) -> bytes:
+        lines = []
+        length = 0
+        while self._remaining and (size < 0 or length < size):
+            line = self._file.readline()
+            if not line.endswith(b'\n'):
+                raise SnapshotFormatError('The snapshot ends before all rows announced by its header.')
+            lines.append(line)
+            length += len(line)
+            self._remaining -= 1
+        return b''.join(lines)
+
+
+def _load(cursor, file) -> SnapshotHeader:
+    header = _read_header(file)
+    cursor.execute(SQL_CREATE_IMPORT_TABLES)
+    for sql, rows in (
+            (SQL_COPY_CONSUMERS_FROM, header.consumers),
+            (SQL_COPY_PRODUCERS_FROM, header.producers),
+            (SQL_COPY_FINGERPRINTS_FROM, header.fingerprints),
+    ):
+        reader = _SectionReader(file, rows)
+        try:
+            cursor.copy_expert(sql, reader)
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            raise SnapshotFormatError(f'The rows of the snapshot are invalid: {e}')
+        except psycopg2.OperationalError:
+            if reader.error is not None:
+                raise reader.error
+            raise
+    if file.read(1):
+        raise SnapshotFormatError('The snapshot contains more rows than announced by its header.')
+    cursor.execute(SQL_ANALYZE_IMPORT_TABLES)
+    return header
+
+
+def _validate(cursor) -> None:
+    duplicates = []
+    for table in ('import_consumers', 'import_producers'):
+        cursor.execute(SQL_GET_IMPORT_DUPLICATES.format(table=table))
+        duplicates.extend(cursor.fetchall())
+    if duplicates:
+        raise InterfaceEntryDuplication(
+            'The snapshot contains rows multiple times: ' + '; '.join(' '.join(row) for row in duplicates))
+    cursor.execute(SQL_GET_IMPORT_UNSATISFIED_CONSUMERS)
+    unsatisfied_consumers = [UnsatisfiedConsumer(*row) for row in cursor.fetchall()]
+    if unsatisfied_consumers:
+        raise InterfaceEntryConflict(
+            'Error: ' + '; '.join(c.describe(()) for c in unsatisfied_consumers),
+            unsatisfied_consumers,
+        )
+
+
+def _recompute_fingerprints(cursor) -> None:
+    """
+    Replaces the fingerprints of the snapshot by the ones of its rows. A fingerprint not matching the rows
+    would make set_interface skip the write of a declaration although the stored rows differ from it.
+    """
+    fingerprints = []
+    with cursor.connection.cursor(name='import_declarations') as rows_cursor:
+        rows_cursor.itersize = STREAM_ITERSIZE
+        rows_cursor.execute(SQL_GET_IMPORT_DECLARATIONS)
+        for component, rows in groupby(rows_cursor, key=lambda row: row[0]):
+            consumers = []
+            producers = []
+            for row in rows:
+                if row[1] == 'c':
+                    consumers.append(row[2:])
+                elif row[1] == 'p':
+                    producers.append(row[2:])
+            fingerprints.append((component, _fingerprint(consumers, producers)))
+    cursor.execute(SQL_TRUNCATE_IMPORT_FINGERPRINTS)
+    _copy_rows(cursor, SQL_COPY_FINGERPRINTS_FROM, fingerprints)
+
+
+def import_snapshot(connection, file) -> SnapshotImport:
+    """
+    Replaces the registry by the snapshot read from the binary file, all or nothing.
+    Raises SnapshotFormatError for an invalid file, InterfaceEntryDuplication and InterfaceEntryConflict
+    like set_interfaces if the registry of the snapshot is inconsistent.
+    """
+    try:
+        with connection.cursor() as cursor:
+            with phase('lock'):
+                cursor.execute(SQL_LOCK_REGISTRY)
+            with phase('write'):
+                header = _load(cursor, file)
+            with phase('conflicts'):
+                _validate(cursor)
+            with phase('diff'):
+                _recompute_fingerprints(cursor)
+            with phase('diff'):
+                cursor.execute(SQL_INSERT_IMPORT_INTERFACES)
+                cursor.execute(SQL_CREATE_IMPORT_DELTAS)
+                cursor.execute(SQL_COUNT_IMPORT_DELTAS)
+                removed, added = cursor.fetchone()
+            with phase('write'):
+                cursor.execute(SQL_APPLY_IMPORT_DELTAS)
+                cursor.execute(SQL_DELETE_IMPORT_FINGERPRINTS)
+                components = {row[0] for row in cursor.fetchall()}
+                cursor.execute(SQL_SET_IMPORT_FINGERPRINTS)
+                components.update(row[0] for row in cursor.fetchall())
+            generation = None
+            if components or removed or added:
+                cursor.execute(SQL_INCREMENT_GENERATION)
+                generation = cursor.fetchone()[0]
+                with phase('write'):
+                    cursor.execute(SQL_INSERT_IMPORT_HISTORY, dict(generation=generation))
+                    components.update(row[0] for row in cursor.fetchall())
+                    # after the history, which reads the keys of the removed rows
+                    cursor.execute(SQL_DELETE_UNUSED_IMPORT_INTERFACES)
+                notification = change_notification(generation, sorted(components))
+                cursor.execute(SQL_NOTIFY_CHANGE, (REGISTRY_CHANNEL, notification))
+        with phase('commit'):
+            connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    count_rows('deleted', removed)
+    count_rows('inserted', added)
+    if generation is not None:
+        # the import may change the whole registry, the as-of queries should not need to read it as a delta
+        try:
+            create_history_checkpoint(connection)
+        except psycopg2.Error:
+            connection.rollback()
+            logger.exception('Creating the history checkpoint of generation %d failed', generation)
+    return SnapshotImport(
+        source_generation=header.generation,
+        generation=generation,
+        components=sorted(components),
+        removed=removed,
+        added=added,
+    )
+
+
+def _open(path: str, mode: str):
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+def main():
+    from service.config import get_config
+    from service.database import _connection_kwargs
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('export', 'import'))
+    parser.add_argument('file', help='The snapshot file, compressed with gzip if it ends with .gz.')
+    parser.add_argument('--dsn', default='', help='The database, values missing in the DSN are taken from '
+                                                  'POSTGRES_DB_* of the config, like the replica DSNs.')
+    args = parser.parse_args()
+
+    config = get_config()
+    config = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    connection = psycopg2.connect(**{**_connection_kwargs(config), **parse_dsn(args.dsn)})
+    try:
+        if args.command == 'export':
+            with _open(args.file, 'wb') as file:
+                result = asdict(export_snapshot(connection, file))
+        else:
+            with _open(args.file, 'rb') as file:
+                result = asdict(import_snapshot(connection, file))
+    finally:
+        connection.close()
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Response formats of the component listing.
+
+Besides the json array of components, the listing is available as MessagePack and in a columnar layout:
+every string is stored once in a dictionary per response and the records are columns of integers,
+the consumers and producers columns refer to the components by their position.
+The columnar layout is serialized as json or MessagePack. MessagePack requires the package msgpack.
+"""
+import json
+from dataclasses import fields
+from typing import Dict, List
+
+from .parse_interfaces import Component, ConsumerRecord, ProducerRecord
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MIMETYPE_JSON = 'application/json'
+MIMETYPE_MSGPACK = 'application/msgpack'
+MIMETYPE_COLUMNAR_JSON = 'application/vnd.interfaces.columnar+json'
+MIMETYPE_COLUMNAR_MSGPACK = 'application/vnd.interfaces.columnar+msgpack'
+MSGPACK_MIMETYPES = (MIMETYPE_MSGPACK, MIMETYPE_COLUMNAR_MSGPACK)
+# short names of the formats, e.g. for etags
+FORMAT_NAMES = {
+    MIMETYPE_JSON: 'json',
+    MIMETYPE_COLUMNAR_JSON: 'columnar',
+    MIMETYPE_MSGPACK: 'msgpack',
+    MIMETYPE_COLUMNAR_MSGPACK: 'columnar-msgpack',
+}
+
+CONSUMER_FIELDS = tuple(field.name for field in fields(ConsumerRecord))
+PRODUCER_FIELDS = tuple(field.name for field in fields(ProducerRecord))
+# the columns of the columnar layout which are coded by the string dictionary
+STRING_COLUMNS = ('sub_component', 'interface_host', 'interface_type', 'primary', 'secondary', 'tertiary')
+
+
+def available_mimetypes() -> List[str]:
+    """
+    The formats in the order of preference, json first.
+    """
+    mimetypes = [MIMETYPE_JSON, MIMETYPE_COLUMNAR_JSON]
+    if msgpack is not None:
+        mimetypes.extend(MSGPACK_MIMETYPES)
+    return mimetypes
+
+
+def component_dict(component: Component) -> dict:
+    """
+    Equals dataclasses.asdict(component), without its recursive copying.
+    """
+    return {
+        'name': component.name,
+        'consumers': [{name: getattr(record, name) for name in CONSUMER_FIELDS} for record in component.consumers],
+        'producers': [{name: getattr(record, name) for name in PRODUCER_FIELDS} for record in component.producers],
+    }
+
+
+def _columns(components: List[Component], attribute: str, flag: str, strings: Dict[str, int]) -> Dict[str, list]:
+    positions = []
+    records = []
+    for position, component in enumerate(components):
+        component_records = getattr(component, attribute)
+        positions.extend([position] * len(component_records))
+        records.extend(component_records)
+    columns = {'component': positions}
+    for name in STRING_COLUMNS:
+        columns[name] = [strings.setdefault(getattr(record, name), len(strings)) for record in records]
+    columns[flag] = [int(getattr(record, flag)) for record in records]
+    return columns
+
+
+def to_columnar(components: List[Component]) -> dict:
+    strings: Dict[str, int] = {}
+    names = [strings.setdefault(component.name, len(strings)) for component in components]
+    consumers = _columns(components, 'consumers', 'optional', strings)
+    producers = _columns(components, 'producers', 'deprecated', strings)
+    return {
+        'strings': list(strings),
+        'components': names,
+        'consumers': consumers,
+        'producers': producers,
+    }
+
+
+def _records(columns: Dict[str, list], strings: List[str], record_type, flag: str) -> List[tuple]:
+    """
+    Returns the pairs of component position and record.
+    """
+    string_columns = [[strings[index] for index in columns[name]] for name in STRING_COLUMNS]
+    return [
+        (row[0], record_type(**dict(zip(STRING_COLUMNS, row[1:-1])), **{flag: bool(row[-1])}))
+        for row
+        in zip(columns['component'], *string_columns, columns[flag])
+    ]
+
+
+def from_columnar(data: dict) -> List[Component]:
+    strings = data['strings']
+    components = [Component(name=strings[index], consumers=[], producers=[]) for index in data['components']]
+    for position, record in _records(data['consumers'], strings, ConsumerRecord, 'optional'):
+        components[position].consumers.append(record)
+    for position, record in _records(data['producers'], strings, ProducerRecord, 'deprecated'):
+        components[position].producers.append(record)
+    return components
+
+
+def serialize_components(components: List[Component], mimetype: str) -> bytes:
+    if mimetype == MIMETYPE_JSON:
+        return json.dumps([component_dict(component) for component in components]).encode()
+    if mimetype == MIMETYPE_COLUMNAR_JSON:
+        return json.dumps(to_columnar(components), separators=(',', ':')).encode()
+    if mimetype == MIMETYPE_MSGPACK:
+        return msgpack.packb([component_dict(component) for component in components])
+    if mimetype == MIMETYPE_COLUMNAR_MSGPACK:
+        return msgpack.packb(to_columnar(components))
+    raise ValueError(f'Unknown format: {mimetype}')
+
+
+def _component(data: dict) -> Component:
+    return Component(
+        name=data['name'],
+        consumers=[ConsumerRecord(**record) for record in data['consumers']],
+        producers=[ProducerRecord(**record) for record in data['producers']],
+    )
+
+
+def deserialize_components(body: bytes, mimetype: str) -> List[Component]:
+    """
+    The inverse of serialize_components, e.g. for clients.
+    """
+    if mimetype == MIMETYPE_JSON:
+        return [_component(data) for data in json.loads(body)]
+    if mimetype == MIMETYPE_COLUMNAR_JSON:
+        return from_columnar(json.loads(body))
+    if mimetype == MIMETYPE_MSGPACK:
+        return [_component(data) for data in msgpack.unpackb(body, raw=False)]
+    if mimetype == MIMETYPE_COLUMNAR_MSGPACK:
+        return from_columnar(msgpack.unpackb(body, raw=False))
+    raise ValueError(f'Unknown format: {mimetype}')
@@ -0,0 +1,228 @@
+from array import array
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Iterable
+
+from .parse_interfaces import Component
+
+DOWNSTREAM = 'downstream'
+UPSTREAM = 'upstream'
+
+InterfaceKey = Tuple[str, str, str, str, str]
+
+
+@dataclass
+class Hop:
+    source: Optional[str]
+    target: str
+    interface: InterfaceKey
+
+
+@dataclass
+class Impact:
+    component: str
+    depth: int
+    path: List[Hop]
+
+
+def _csr(num_sources: int, pairs: Iterable[Tuple[int, int]]) -> Tuple[array, array]:
+    """
+    Builds the compressed sparse row form of the pairs (source, target):
+    the targets of source i are targets[offsets[i]:offsets[i + 1]].
+    """
+    pairs = sorted(set(pairs))
+    offsets = array('l', [0] * (num_sources + 1))
+    for source, _ in pairs:
+        offsets[source + 1] += 1
+    for i in range(num_sources):
+        offsets[i + 1] += offsets[i]
+    targets = array('l', (target for _, target in pairs))
+    return offsets, targets
+
+
+class DependencyGraph:
+    """
+    The dependency graph of the components: a consumer of an interface depends on the producers of the interface.
+
+    Components and interfaces are numbered, the graph is stored as the bipartite graph between them in arrays.
+    Going downstream leads from a component via its produced interfaces to the components consuming them,
+    going upstream from a component via its consumed interfaces to the components producing them.
+    """
+
+    def __init__(self, components: List[Component]):
+        self.component_names: List[str] = [component.name for component in components]
+        self._component_ids: Dict[str, int] = {name: i for i, name in enumerate(self.component_names)}
+        self.interface_keys: List[InterfaceKey] = []
+        self._interface_ids: Dict[InterfaceKey, int] = {}
+        self._interface_ids_by_host_type: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+
+        produces = []
+        consumes = []
+        consumes_required = []
+        for component_id, component in enumerate(components):
+            for producer in component.producers:
+                produces.append((component_id, self._interface_id(
+                    producer.interface_host, producer.interface_type,
+                    producer.primary, producer.secondary, producer.tertiary,
+                )))
+            for consumer in component.consumers:
+                pair = (component_id, self._interface_id(
+                    consumer.interface_host, consumer.interface_type,
+                    consumer.primary, consumer.secondary, consumer.tertiary,
+                ))
+                consumes.append(pair)
+                if not consumer.optional:
+                    consumes_required.append(pair)
+
+        num_components = len(self.component_names)
+        num_interfaces = len(self.interface_keys)
+        self._produced = _csr(num_components, produces)
+        self._consumed = _csr(num_components, consumes)
+        self._producers = _csr(num_interfaces, ((i, c) for c, i in produces))
+        self._consumers = _csr(num_interfaces, ((i, c) for c, i in consumes))
+        self._required_consumers = _csr(num_interfaces, ((i, c) for c, i in consumes_required))
+
+    def _interface_id(self, *key: str) -> int:
+        interface_id = self._interface_ids.get(key)
+        if interface_id is None:
+            interface_id = self._interface_ids[key] = len(self.interface_keys)
+            self.interface_keys.append(key)
+            self._interface_ids_by_host_type[key[:2]].append(interface_id)
+        return interface_id
+
+    @property
+    def num_components(self) -> int:
+        return len(self.component_names)
+
+    @property
+    def num_interfaces(self) -> int:
+        return len(self.interface_keys)
+
+    def has_component(self, name: str) -> bool:
+        return name in self._component_ids
+
+    def find_interfaces(
+            self,
+            interface_host: str,
+            interface_type: str,
+            primary: Optional[str] = None,
+            secondary: Optional[str] = None,
+            tertiary: Optional[str] = None,
+    ) -> List[InterfaceKey]:
+        """
+        Returns the keys of the interfaces matching the given values, omitted values match all.
+        """
+        return [
+            self.interface_keys[i]
+            for i
+            in self._interface_ids_by_host_type.get((interface_host, interface_type), [])
+            if all(
+                value is None or value == part
+                for value, part
+                in zip((primary, secondary, tertiary), self.interface_keys[i][2:])
+            )
+        ]
+
+    def _adjacency(self, direction: str, include_optional: bool):
+        if direction == DOWNSTREAM:
+            return self._produced, self._consumers if include_optional else self._required_consumers
+        if direction == UPSTREAM:
+            return self._consumed, self._producers
+        raise ValueError(f'Unknown direction: {direction}')
+
+    def _traverse(
+            self,
+            start_components: List[int],
+            start_hops: List[Tuple[int, int]],
+            direction: str,
+            max_depth: Optional[int],
+            include_optional: bool,
+    ) -> List[Impact]:
+        (component_offsets, interfaces), (interface_offsets, components) = \
+            self._adjacency(direction, include_optional)
+        num_components = len(self.component_names)
+        # per component: depth (-1 = not reached), previous component and interface leading to it (-1 = none)
+        depths = array('l', [-1]) * num_components
+        previous_components = array('l', [-1]) * num_components
+        via_interfaces = array('l', [-1]) * num_components
+        for component_id in start_components:
+            depths[component_id] = 0
+        order = []
+        frontier = list(start_components)
+        depth = 0
+        if start_hops:
+            depth = 1
+            for interface_id, component_id in start_hops:
+                if depths[component_id] < 0:
+                    depths[component_id] = 1
+                    via_interfaces[component_id] = interface_id
+                    order.append(component_id)
+                    frontier.append(component_id)
+
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_frontier = []
+            for component_id in frontier:
+                for i in range(component_offsets[component_id], component_offsets[component_id + 1]):
+                    interface_id = interfaces[i]
+                    for j in range(interface_offsets[interface_id], interface_offsets[interface_id + 1]):
+                        next_component_id = components[j]
+                        if depths[next_component_id] < 0:
+                            depths[next_component_id] = depth
+                            previous_components[next_component_id] = component_id
+                            via_interfaces[next_component_id] = interface_id
+                            order.append(next_component_id)
+                            next_frontier.append(next_component_id)
+            frontier = next_frontier
+
+        # components are reached in breadth first order, so the path to the previous component is always known
+        paths = {}
+        impacts = []
+        for component_id in order:
+            previous = previous_components[component_id]
+            hop = Hop(
+                source=self.component_names[previous] if previous >= 0 else None,
+                target=self.component_names[component_id],
+                interface=self.interface_keys[via_interfaces[component_id]],
+            )
+            path = paths[component_id] = paths.get(previous, []) + [hop]
+            impacts.append(Impact(component=self.component_names[component_id], depth=depths[component_id], path=path))
+        return impacts
+
+    def component_impact(
+            self,
+            component: str,
+            direction: str = DOWNSTREAM,
+            max_depth: Optional[int] = None,
+            include_optional: bool = False,
+    ) -> List[Impact]:
+        """
+        Returns the components reachable from the component in breadth first order,
+        each with the depth and one shortest path to it.
+        Downstream the optional consumers are only included if requested, upstream all producers are included.
+        """
+        return self._traverse([self._component_ids[component]], [], direction, max_depth, include_optional)
+
+    def interface_impact(
+            self,
+            interface_keys: List[InterfaceKey],
+            direction: str = DOWNSTREAM,
+            max_depth: Optional[int] = None,
+            include_optional: bool = False,
+    ) -> List[Impact]:
+        """
+        Like component_impact, starting at the consumers (downstream) or producers (upstream) of the interfaces.
+        The first hop of a path has no source.
+        """
+        if max_depth is not None and max_depth < 1:
+            return []
+        _, (interface_offsets, components) = self._adjacency(direction, include_optional)
+        start_hops = []
+        for key in interface_keys:
+            interface_id = self._interface_ids[key]
+            start_hops.extend(
+                (interface_id, components[j])
+                for j
+                in range(interface_offsets[interface_id], interface_offsets[interface_id + 1])
+            )
+        return self._traverse([], start_hops, direction, max_depth, include_optional)
@@ -0,0 +1,28 @@
+import threading
+from typing import Any, Optional
+
+
+class GenerationCache:
+    """
+    Thread safe cache for values derived from the latest generation of the registry seen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._values = {}
+
+    def get(self, generation: int, key: Any) -> Optional[Any]:
+        with self._lock:
+            if generation != self._generation:
+                return None
+            return self._values.get(key)
+
+    def set(self, generation: int, key: Any, value: Any) -> None:
+        with self._lock:
+            if self._generation is not None and generation < self._generation:
+                return
+            if generation != self._generation:
+                self._generation = generation
+                self._values = {}
+            self._values[key] = value
@@ -0,0 +1,217 @@
+"""
+Minimal Prometheus metrics and per request phase timers.
+
+The metrics are kept per process, with a pre-forking server every worker exposes its own values.
+Phase timers are recorded into the timings of the current request, which are held in a context variable,
+so the database layer can be instrumented without knowing about flask.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+HEADER_SERVER_TIMING = 'Server-Timing'
+CONTENT_TYPE_PROMETHEUS = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = '') -> str:
+    labels = [f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # per label values: [count per bucket (the last one is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labelvalues)
+            if counts is None:
+                counts = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, *labelvalues: str) -> int:
+        with self._lock:
+            counts = self._values.get(labelvalues)
+            return sum(counts[:-1]) if counts else 0
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            values = sorted((labelvalues, list(counts)) for labelvalues, counts in self._values.items())
+        for labelvalues, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format_value(counts[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Returns all metrics in the Prometheus text format.
+        """
+        return '\n'.join(line for metric in self._metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'interfaces_request_duration_seconds',
+    'Duration of the requests, the count per status includes the rejected (400) and conflicting (409) uploads.',
+    ('method', 'endpoint', 'status'),
+))
+PHASE_DURATION = REGISTRY.register(Histogram(
+    'interfaces_phase_duration_seconds',
+    'Duration of the phases per request: parse, schema, diff, lock (waiting for locks), write, conflicts, commit, '
+    'query, build, serialize, compress.',
+    ('phase',),
+))
+ROWS_WRITTEN = REGISTRY.register(Counter(
+    'interfaces_rows_written_total',
+    'Number of consumer and producer rows inserted and deleted.',
+    ('operation',),
+))
+
+
+class RequestTimings:
+    """
+    The phase durations and row counts of one request, in the order the phases were first entered.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def duration(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        """
+        Returns the value of the Server-Timing header, durations in milliseconds.
+        """
+        metrics = [f'{phase};dur={seconds * 1000:.3f}' for phase, seconds in self.phases.items()]
+        metrics.append(f'total;dur={self.duration() * 1000:.3f}')
+        return ', '.join(metrics)
+
+    def describe(self) -> str:
+        return ', '.join(
+            [f'{phase}={seconds * 1000:.1f}ms' for phase, seconds in self.phases.items()]
+            + [f'{name}={count}' for name, count in self.counts.items()]
+        )
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+
+def start_request() -> RequestTimings:
+    timings = RequestTimings()
+    _timings.set(timings)
+    return timings
+
+
+def end_request() -> Optional[RequestTimings]:
+    """
+    Ends the timings of the current request and records the duration of its phases.
+    """
+    timings = _timings.get()
+    _timings.set(None)
+    if timings is not None:
+        for name, seconds in timings.phases.items():
+            PHASE_DURATION.observe(seconds, name)
+    return timings
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Times the block as the phase name. A phase entered several times within a request is summed up.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        timings = _timings.get()
+        if timings is None:
+            PHASE_DURATION.observe(seconds, name)
+        else:
+            timings.phases[name] = timings.phases.get(name, 0.0) + seconds
+
+
+def count_rows(operation: str, rows: int) -> None:
+    if rows <= 0:
+        return
+    ROWS_WRITTEN.inc(operation, amount=rows)
+    timings = _timings.get()
+    if timings is not None:
+        name = f'rows_{operation}'
+        timings.counts[name] = timings.counts.get(name, 0) + rows
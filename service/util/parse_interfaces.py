@@ -1,12 +1,18 @@
-from itertools import chain
-from typing import List, Iterator, Tuple
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Iterable, List, Iterator, Optional, Tuple
 
 import jsonschema
-from dataclasses import dataclass, asdict
+from jsonschema import ValidationError
 
+from .metrics import phase
+from dataclasses import dataclass
 
+
+# the records are slotted: registries hold millions of them, a __dict__ per record would double their memory
 @dataclass
 class ConsumerValue:
+    __slots__ = ('primary', 'secondary', 'tertiary', 'optional')
     primary: str
     secondary: str
     tertiary: str
@@ -15,6 +21,7 @@ class ConsumerValue:
 
 @dataclass
 class ConsumerRecord(ConsumerValue):
+    __slots__ = ('sub_component', 'interface_host', 'interface_type')
     sub_component: str
     interface_host: str
     interface_type: str
@@ -22,6 +29,7 @@ class ConsumerRecord(ConsumerValue):
 
 @dataclass
 class ProducerValue:
+    __slots__ = ('primary', 'secondary', 'tertiary', 'deprecated')
     primary: str
     secondary: str
     tertiary: str
@@ -30,6 +38,7 @@ class ProducerValue:
 
 @dataclass
 class ProducerRecord(ProducerValue):
+    __slots__ = ('sub_component', 'interface_host', 'interface_type')
     sub_component: str
     interface_host: str
     interface_type: str
@@ -42,6 +51,10 @@ class Component:
     producers: List[ProducerRecord]
 
 
+class DeclarationLimitExceeded(Exception):
+    pass
+
+
 class Parser():
     API_VERSION = 'apiVersion'
     KIND = 'kind'
@@ -166,46 +179,147 @@ class Parser():
         },
     }
 
+    def __init__(self, max_documents: Optional[int] = None, max_records: Optional[int] = None):
+        self.max_documents = max_documents
+        self.max_records = max_records
+
+    @classmethod
+    def _schema_validator(cls):
+        """
+        Returns the jsonschema validator of SCHEMA, it is built once.
+        """
+        return _schema_validator(cls)
+
+    @classmethod
+    def _iter_errors(cls, interfaces) -> Iterator[ValidationError]:
+        if cls.SCHEMA is Parser.SCHEMA:
+            return cls._iter_errors_v1(interfaces)
+        return cls._schema_validator().iter_errors(interfaces)
+
+    @classmethod
+    def _iter_document_errors(cls, document, index: int) -> Iterator[ValidationError]:
+        """
+        Validates one document as the item at index of the list of documents.
+        """
+        if cls.SCHEMA is Parser.SCHEMA:
+            yield from cls._iter_declaration_errors_v1(document, (index,))
+            return
+        for error in cls._schema_validator().iter_errors([document]):
+            error.path[0] = index
+            yield error
+
     @classmethod
     def _validate_interfaces(cls, interfaces):
-        jsonschema.validate(interfaces, cls.SCHEMA)
-
-    def _parse_consumer_value(self, value: dict) -> ConsumerValue:
-        return ConsumerValue(
-            primary=value.get(self.PRIMARY, ''),
-            secondary=value.get(self.SECONDARY, ''),
-            tertiary=value.get(self.TERTIARY, ''),
-            optional=value.get(self.OPTIONAL, False)
-        )
+        cls._raise_errors(list(cls._iter_errors(interfaces)))
 
-    def _parse_producer_value(self, value: dict) -> ProducerValue:
-        return ProducerValue(
-            primary=value.get(self.PRIMARY, ''),
-            secondary=value.get(self.SECONDARY, ''),
-            tertiary=value.get(self.TERTIARY, ''),
-            deprecated=value.get(self.DEPRECATED, False)
-        )
+    @staticmethod
+    def _raise_errors(errors: List[ValidationError]):
+        if len(errors) == 1:
+            raise errors[0]
+        if errors:
+            raise ValidationError(
+                f'{len(errors)} errors: ' + '; '.join(f'{_json_path(e.absolute_path)}: {e.message}' for e in errors),
+                context=errors,
+            )
+
+    @classmethod
+    def _iter_errors_v1(cls, interfaces) -> Iterator[ValidationError]:
+        """
+        Validates against SCHEMA like jsonschema does, but specialised for it: yields all errors in one pass.
+        """
+        if not isinstance(interfaces, list):
+            yield _error(interfaces, 'type', 'array', ())
+            return
+        for i, interface in enumerate(interfaces):
+            yield from cls._iter_declaration_errors_v1(interface, (i,))
+
+    @classmethod
+    def _iter_declaration_errors_v1(cls, interface, path: tuple) -> Iterator[ValidationError]:
+        if not isinstance(interface, dict):
+            yield _error(interface, 'type', 'object', path)
+            return
+        if cls.API_VERSION in interface:
+            api_version = interface[cls.API_VERSION]
+            if not _is_integer(api_version):
+                yield _error(api_version, 'type', 'integer', path + (cls.API_VERSION,))
+            if _is_number(api_version):
+                if api_version < 1:
+                    yield _error(api_version, 'minimum', 1, path + (cls.API_VERSION,))
+                if api_version > 1:
+                    yield _error(api_version, 'maximum', 1, path + (cls.API_VERSION,))
+        if cls.KIND in interface:
+            kind = interface[cls.KIND]
+            if not isinstance(kind, str):
+                yield _error(kind, 'type', 'string', path + (cls.KIND,))
+            if not (isinstance(kind, str) and kind == 'InterfaceDeclaration'):
+                yield _error(kind, 'enum', ['InterfaceDeclaration'], path + (cls.KIND,))
+        if cls.SUB_COMPONENT in interface and not isinstance(interface[cls.SUB_COMPONENT], str):
+            yield _error(interface[cls.SUB_COMPONENT], 'type', 'string', path + (cls.SUB_COMPONENT,))
+        for key, flag in ((cls.PRODUCERS, cls.DEPRECATED), (cls.CONSUMERS, cls.OPTIONAL)):
+            if key in interface:
+                yield from cls._iter_interfaces_errors_v1(interface[key], flag, path + (key,))
+        for key in (cls.API_VERSION, cls.KIND):
+            if key not in interface:
+                yield _error(interface, 'required', key, path, f'{key!r} is a required property')
+
+    @classmethod
+    def _iter_interfaces_errors_v1(cls, interfaces, flag: str, path: tuple) -> Iterator[ValidationError]:
+        if not isinstance(interfaces, list):
+            yield _error(interfaces, 'type', 'array', path)
+            return
+        for i, interface in enumerate(interfaces):
+            interface_path = path + (i,)
+            if not isinstance(interface, dict):
+                yield _error(interface, 'type', 'object', interface_path)
+                continue
+            for key in (cls.HOST, cls.TYPE):
+                if key in interface and not isinstance(interface[key], str):
+                    yield _error(interface[key], 'type', 'string', interface_path + (key,))
+            if cls.VALUES in interface:
+                values = interface[cls.VALUES]
+                if not isinstance(values, list):
+                    yield _error(values, 'type', 'array', interface_path + (cls.VALUES,))
+                else:
+                    for j, value in enumerate(values):
+                        value_path = interface_path + (cls.VALUES, j)
+                        if not isinstance(value, dict):
+                            yield _error(value, 'type', 'object', value_path)
+                            continue
+                        for key in (cls.PRIMARY, cls.SECONDARY, cls.TERTIARY):
+                            if key in value and not isinstance(value[key], str):
+                                yield _error(value[key], 'type', 'string', value_path + (key,))
+                        if flag in value and not isinstance(value[flag], bool):
+                            yield _error(value[flag], 'type', 'boolean', value_path + (flag,))
+            for key in (cls.HOST, cls.TYPE, cls.VALUES):
+                if key not in interface:
+                    yield _error(interface, 'required', key, interface_path, f'{key!r} is a required property')
 
     def _parse_consumer(self, sub_component: str, consumer: dict) -> Iterator[ConsumerRecord]:
         interface_host = consumer[self.HOST]
         interface_type = consumer[self.TYPE]
-        for consumer_value in consumer[self.VALUES]:
+        for value in consumer[self.VALUES]:
             yield ConsumerRecord(
+                primary=value.get(self.PRIMARY, ''),
+                secondary=value.get(self.SECONDARY, ''),
+                tertiary=value.get(self.TERTIARY, ''),
+                optional=value.get(self.OPTIONAL, False),
                 sub_component=sub_component,
                 interface_host=interface_host,
                 interface_type=interface_type,
-                **asdict(self._parse_consumer_value(consumer_value))
             )
 
     def _parse_producer(self, sub_component: str, producer: dict) -> Iterator[ProducerRecord]:
         interface_host: str = producer[self.HOST]
         interface_type: str = producer[self.TYPE]
-        for producer_value in producer[self.VALUES]:
+        for value in producer[self.VALUES]:
             yield ProducerRecord(
+                primary=value.get(self.PRIMARY, ''),
+                secondary=value.get(self.SECONDARY, ''),
+                tertiary=value.get(self.TERTIARY, ''),
+                deprecated=value.get(self.DEPRECATED, False),
                 sub_component=sub_component,
                 interface_host=interface_host,
                 interface_type=interface_type,
-                **asdict(self._parse_producer_value(producer_value))
             )
 
     def _parse_interface(self, interface: dict) -> Tuple[Iterator[ConsumerRecord], Iterator[ProducerRecord]]:
@@ -225,13 +339,66 @@ class Parser():
         return consumer_records_iter, producer_records_iter
 
     def _parse(self, interfaces: list) -> Tuple[List[ConsumerRecord], List[ProducerRecord]]:
-        self._validate_interfaces(interfaces)
+        if not isinstance(interfaces, list):
+            self._validate_interfaces(interfaces)
+        return self._parse_documents(interfaces)
+
+    def _parse_documents(self, documents: Iterable) -> Tuple[List[ConsumerRecord], List[ProducerRecord]]:
+        """
+        Validates and converts every document as soon as it is read, so the documents need not be held in memory.
+        After the first invalid document the remaining ones are only validated, to report all errors.
+        """
         consumer_records: List[ConsumerRecord] = []
         producer_records: List[ProducerRecord] = []
+        errors: List[ValidationError] = []
 
-        for interface in interfaces:
-            consumer_records_iter, producer_records_iter = self._parse_interface(interface)
-            consumer_records.extend(consumer_records_iter)
-            producer_records.extend(producer_records_iter)
+        for index, document in enumerate(documents):
+            if self.max_documents is not None and index >= self.max_documents:
+                raise DeclarationLimitExceeded(f'More than {self.max_documents} documents.')
+            with phase('schema'):
+                errors.extend(self._iter_document_errors(document, index))
+            if errors:
+                continue
+            for records, records_iter in zip((consumer_records, producer_records), self._parse_interface(document)):
+                if self.max_records is not None:
+                    # converts at most one record more than allowed
+                    remaining = self.max_records - len(consumer_records) - len(producer_records)
+                    records_iter = islice(records_iter, remaining + 1)
+                records.extend(records_iter)
+                if self.max_records is not None and len(consumer_records) + len(producer_records) > self.max_records:
+                    raise DeclarationLimitExceeded(f'More than {self.max_records} consumers and producers.')
 
+        self._raise_errors(errors)
         return consumer_records, producer_records
+
+
+@lru_cache(maxsize=None)
+def _schema_validator(parser_class):
+    validator_class = jsonschema.validators.validator_for(parser_class.SCHEMA)
+    validator_class.check_schema(parser_class.SCHEMA)
+    return validator_class(parser_class.SCHEMA)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_integer(value) -> bool:
+    return _is_number(value) and (isinstance(value, int) or value.is_integer())
+
+
+def _json_path(path) -> str:
+    return '$' + ''.join(f'[{part}]' if isinstance(part, int) else f'.{part}' for part in path)
+
+
+def _error(instance, validator: str, validator_value, path: tuple, message: str = None) -> ValidationError:
+    if message is None:
+        if validator == 'type':
+            message = f'{instance!r} is not of type {validator_value!r}'
+        elif validator == 'enum':
+            message = f'{instance!r} is not one of {validator_value!r}'
+        elif validator == 'minimum':
+            message = f'{instance!r} is less than the minimum of {validator_value!r}'
+        else:
+            message = f'{instance!r} is greater than the maximum of {validator_value!r}'
+    return ValidationError(message, validator=validator, validator_value=validator_value, instance=instance, path=path)
@@ -0,0 +1,30 @@
+import json
+from typing import Tuple, List
+
+from .parse_interfaces import Parser, ConsumerRecord, ProducerRecord
+
+
+class JsonParser(Parser):
+    """
+    Parses a json document containing the list of interface declarations, or a single declaration.
+    """
+
+    def parse(self, json_content) -> Tuple[List[ConsumerRecord], List[ProducerRecord]]:
+        if not isinstance(json_content, (str, bytes, bytearray)):
+            json_content = json_content.read()
+        interfaces = json.loads(json_content)
+        if isinstance(interfaces, dict):
+            interfaces = [interfaces]
+        return self._parse(interfaces)
+
+
+class JsonLinesParser(Parser):
+    """
+    Parses json lines: one interface declaration per line, empty lines are ignored.
+    The lines can be an iterable, e.g. a stream, every line is converted as soon as it is read.
+    """
+
+    def parse(self, json_lines) -> Tuple[List[ConsumerRecord], List[ProducerRecord]]:
+        if isinstance(json_lines, (str, bytes, bytearray)):
+            json_lines = json_lines.splitlines()
+        return self._parse_documents(json.loads(line) for line in json_lines if line.strip())
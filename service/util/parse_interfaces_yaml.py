@@ -4,8 +4,15 @@ import yaml
 
 from .parse_interfaces import Parser, ConsumerRecord, ProducerRecord
 
+try:
+    # the libyaml based loader is much faster and constructs the same objects
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 
 class YamlParser(Parser):
+    LOADER = SafeLoader
+
     def parse(self, yaml_content) -> Tuple[List[ConsumerRecord], List[ProducerRecord]]:
-        interfaces = list(yaml.safe_load_all(yaml_content))
-        return self._parse(interfaces)
+        return self._parse_documents(yaml.load_all(yaml_content, Loader=self.LOADER))
@@ -0,0 +1,39 @@
+import unittest
+
+from psycopg2 import connect, OperationalError
+
+from service.config import get_config
+from service.database.initialization_queries import SQL_DROP_ALL, SQL_INIT_TABLES
+
+
+def connection_kwargs() -> dict:
+    config = get_config()
+    return dict(
+        host=config.POSTGRES_DB_HOST,
+        port=config.POSTGRES_DB_PORT,
+        dbname=config.POSTGRES_DB_NAME,
+        user=config.POSTGRES_DB_USER,
+        password=config.POSTGRES_DB_PASS,
+    )
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Base class for tests against the postgres database of the test config. The tables are recreated for every test.
+    Tests are skipped if the database is not reachable.
+    """
+
+    def connect(self):
+        connection = connect(**connection_kwargs())
+        self.addCleanup(connection.close)
+        return connection
+
+    def setUp(self):
+        try:
+            self.connection = self.connect()
+        except OperationalError as e:
+            self.skipTest(f'Database not available: {e}')
+        with self.connection.cursor() as cursor:
+            cursor.execute(SQL_DROP_ALL)
+            cursor.execute(SQL_INIT_TABLES)
+        self.connection.commit()
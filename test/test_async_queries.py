@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+
+from service.database import queries
+from service.database.history import get_components_at
+from service.database.queries import InterfaceEntryConflict, InterfaceEntryDuplication
+from test.database import DatabaseTestCase, connection_kwargs
+from test.test_set_interface import consumer, producer, unsatisfied
+
+try:
+    import asyncpg
+    from service.database import async_queries
+except ImportError:
+    asyncpg = None
+
+
+@unittest.skipIf(asyncpg is None, 'asyncpg is not installed')
+class AsyncQueriesTest(DatabaseTestCase):
+    def run_async(self, function, *args):
+        async def run():
+            kwargs = connection_kwargs()
+            kwargs['database'] = kwargs.pop('dbname')
+            connection = await asyncpg.connect(**kwargs)
+            try:
+                await async_queries.create_staging_tables(connection)
+                return await function(connection, *args)
+            finally:
+                await connection.close()
+
+        return asyncio.run(run())
+
+    def test_reports_consumers_of_removed_producers(self):
+        self.run_async(async_queries.set_interface, 'a', [], [producer('x')])
+        self.run_async(async_queries.set_interface, 'b', [consumer('x')], [])
+        with self.assertRaises(InterfaceEntryConflict) as context:
+            self.run_async(async_queries.set_interface, 'a', [], [])
+        self.assertListEqual(context.exception.conflicts, [unsatisfied('b', 'x')])
+        self.assertEqual(self.run_async(async_queries.get_generation), 2)
+
+    def test_duplicate_entry(self):
+        with self.assertRaises(InterfaceEntryDuplication):
+            self.run_async(async_queries.set_interface, 'a', [], [producer('x'), producer('x')])
+
+    def test_unchanged_declaration(self):
+        first = self.run_async(async_queries.set_interface, 'a', [consumer('x')], [producer('x')])
+        second = self.run_async(async_queries.set_interface, 'a', [consumer('x')], [producer('x')])
+        self.assertFalse(first.unchanged)
+        self.assertTrue(second.unchanged)
+        self.assertEqual(first.generation, 1)
+        self.assertIsNone(second.generation)
+
+    def test_reports_added_and_removed_rows(self):
+        self.run_async(async_queries.set_interface, 'a', [consumer('x')], [producer('x'), producer('y')])
+        update = self.run_async(async_queries.set_interface, 'a', [consumer('x', optional=True)], [producer('x')])
+        self.assertEqual((update.added, update.removed), (1, 2))
+
+    def test_interoperates_with_synchronous_writes(self):
+        queries.set_interface(self.connection, 'a', [], [producer('x'), producer('y')])
+        self.run_async(async_queries.set_interfaces, {
+            'b': ([consumer('x')], [producer('z', 'sub')]),
+            'c': ([consumer('y', optional=True), consumer('z')], []),
+        })
+        generation, components = self.run_async(async_queries.get_components_snapshot)
+        self.assertEqual((generation, components), queries.get_components_snapshot(self.connection))
+        self.assertEqual(queries.set_interface(self.connection, 'b', [consumer('x')], [producer('z', 'sub')]),
+                         queries.InterfaceUpdate('b', True))
+
+    def test_records_the_same_history_as_synchronous_writes(self):
+        self.run_async(async_queries.set_interface, 'a', [], [producer('x')])
+        self.run_async(async_queries.set_interface, 'b', [consumer('x')], [])
+        self.assertListEqual(get_components_at(self.connection, 2), queries.get_components(self.connection))
+
+    def test_numbered_placeholders(self):
+        self.assertEqual(async_queries._sql("SELECT %s, '%%', %s;"), "SELECT $1, '%', $2;")
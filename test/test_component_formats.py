@@ -0,0 +1,55 @@
+import json
+import unittest
+from dataclasses import asdict
+
+from service.util import component_formats
+from service.util.component_formats import (
+    MIMETYPE_COLUMNAR_JSON,
+    MIMETYPE_JSON,
+    available_mimetypes,
+    deserialize_components,
+    serialize_components,
+    to_columnar,
+)
+from service.util.parse_interfaces import Component
+from test.test_set_interface import consumer, producer
+
+COMPONENTS = [
+    Component(name='a', consumers=[consumer('x'), consumer('y', 'sub', optional=True)], producers=[]),
+    Component(name='b', consumers=[], producers=[producer('x'), producer('ü', 'a')]),
+    Component(name='c', consumers=[consumer('ü')], producers=[producer('y', 'sub')]),
+]
+
+
+class ComponentFormatsTest(unittest.TestCase):
+    def test_json_equals_asdict(self):
+        body = serialize_components(COMPONENTS, MIMETYPE_JSON)
+        self.assertEqual(body, json.dumps([asdict(component) for component in COMPONENTS]).encode())
+
+    def test_round_trip(self):
+        for mimetype in available_mimetypes():
+            with self.subTest(mimetype):
+                body = serialize_components(COMPONENTS, mimetype)
+                self.assertListEqual(deserialize_components(body, mimetype), COMPONENTS)
+                self.assertListEqual(deserialize_components(serialize_components([], mimetype), mimetype), [])
+
+    def test_columnar_stores_strings_once(self):
+        columnar = to_columnar(COMPONENTS)
+        strings = columnar['strings']
+        self.assertEqual(len(strings), len(set(strings)))
+        self.assertListEqual([strings[index] for index in columnar['components']], ['a', 'b', 'c'])
+        self.assertListEqual(columnar['producers']['component'], [1, 1, 2])
+        self.assertListEqual(columnar['consumers']['optional'], [0, 1, 0])
+        self.assertLess(
+            len(serialize_components(COMPONENTS * 100, MIMETYPE_COLUMNAR_JSON)),
+            len(serialize_components(COMPONENTS * 100, MIMETYPE_JSON)) / 3,
+        )
+
+    @unittest.skipIf(component_formats.msgpack is None, 'msgpack is not installed')
+    def test_msgpack_is_offered_if_installed(self):
+        self.assertListEqual(available_mimetypes(), [
+            MIMETYPE_JSON,
+            MIMETYPE_COLUMNAR_JSON,
+            component_formats.MIMETYPE_MSGPACK,
+            component_formats.MIMETYPE_COLUMNAR_MSGPACK,
+        ])
@@ -0,0 +1,68 @@
+import unittest
+
+from service.util.dependency_graph import DependencyGraph, Hop, DOWNSTREAM, UPSTREAM
+from service.util.parse_interfaces import Component, ConsumerRecord, ProducerRecord
+
+
+def key(host: str):
+    return host, 'rest', 'get', '/api', ''
+
+
+def component(name: str, consumes=(), produces=(), consumes_optional=()) -> Component:
+    return Component(
+        name=name,
+        consumers=[
+            ConsumerRecord(sub_component='', interface_host=host, interface_type='rest',
+                           primary='get', secondary='/api', tertiary='', optional=host in consumes_optional)
+            for host
+            in list(consumes) + list(consumes_optional)
+        ],
+        producers=[
+            ProducerRecord(sub_component='', interface_host=host, interface_type='rest',
+                           primary='get', secondary='/api', tertiary='', deprecated=False)
+            for host
+            in produces
+        ],
+    )
+
+
+class DependencyGraphTest(unittest.TestCase):
+    def setUp(self):
+        # a <- b <- c <- d, b <- e (optional), c and d both consume x produced by a and b
+        self.graph = DependencyGraph([
+            component('a', produces=['a', 'x']),
+            component('b', consumes=['a'], produces=['b', 'x']),
+            component('c', consumes=['b', 'x'], produces=['c']),
+            component('d', consumes=['c']),
+            component('e', consumes_optional=['b']),
+        ])
+
+    def impacts(self, impacts):
+        return [(impact.component, impact.depth) for impact in impacts]
+
+    def test_downstream(self):
+        self.assertListEqual(self.impacts(self.graph.component_impact('a')), [('b', 1), ('c', 1), ('d', 2)])
+        self.assertListEqual(self.impacts(self.graph.component_impact('a', max_depth=1)), [('b', 1), ('c', 1)])
+        self.assertListEqual(
+            self.impacts(self.graph.component_impact('b', include_optional=True)), [('c', 1), ('e', 1), ('d', 2)])
+
+    def test_upstream(self):
+        self.assertListEqual(self.impacts(self.graph.component_impact('d', UPSTREAM)), [('c', 1), ('a', 2), ('b', 2)])
+        self.assertListEqual(self.impacts(self.graph.component_impact('e', UPSTREAM)), [('b', 1), ('a', 2)])
+
+    def test_path(self):
+        impact = self.graph.component_impact('a', DOWNSTREAM)[-1]
+        self.assertListEqual(impact.path, [Hop('a', 'c', key('x')), Hop('c', 'd', key('c'))])
+
+    def test_interface_impact(self):
+        interfaces = self.graph.find_interfaces('x', 'rest')
+        self.assertListEqual(interfaces, [key('x')])
+        impacts = self.graph.interface_impact(interfaces)
+        self.assertListEqual(self.impacts(impacts), [('c', 1), ('d', 2)])
+        self.assertListEqual(impacts[1].path, [Hop(None, 'c', key('x')), Hop('c', 'd', key('c'))])
+        self.assertListEqual(self.impacts(self.graph.interface_impact(interfaces, UPSTREAM)), [('a', 1), ('b', 1)])
+        self.assertListEqual(self.graph.find_interfaces('x', 'rest', 'post'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
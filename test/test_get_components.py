@@ -0,0 +1,105 @@
+import unittest
+
+from service.database.queries import (
+    ComponentFilter,
+    get_components,
+    get_components_snapshot,
+    get_filtered_components,
+    get_interface_usages,
+    InterfaceQuery,
+    set_interface,
+    stream_components,
+)
+from test.database import DatabaseTestCase
+from test.test_set_interface import consumer, producer
+
+
+class GetComponentsTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        set_interface(self.connection, 'c', [], [producer('x'), producer('y', 'sub')])
+        set_interface(self.connection, 'a', [consumer('x')], [])
+        set_interface(self.connection, 'b', [consumer('y')], [producer('z')])
+        set_interface(self.connection, 'd', [consumer('z', optional=True)], [])
+
+    def test_stream_components_equals_get_components(self):
+        expected_generation, expected_components = get_components_snapshot(self.connection)
+        generation, components = stream_components(self.connection)
+        self.assertEqual(generation, expected_generation)
+        self.assertListEqual(list(components), expected_components)
+        self.assertListEqual([c.name for c in get_components(self.connection)], ['a', 'b', 'c', 'd'])
+
+    def test_stream_components_with_mixed_case_names(self):
+        # linguistic collations sort 'a' before 'B', python and the streaming merge sort 'B' before 'a'
+        set_interface(self.connection, 'B', [consumer('x')], [producer('v')])
+        set_interface(self.connection, 'A', [], [producer('w')])
+        set_interface(self.connection, 'aa', [consumer('w')], [])
+        _, components = stream_components(self.connection)
+        names = [c.name for c in components]
+        self.assertListEqual(names, ['A', 'B', 'a', 'aa', 'b', 'c', 'd'])
+        self.assertListEqual(names, [c.name for c in get_components(self.connection)])
+
+    def test_filters(self):
+        for component_filter, expected in (
+            (ComponentFilter(), [('a', 1, 0), ('b', 1, 1), ('c', 0, 2), ('d', 1, 0)]),
+            (ComponentFilter(component='b'), [('b', 1, 1)]),
+            (ComponentFilter(component='b', include_consumers=False), [('b', 0, 1)]),
+            (ComponentFilter(sub_component='sub'), [('c', 0, 1)]),
+            (ComponentFilter(interface_host='z'), [('b', 0, 1), ('d', 1, 0)]),
+            (ComponentFilter(interface_host='z', include_producers=False), [('d', 1, 0)]),
+            (ComponentFilter(interface_type='rest', primary='ge', secondary='/a'), [
+                ('a', 1, 0), ('b', 1, 1), ('c', 0, 2), ('d', 1, 0)]),
+            (ComponentFilter(primary='g_'), []),
+            (ComponentFilter(primary='get', tertiary='x'), []),
+        ):
+            with self.subTest(component_filter):
+                components, next_after = get_filtered_components(self.connection, component_filter)
+                self.assertListEqual(
+                    [(c.name, len(c.consumers), len(c.producers)) for c in components],
+                    expected,
+                )
+                self.assertIsNone(next_after)
+
+    def test_pagination(self):
+        pages = []
+        after = None
+        while True:
+            components, after = get_filtered_components(self.connection, ComponentFilter(), after, limit=3)
+            pages.append([c.name for c in components])
+            if after is None:
+                break
+        self.assertListEqual(pages, [['a', 'b', 'c'], ['d']])
+
+    def test_pagination_with_mixed_case_names(self):
+        set_interface(self.connection, 'B', [consumer('x')], [])
+        set_interface(self.connection, 'A', [], [producer('w')])
+        pages = []
+        after = None
+        while True:
+            components, after = get_filtered_components(self.connection, ComponentFilter(), after, limit=2)
+            pages.append([c.name for c in components])
+            if after is None:
+                break
+        self.assertListEqual(pages, [['A', 'B'], ['a', 'b'], ['c', 'd']])
+
+
+    def test_interface_usages(self):
+        usages = get_interface_usages(self.connection, [
+            InterfaceQuery('x', 'rest', 'get', '/api', ''),
+            InterfaceQuery('z', 'rest'),
+            InterfaceQuery('y', 'rest', 'post'),
+            InterfaceQuery('x', 'rest', secondary='/api'),
+        ])
+        self.assertListEqual(
+            [
+                ([c for c, _ in usage.consumers], [c for c, _ in usage.producers])
+                for usage
+                in usages
+            ],
+            [(['a'], ['c']), (['d'], ['b']), ([], []), (['a'], ['c'])],
+        )
+        self.assertTrue(usages[1].consumers[0][1].optional)
+
+
+if __name__ == '__main__':
+    unittest.main()
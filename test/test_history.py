@@ -0,0 +1,132 @@
+from dataclasses import replace
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from psycopg2.errors import RaiseException
+
+from service.database.history import (
+    ComponentDiff,
+    HistoryUnavailable,
+    get_components_at,
+    get_generation_at,
+    get_history,
+    get_history_diff,
+)
+from service.database.queries import (
+    create_history_partitions,
+    get_components,
+    maintain_history,
+    set_interface,
+    set_interfaces,
+)
+from test.database import DatabaseTestCase
+from test.test_set_interface import consumer, producer
+
+
+class HistoryTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.states = {0: []}
+        self.change('a', [], [producer('x'), producer('y')])
+        self.change('b', [consumer('x')], [])
+        self.change('a', [], [producer('x'), replace(producer('y'), deprecated=True)])
+        self.change('b', [], [])
+
+    def change(self, component, consumers, producers):
+        update = set_interface(self.connection, component, consumers, producers)
+        self.states[update.generation] = get_components(self.connection)
+        self.connection.commit()
+
+    def test_records_deltas(self):
+        entries, next_before = get_history(self.connection)
+        self.assertEqual([(e.generation, e.component) for e in entries], [(4, 'b'), (3, 'a'), (2, 'b'), (1, 'a')])
+        self.assertIsNone(next_before)
+        self.assertEqual(entries[1].added_producers, [replace(producer('y'), deprecated=True)])
+        self.assertEqual(entries[1].removed_producers, [producer('y')])
+        self.assertEqual(entries[0].removed_consumers, [consumer('x')])
+
+        entries, next_before = get_history(self.connection, component='a', limit=1)
+        self.assertEqual([e.generation for e in entries], [3])
+        entries, next_before = get_history(self.connection, component='a', before=next_before, limit=1)
+        self.assertEqual(([e.generation for e in entries], next_before), ([1], None))
+
+    def test_unchanged_declaration_records_nothing(self):
+        set_interface(self.connection, 'a', [], [producer('x'), replace(producer('y'), deprecated=True)])
+        self.assertEqual(len(get_history(self.connection)[0]), 4)
+
+    def test_components_at_generation(self):
+        for generation, components in self.states.items():
+            with self.subTest(generation=generation):
+                self.assertEqual(get_components_at(self.connection, generation), components)
+        with self.assertRaises(HistoryUnavailable):
+            get_components_at(self.connection, 5)
+
+    def test_generation_at_time(self):
+        self.assertEqual(get_generation_at(self.connection, datetime.now(timezone.utc)), 4)
+        entries, _ = get_history(self.connection, component='b')
+        self.assertEqual(get_generation_at(self.connection, entries[-1].changed_at), 2)
+        with self.assertRaises(HistoryUnavailable):
+            get_generation_at(self.connection, datetime(2000, 1, 1, tzinfo=timezone.utc))
+
+    def test_diff(self):
+        self.assertEqual(get_history_diff(self.connection, 1, 4), [
+            ComponentDiff('a', [], [], [replace(producer('y'), deprecated=True)], [producer('y')]),
+        ])
+        self.assertEqual(get_history_diff(self.connection, 4, 2), [
+            ComponentDiff('a', [], [], [producer('y')], [replace(producer('y'), deprecated=True)]),
+            ComponentDiff('b', [consumer('x')], [], [], []),
+        ])
+        self.assertEqual(get_history_diff(self.connection, 3, 3), [])
+        with self.assertRaises(HistoryUnavailable):
+            get_history_diff(self.connection, 0, 5)
+
+    def test_checkpoints(self):
+        with patch('service.database.queries.HISTORY_CHECKPOINT_INTERVAL', 2):
+            self.change('c', [], [producer('z')])
+            self.change('c', [consumer('x')], [])
+            # writes never create checkpoints themselves
+            self.assertEqual(maintain_history(self.connection), 6)
+            self.assertIsNone(maintain_history(self.connection))
+            set_interfaces(self.connection, {'a': ([], []), 'c': ([], [])})
+        self.states[7] = []
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT generation, count(component) FROM history_checkpoints '
+                           'LEFT JOIN history_checkpoint_components USING (generation) GROUP BY generation;')
+            self.assertEqual(sorted(cursor.fetchall()), [(0, 0), (6, 2)])
+            # the states before the oldest checkpoint are no longer available
+            cursor.execute('DELETE FROM history_checkpoints WHERE generation < 6;')
+        self.connection.commit()
+        for generation, components in self.states.items():
+            with self.subTest(generation=generation):
+                if generation < 6:
+                    with self.assertRaises(HistoryUnavailable):
+                        get_components_at(self.connection, generation)
+                else:
+                    self.assertEqual(get_components_at(self.connection, generation), components)
+        with self.assertRaises(HistoryUnavailable):
+            get_history_diff(self.connection, 4, 7)
+
+    def test_partition_of_rows_in_the_default_partition(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT 'history_' || to_char(now(), 'YYYY_MM');")
+            partition, = cursor.fetchone()
+            # drops the changes of setUp as well
+            cursor.execute(f'DROP TABLE {partition};')
+        self.connection.commit()
+        self.change('c', [], [producer('z')])
+
+        create_history_partitions(self.connection)
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM history_default;')
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute(f'SELECT count(*) FROM {partition};')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.connection.commit()
+        self.assertEqual([e.generation for e in get_history(self.connection)[0]], [5])
+        self.test_history_is_append_only()
+
+    def test_history_is_append_only(self):
+        with self.assertRaises(RaiseException):
+            with self.connection.cursor() as cursor:
+                cursor.execute('DELETE FROM history;')
+        self.connection.rollback()
@@ -0,0 +1,74 @@
+import unittest
+
+from service.database.queries import set_interface, InterfaceEntryConflict
+from service.util import metrics
+from service.util.metrics import Counter, Histogram, Registry
+from test.database import DatabaseTestCase
+from test.test_set_interface import consumer, producer
+
+
+class MetricsTest(unittest.TestCase):
+    def test_histogram(self):
+        histogram = Histogram('duration_seconds', 'Duration.', ('phase',), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value, 'parse')
+        self.assertEqual(histogram.count('parse'), 4)
+        self.assertListEqual(histogram.render(), [
+            '# HELP duration_seconds Duration.',
+            '# TYPE duration_seconds histogram',
+            'duration_seconds_bucket{phase="parse",le="0.1"} 2',
+            'duration_seconds_bucket{phase="parse",le="1.0"} 3',
+            'duration_seconds_bucket{phase="parse",le="+Inf"} 4',
+            'duration_seconds_sum{phase="parse"} 2.65',
+            'duration_seconds_count{phase="parse"} 4',
+        ])
+
+    def test_counter(self):
+        registry = Registry()
+        counter = registry.register(Counter('rows_total', 'Rows.', ('operation',)))
+        counter.inc('inserted', amount=3)
+        counter.inc('say "hi"\n')
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP rows_total Rows.',
+            '# TYPE rows_total counter',
+            'rows_total{operation="inserted"} 3',
+            'rows_total{operation="say \\"hi\\"\\n"} 1',
+        ]) + '\n')
+
+    def test_phases_of_a_request(self):
+        timings = metrics.start_request()
+        try:
+            for _ in range(2):
+                with metrics.phase('test_parse'):
+                    pass
+            metrics.count_rows('test_inserted', 2)
+        finally:
+            self.assertIs(metrics.end_request(), timings)
+        self.assertListEqual(list(timings.phases), ['test_parse'])
+        self.assertRegex(timings.server_timing(), r'^test_parse;dur=[0-9.]+, total;dur=[0-9.]+$')
+        self.assertEqual(metrics.PHASE_DURATION.count('test_parse'), 1)
+        self.assertEqual(metrics.ROWS_WRITTEN.value('test_inserted'), 2)
+        self.assertIsNone(metrics.end_request())
+
+
+class SetInterfaceMetricsTest(DatabaseTestCase):
+    def test_phases_and_rows(self):
+        timings = metrics.start_request()
+        self.addCleanup(metrics.end_request)
+        set_interface(self.connection, 'a', [], [producer('x'), producer('y')])
+        set_interface(self.connection, 'a', [], [producer('x'), producer('z')])
+        self.assertEqual(timings.counts, {'rows_deleted': 1, 'rows_inserted': 3})
+        self.assertTrue({'diff', 'lock', 'write', 'conflicts', 'commit'}.issubset(timings.phases))
+
+    def test_rolled_back_rows_are_not_counted(self):
+        set_interface(self.connection, 'a', [], [producer('x')])
+        set_interface(self.connection, 'b', [consumer('x')], [])
+        timings = metrics.start_request()
+        self.addCleanup(metrics.end_request)
+        with self.assertRaises(InterfaceEntryConflict):
+            set_interface(self.connection, 'a', [], [])
+        self.assertEqual(timings.counts, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import json
+import os
+import unittest
+
+import yaml
+from jsonschema import ValidationError
+
+from service.util.parse_interfaces_json import JsonParser, JsonLinesParser
+from service.util.parse_interfaces_yaml import YamlParser
+from test.test_parse_yaml import TESTDATA_DIR, CONSUMER1_YAML, PRODUCER1_YAML, MIXED_YAML
+
+
+def load_declarations(filename: str) -> list:
+    with open(os.path.join(TESTDATA_DIR, filename), 'rb') as yaml_file:
+        return list(yaml.safe_load_all(yaml_file))
+
+
+class ParseInterfacesJsonTest(unittest.TestCase):
+    def test_same_records_as_yaml(self):
+        for filename in (CONSUMER1_YAML, PRODUCER1_YAML, MIXED_YAML):
+            with self.subTest(filename):
+                with open(os.path.join(TESTDATA_DIR, filename), 'rb') as yaml_file:
+                    expected = YamlParser().parse(yaml_file)
+                declarations = load_declarations(filename)
+                json_lines = '\n'.join(json.dumps(declaration) for declaration in declarations) + '\n'
+
+                self.assertEqual(JsonParser().parse(json.dumps(declarations)), expected)
+                self.assertEqual(JsonLinesParser().parse(json_lines.encode()), expected)
+
+    def test_single_declaration(self):
+        declaration, = load_declarations(CONSUMER1_YAML)
+        self.assertEqual(JsonParser().parse(json.dumps(declaration)), JsonParser().parse(json.dumps([declaration])))
+
+    def test_invalid_declaration(self):
+        with self.assertRaises(ValidationError):
+            JsonParser().parse('[{"kind": "InterfaceDeclaration"}]')
+        with self.assertRaises(ValidationError):
+            JsonLinesParser().parse('{"apiVersion": 1, "kind": "InterfaceDeclaration"}\n[]')
+        with self.assertRaises(json.JSONDecodeError):
+            JsonLinesParser().parse('{"apiVersion": 1,\n"kind": "InterfaceDeclaration"}')
+
+
+if __name__ == '__main__':
+    unittest.main()
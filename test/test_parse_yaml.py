@@ -1,7 +1,9 @@
 import os
 import unittest
 
-from service.util.parse_interfaces import ConsumerRecord, ProducerRecord
+import yaml
+
+from service.util.parse_interfaces import ConsumerRecord, ProducerRecord, DeclarationLimitExceeded
 from service.util.parse_interfaces_yaml import YamlParser
 
 TESTDATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
@@ -63,3 +65,64 @@ class ParseInterfacesYamlTest(unittest.TestCase):
                     consumer_records, producer_records = YamlParser().parse(yaml_file)
                     self.assertListEqual(consumer_records, expected_consumer_records)
                     self.assertListEqual(producer_records, expected_producer_records)
+
+    @unittest.skipUnless(yaml.__with_libyaml__, 'libyaml not available')
+    def test_pure_python_loader_gives_identical_results(self):
+        class PurePythonYamlParser(YamlParser):
+            LOADER = yaml.SafeLoader
+
+        self.assertIs(YamlParser.LOADER, yaml.CSafeLoader)
+        for filename in (CONSUMER1_YAML, PRODUCER1_YAML, MIXED_YAML):
+            with self.subTest(filename):
+                with open(os.path.join(TESTDATA_DIR, filename), 'rb') as yaml_file:
+                    content = yaml_file.read()
+                self.assertEqual(YamlParser().parse(content), PurePythonYamlParser().parse(content))
+
+
+class ParseLimitsTest(unittest.TestCase):
+    def read(self, filename: str) -> bytes:
+        with open(os.path.join(TESTDATA_DIR, filename), 'rb') as yaml_file:
+            return yaml_file.read()
+
+    def test_within_limits(self):
+        self.assertEqual(YamlParser(max_documents=3, max_records=4).parse(self.read(MIXED_YAML)),
+                         YamlParser().parse(self.read(MIXED_YAML)))
+
+    def test_max_documents(self):
+        with self.assertRaises(DeclarationLimitExceeded):
+            YamlParser(max_documents=2).parse(self.read(MIXED_YAML))
+
+    def test_max_records(self):
+        with self.assertRaises(DeclarationLimitExceeded):
+            YamlParser(max_records=3).parse(self.read(MIXED_YAML))
+
+    def test_documents_are_read_until_the_limit_is_exceeded(self):
+        document = yaml.safe_load(self.read(CONSUMER1_YAML))
+        read = []
+
+        def documents():
+            while True:
+                read.append(document)
+                yield document
+
+        with self.assertRaises(DeclarationLimitExceeded):
+            YamlParser(max_documents=10)._parse_documents(documents())
+        self.assertEqual(len(read), 11)
+
+    def test_records_are_converted_until_the_limit_is_exceeded(self):
+        converted = []
+
+        class CountingParser(YamlParser):
+            def _parse_consumer(self, sub_component, consumer):
+                for record in super()._parse_consumer(sub_component, consumer):
+                    converted.append(record)
+                    yield record
+
+        document = {
+            'apiVersion': 1,
+            'kind': 'InterfaceDeclaration',
+            'consumers': [{'host': 'x', 'type': 'rest', 'values': [{'primary': str(i)} for i in range(100)]}],
+        }
+        with self.assertRaises(DeclarationLimitExceeded):
+            CountingParser(max_records=10)._parse_documents([document])
+        self.assertEqual(len(converted), 11)
@@ -0,0 +1,68 @@
+import threading
+import unittest
+
+from service.database.pool import ConnectionPool, PoolTimeout
+from test.database import DatabaseTestCase, connection_kwargs
+
+
+class ConnectionPoolTest(DatabaseTestCase):
+    def create_pool(self, **kwargs):
+        pool = ConnectionPool(connection_kwargs(), **kwargs)
+        self.addCleanup(pool.closeall)
+        return pool
+
+    def test_reuses_connections(self):
+        pool = self.create_pool(min_size=1, max_size=2)
+        connection = pool.getconn()
+        pool.putconn(connection)
+        self.assertIs(pool.getconn(), connection)
+        stats = pool.stats()
+        self.assertEqual((stats.size, stats.in_use, stats.idle, stats.connections_opened), (1, 1, 0, 1))
+
+    def test_checkout_timeout(self):
+        pool = self.create_pool(min_size=0, max_size=1, timeout=0.1)
+        connection = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats().checkout_failures, 1)
+        pool.putconn(connection)
+
+    def test_waiting_checkout_gets_returned_connection(self):
+        pool = self.create_pool(min_size=0, max_size=1, timeout=5)
+        connection = pool.getconn()
+        threading.Timer(0.05, pool.putconn, args=(connection,)).start()
+        self.assertIs(pool.getconn(), connection)
+        self.assertGreater(pool.stats().wait_time_max, 0)
+
+    def test_recycles_after_max_uses(self):
+        pool = self.create_pool(min_size=0, max_size=1, max_uses=2)
+        connection = pool.getconn()
+        pool.putconn(connection)
+        self.assertIs(pool.getconn(), connection)
+        pool.putconn(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.getconn(), connection)
+        self.assertEqual(pool.stats().connections_recycled, 1)
+
+    def test_discards_broken_connections_on_checkout(self):
+        pool = self.create_pool(min_size=1, max_size=1)
+        connection = pool.getconn()
+        pool.putconn(connection)
+        connection.close()
+        self.assertIsNot(pool.getconn(), connection)
+        self.assertEqual(pool.stats().connections_discarded, 1)
+
+    def test_rolls_back_returned_connections(self):
+        pool = self.create_pool(min_size=0, max_size=1)
+        connection = pool.getconn()
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO fingerprints VALUES (%s, %s)', ('c', 'f'))
+        pool.putconn(connection)
+        connection = pool.getconn()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM fingerprints')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
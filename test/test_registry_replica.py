@@ -0,0 +1,121 @@
+import time
+from unittest.mock import patch
+
+from service.database.queries import (
+    ComponentFilter,
+    InterfaceQuery,
+    get_components_snapshot,
+    get_filtered_components,
+    get_interface_usages,
+    set_interface,
+    set_interfaces,
+)
+from service.database.registry_model import RegistryModel
+from service.database.registry_replica import RegistryReplica
+from test.database import DatabaseTestCase, connection_kwargs
+from test.test_set_interface import consumer, producer
+
+
+class RegistryModelTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        set_interface(self.connection, 'c', [], [producer('x'), producer('y', 'sub')])
+        set_interface(self.connection, 'a', [consumer('x')], [])
+        set_interface(self.connection, 'b', [consumer('y'), consumer('x', 'sub')], [producer('z')])
+        set_interface(self.connection, 'd', [consumer('z', optional=True)], [producer('x', 'sub')])
+        self.model = RegistryModel()
+        self.model.load(*get_components_snapshot(self.connection))
+
+    def assert_answers_like_database(self):
+        for component_filter in (
+                ComponentFilter(),
+                ComponentFilter(component='b'),
+                ComponentFilter(component='b', include_consumers=False),
+                ComponentFilter(sub_component='sub'),
+                ComponentFilter(interface_host='x', include_producers=False),
+                ComponentFilter(interface_type='rest', primary='ge', secondary='/a'),
+                ComponentFilter(primary='g_'),
+        ):
+            for after, limit in ((None, None), (None, 2), ('b', 1)):
+                with self.subTest(component_filter=component_filter, after=after, limit=limit):
+                    generation, components, next_after = self.model.get_filtered_components(
+                        component_filter, after, limit)
+                    self.assertEqual(
+                        (components, next_after),
+                        get_filtered_components(self.connection, component_filter, after, limit),
+                    )
+        queries = [
+            InterfaceQuery('x', 'rest'),
+            InterfaceQuery('x', 'rest', 'get', '/a', ''),
+            InterfaceQuery('y', 'rest', primary='post'),
+            InterfaceQuery('unknown', 'rest'),
+        ]
+        generation, usages = self.model.get_interface_usages(queries)
+        self.assertListEqual(usages, get_interface_usages(self.connection, queries))
+        self.connection.commit()
+        self.assertEqual((generation, self.model.get_components_snapshot()[1]),
+                         get_components_snapshot(self.connection))
+
+    def test_answers_like_database(self):
+        self.assert_answers_like_database()
+
+    def test_update_replaces_components(self):
+        set_interface(self.connection, 'b', [consumer('x')], [])
+        set_interface(self.connection, 'd', [], [])
+        generation, components = get_components_snapshot(self.connection)
+        self.model.update(generation, ['b', 'd'], [c for c in components if c.name in ('b', 'd')])
+        self.assertEqual(self.model.stats_dict(), dict(generation=generation, components=3, interfaces=2))
+        self.assert_answers_like_database()
+
+
+class RegistryReplicaTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        set_interface(self.connection, 'a', [], [producer('x')])
+        self.now = 0.0
+        self.replica = RegistryReplica(connection_kwargs(), max_staleness=5, clock=lambda: self.now)
+        self.addCleanup(self.replica.stop)
+        self.replica.open()
+
+    def assert_current(self):
+        self.assertEqual(self.replica.model.get_components_snapshot(), get_components_snapshot(self.connection))
+
+    def test_changes_are_applied_incrementally(self):
+        set_interface(self.connection, 'b', [consumer('x')], [producer('y')])
+        set_interface(self.connection, 'c', [consumer('y')], [])
+        set_interface(self.connection, 'c', [], [])
+        self.replica.synchronize()
+        self.assert_current()
+        self.assertEqual((self.replica.reloads, self.replica.updates), (1, 1))
+
+    def test_missing_notification_reloads(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('UPDATE registry_generation SET generation = generation + 1;')
+        self.connection.commit()
+        with patch('service.database.registry_replica.NOTIFICATION_DELAY_SECONDS', 0.1):
+            self.replica.synchronize()
+        self.assert_current()
+        self.assertEqual(self.replica.reloads, 2)
+
+    def test_too_many_components_to_notify_reload(self):
+        set_interfaces(self.connection, {f'component-{i:080d}': ([consumer('x')], []) for i in range(100)})
+        self.replica.synchronize()
+        self.assert_current()
+        self.assertEqual(self.replica.reloads, 2)
+
+    def test_model_is_only_used_while_confirmed(self):
+        self.assertIs(self.replica.current_model(), self.replica.model)
+        self.now = 5.5
+        self.assertIsNone(self.replica.current_model())
+        self.replica.synchronize()
+        self.assertIs(self.replica.current_model(), self.replica.model)
+        self.assertEqual((self.replica.reloads, self.replica.updates), (1, 0))
+
+    def test_thread_follows_changes(self):
+        self.replica.close()
+        self.replica.start()
+        update = set_interface(self.connection, 'b', [consumer('x')], [])
+        deadline = time.monotonic() + 5
+        while self.replica.model.generation != update.generation and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assert_current()
@@ -0,0 +1,119 @@
+import os
+import unittest
+
+from flask import Flask
+from psycopg2 import OperationalError, connect
+from psycopg2.extensions import parse_dsn
+
+import service.database
+from service.config import get_config
+from service.database import HEADER_READ_FROM_PRIMARY, get_replica_pools, read_db_connection, teardown_db_connection
+from service.database.initialization_queries import SQL_DROP_ALL, SQL_INIT_TABLES
+from service.database.pool import ConnectionPool
+from service.database.queries import get_components, set_interface
+from service.database.replicas import ReplicaPools
+from test.database import DatabaseTestCase, connection_kwargs
+from test.test_set_interface import producer
+
+# e.g. 'port=5433' for a second local postgres instance, see README
+REPLICA_DSN = os.environ.get('TEST_REPLICA_DSN')
+UNREACHABLE_DSN = 'host=localhost port=1 connect_timeout=1'
+
+
+class FakePool:
+    def __init__(self, name: str):
+        self.name = name
+        self.down = False
+
+    def getconn(self):
+        if self.down:
+            raise OperationalError(f'{self.name} is down')
+        return self.name
+
+    def stats_dict(self) -> dict:
+        return {}
+
+
+class ReplicaPoolsTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.pools = [FakePool('a'), FakePool('b'), FakePool('c')]
+        self.replica_pools = ReplicaPools(self.pools, ['a', 'b', 'c'], retry_seconds=10, clock=lambda: self.now)
+
+    def connections(self, num: int):
+        return [self.replica_pools.getconn()[1] for _ in range(num)]
+
+    def test_round_robin(self):
+        self.assertListEqual(self.connections(4), ['a', 'b', 'c', 'a'])
+
+    def test_failing_replica_is_ejected_until_retry(self):
+        self.pools[1].down = True
+        self.assertListEqual(self.connections(4), ['a', 'c', 'c', 'a'])
+        self.pools[1].down = False
+        self.now = 9
+        self.assertNotIn('b', self.connections(3))
+        self.now = 10
+        self.assertIn('b', self.connections(3))
+        self.assertListEqual([s['ejections'] for s in self.replica_pools.stats_dicts()], [0, 1, 0])
+
+    def test_no_replica_available(self):
+        for pool in self.pools:
+            pool.down = True
+        self.assertIsNone(self.replica_pools.getconn())
+
+
+class ReadConnectionTest(DatabaseTestCase):
+    def create_app(self, replica_dsns):
+        app = Flask(__name__)
+        app.config.from_object(get_config())
+        app.config['POSTGRES_DB_REPLICA_DSNS'] = replica_dsns
+        app.teardown_request(teardown_db_connection)
+        self.addCleanup(self.close_replica_pools)
+        return app
+
+    @staticmethod
+    def close_replica_pools():
+        if service.database._REPLICA_POOLS is not None:
+            service.database._REPLICA_POOLS.closeall()
+            service.database._REPLICA_POOLS = None
+
+    def read_components(self, app, headers=None):
+        with app.test_request_context(headers=headers):
+            return [component.name for component in get_components(read_db_connection)]
+
+    def test_unreachable_replicas_fall_back_to_primary(self):
+        set_interface(self.connection, 'on_primary', [], [producer('x')])
+        app = self.create_app([UNREACHABLE_DSN])
+        self.assertListEqual(self.read_components(app), ['on_primary'])
+        with app.app_context():
+            replica_stats, = get_replica_pools().stats_dicts()
+        self.assertTrue(replica_stats['ejected'])
+        self.assertEqual(replica_stats['replica'], 'localhost:1/' + connection_kwargs()['dbname'])
+
+    def test_healthy_replica_is_used_instead_of_unreachable_one(self):
+        pools = [
+            ConnectionPool(dict(connection_kwargs(), host='localhost', port=1, connect_timeout=1), min_size=0),
+            ConnectionPool(connection_kwargs(), min_size=0),
+        ]
+        replica_pools = ReplicaPools(pools, ['unreachable', 'replica'])
+        self.addCleanup(replica_pools.closeall)
+        for _ in range(3):
+            pool, connection = replica_pools.getconn()
+            self.assertIs(pool, pools[1])
+            pool.putconn(connection)
+        self.assertEqual(pools[0].stats().checkout_failures, 1)
+
+    @unittest.skipIf(REPLICA_DSN is None, 'TEST_REPLICA_DSN is not set')
+    def test_reads_from_replica_unless_pinned_to_primary(self):
+        replica = connect(**{**connection_kwargs(), **parse_dsn(REPLICA_DSN)})
+        self.addCleanup(replica.close)
+        with replica.cursor() as cursor:
+            cursor.execute(SQL_DROP_ALL)
+            cursor.execute(SQL_INIT_TABLES)
+        replica.commit()
+        set_interface(replica, 'on_replica', [], [producer('x')])
+        set_interface(self.connection, 'on_primary', [], [producer('x')])
+
+        app = self.create_app([REPLICA_DSN])
+        self.assertListEqual(self.read_components(app), ['on_replica'])
+        self.assertListEqual(self.read_components(app, {HEADER_READ_FROM_PRIMARY: 'true'}), ['on_primary'])
@@ -0,0 +1,352 @@
+import threading
+import unittest
+from dataclasses import replace
+
+from service.database.initialization_queries import (
+    SQL_DROP_ALL,
+    SQL_MIGRATE_C_COLLATION,
+    SQL_MIGRATE_FINGERPRINTS,
+    SQL_MIGRATE_HISTORY,
+    SQL_MIGRATE_INTERFACE_IDS,
+    SQL_MIGRATE_REGISTRY_GENERATION,
+)
+from service.database.queries import (
+    STAGED_ANALYZE_ROWS,
+    check_interface,
+    get_components,
+    get_generation,
+    get_components_snapshot,
+    set_interface,
+    InterfaceEntryConflict,
+    UnsatisfiedConsumer,
+    set_interfaces,
+    _create_staging_tables,
+    build_declaration,
+    _write_interfaces,
+)
+from service.util.parse_interfaces import Component, ConsumerRecord, ProducerRecord
+from test.database import DatabaseTestCase
+
+
+def producer(host: str, sub_component: str = '') -> ProducerRecord:
+    return ProducerRecord(
+        sub_component=sub_component, interface_host=host, interface_type='rest',
+        primary='get', secondary='/api', tertiary='', deprecated=False,
+    )
+
+
+def consumer(host: str, sub_component: str = '', optional: bool = False) -> ConsumerRecord:
+    return ConsumerRecord(
+        sub_component=sub_component, interface_host=host, interface_type='rest',
+        primary='get', secondary='/api', tertiary='', optional=optional,
+    )
+
+
+def unsatisfied(component: str, host: str, sub_component: str = '') -> UnsatisfiedConsumer:
+    return UnsatisfiedConsumer(component, sub_component, host, 'rest', 'get', '/api', '')
+
+
+class SetInterfaceValidationTest(DatabaseTestCase):
+    def test_reports_all_consumers_without_producer(self):
+        with self.assertRaises(InterfaceEntryConflict) as context:
+            set_interface(self.connection, 'a', [consumer('x'), consumer('y'), consumer('z', optional=True)], [])
+        self.assertListEqual(context.exception.conflicts, [unsatisfied('a', 'x'), unsatisfied('a', 'y')])
+
+    def test_consumer_of_own_producer(self):
+        set_interface(self.connection, 'a', [consumer('x')], [producer('x')])
+
+    def test_reports_all_consumers_of_removed_producers(self):
+        set_interface(self.connection, 'a', [], [producer('x'), producer('y')])
+        set_interface(self.connection, 'b', [consumer('x'), consumer('y')], [])
+        set_interface(self.connection, 'c', [consumer('x', 'sub')], [])
+
+        with self.assertRaises(InterfaceEntryConflict) as context:
+            set_interface(self.connection, 'a', [], [])
+        self.assertListEqual(
+            context.exception.conflicts,
+            [unsatisfied('b', 'x'), unsatisfied('b', 'y'), unsatisfied('c', 'x', 'sub')],
+        )
+
+    def test_producer_can_move_between_sub_components(self):
+        set_interface(self.connection, 'a', [], [producer('x', 'sub1')])
+        set_interface(self.connection, 'b', [consumer('x')], [])
+        set_interface(self.connection, 'a', [], [producer('x', 'sub2')])
+
+    def test_producer_can_move_between_components(self):
+        set_interface(self.connection, 'a', [], [producer('x')])
+        set_interface(self.connection, 'b', [consumer('x')], [])
+        set_interface(self.connection, 'c', [], [producer('x')])
+        set_interface(self.connection, 'a', [], [])
+
+
+class SetInterfacesTest(DatabaseTestCase):
+    def test_order_of_components_does_not_matter(self):
+        updates = set_interfaces(self.connection, {
+            'a': ([consumer('x')], [producer('y')]),
+            'b': ([consumer('y')], [producer('x')]),
+        })
+        self.assertListEqual([(u.component, u.unchanged, u.generation) for u in updates], [
+            ('a', False, 1), ('b', False, 1)])
+
+    def test_all_or_nothing(self):
+        set_interface(self.connection, 'a', [], [producer('x')])
+        with self.assertRaises(InterfaceEntryConflict) as context:
+            set_interfaces(self.connection, {
+                'a': ([], [producer('x'), producer('y')]),
+                'b': ([consumer('y'), consumer('z')], []),
+                'c': ([consumer('w')], []),
+            })
+        self.assertListEqual(context.exception.conflicts, [
+            unsatisfied('b', 'z'), unsatisfied('c', 'w')])
+        self.assertEqual(get_generation(self.connection), 1)
+
+    def test_unchanged_components(self):
+        set_interface(self.connection, 'a', [], [producer('x')])
+        updates = set_interfaces(self.connection, {
+            'a': ([], [producer('x')]),
+            'b': ([consumer('x')], []),
+        })
+        self.assertListEqual([(u.component, u.unchanged, u.generation) for u in updates], [
+            ('a', True, None), ('b', False, 2)])
+
+
+class SetInterfaceStagingTest(DatabaseTestCase):
+    def test_reports_added_and_removed_rows(self):
+        update = set_interface(self.connection, 'a', [consumer('x', optional=True)], [producer('x'), producer('y')])
+        self.assertEqual((update.added, update.removed), (3, 0))
+        update = set_interface(self.connection, 'a', [consumer('x')], [producer('x'), producer('z')])
+        self.assertEqual((update.added, update.removed), (2, 2))
+        updates = set_interfaces(self.connection, {
+            'a': ([], [producer('x'), producer('z')]),
+            'b': ([consumer('z')], []),
+        })
+        self.assertListEqual([(u.component, u.added, u.removed) for u in updates], [('a', 0, 1), ('b', 1, 0)])
+
+    def test_values_needing_escapes(self):
+        special = ProducerRecord(
+            sub_component='sub\\\tcomponent', interface_host='host\nline', interface_type='rest\r',
+            primary='\\N', secondary='', tertiary='\\\\', deprecated=True,
+        )
+        set_interface(self.connection, 'a\tb', [], [special])
+        self.assertListEqual(get_components(self.connection), [Component('a\tb', consumers=[], producers=[special])])
+        self.assertTrue(set_interface(self.connection, 'a\tb', [], [special]).unchanged)
+        self.assertEqual(set_interface(self.connection, 'a\tb', [], []).removed, 1)
+
+    def test_large_declaration(self):
+        producers = [producer(f'host{i}') for i in range(STAGED_ANALYZE_ROWS + 1)]
+        self.assertEqual(set_interface(self.connection, 'a', [], producers).added, len(producers))
+        update = set_interface(self.connection, 'a', [consumer('host1')], producers[1:] + [producer('other')])
+        self.assertEqual((update.added, update.removed), (2, 1))
+
+    def test_staging_tables_are_empty_after_each_write(self):
+        set_interface(self.connection, 'a', [consumer('x')], [producer('x')])
+        with self.assertRaises(InterfaceEntryConflict):
+            set_interface(self.connection, 'b', [consumer('y')], [])
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT (SELECT count(*) FROM staged_consumers) + (SELECT count(*) FROM staged_producers);')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_staging_tables_outlive_a_failed_first_write(self):
+        with self.assertRaises(InterfaceEntryConflict):
+            set_interface(self.connection, 'b', [consumer('y')], [])
+        self.assertEqual(set_interface(self.connection, 'a', [consumer('x')], [producer('x')]).added, 2)
+
+
+class SetInterfaceUnchangedTest(DatabaseTestCase):
+    def test_unchanged_declaration_is_not_written(self):
+        self.assertFalse(set_interface(self.connection, 'a', [consumer('x')], [producer('x'), producer('y')]).unchanged)
+        self.assertTrue(set_interface(self.connection, 'a', [consumer('x')], [producer('y'), producer('x')]).unchanged)
+        self.assertFalse(set_interface(self.connection, 'a', [consumer('x')], [producer('x')]).unchanged)
+
+    def test_generation_is_incremented_by_changes(self):
+        self.assertEqual(get_generation(self.connection), 0)
+        self.assertEqual(set_interface(self.connection, 'a', [], [producer('x')]).generation, 1)
+        self.assertIsNone(set_interface(self.connection, 'a', [], [producer('x')]).generation)
+        with self.assertRaises(InterfaceEntryConflict):
+            set_interface(self.connection, 'b', [consumer('y')], [])
+        self.assertEqual(set_interface(self.connection, 'b', [consumer('x')], []).generation, 2)
+
+        generation, components = get_components_snapshot(self.connection)
+        self.assertEqual(generation, 2)
+        self.assertListEqual([component.name for component in components], ['a', 'b'])
+
+    def test_unchanged_declaration_takes_no_locks(self):
+        set_interface(self.connection, 'a', [], [producer('x')])
+        pending = self.connect()
+        _create_staging_tables(pending)
+        with pending.cursor() as cursor:
+            cursor.execute('LOCK TABLE consumers, producers IN ACCESS EXCLUSIVE MODE')
+        self.addCleanup(pending.rollback)
+        with self.connection.cursor() as cursor:
+            cursor.execute("SET lock_timeout = '1s'")
+
+        self.assertTrue(set_interface(self.connection, 'a', [], [producer('x')]).unchanged)
+
+    def test_failed_update_keeps_fingerprint(self):
+        set_interface(self.connection, 'a', [], [producer('x')])
+        set_interface(self.connection, 'b', [consumer('x')], [])
+        with self.assertRaises(InterfaceEntryConflict):
+            set_interface(self.connection, 'a', [], [])
+        self.assertTrue(set_interface(self.connection, 'a', [], [producer('x')]).unchanged)
+
+
+class InterfaceIdsTest(DatabaseTestCase):
+    def interface_keys(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT host FROM interfaces ORDER BY host')
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_interface_keys_are_stored_once(self):
+        set_interface(self.connection, 'a', [consumer('y')], [producer('x'), producer('y', 'sub')])
+        set_interface(self.connection, 'b', [consumer('x'), consumer('y', optional=True)], [producer('y')])
+        self.assertListEqual(self.interface_keys(), ['x', 'y'])
+
+    def test_unused_interface_keys_are_removed(self):
+        set_interface(self.connection, 'a', [], [producer('x'), producer('y')])
+        set_interface(self.connection, 'b', [consumer('x')], [])
+        set_interface(self.connection, 'a', [], [producer('x')])
+        self.assertListEqual(self.interface_keys(), ['x'])
+        with self.assertRaises(InterfaceEntryConflict):
+            set_interface(self.connection, 'a', [], [])
+        self.assertListEqual(self.interface_keys(), ['x'])
+
+    def test_migration(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(SQL_DROP_ALL)
+            cursor.execute('''
+                CREATE TABLE consumers (component TEXT, subcomponent TEXT, host TEXT, itype TEXT, iprimary TEXT,
+                                        isecondary TEXT, itertiary TEXT, optional BOOLEAN);
+                CREATE TABLE producers (component TEXT, subcomponent TEXT, host TEXT, itype TEXT, iprimary TEXT,
+                                        isecondary TEXT, itertiary TEXT, deprecated BOOLEAN);
+                INSERT INTO consumers VALUES ('b', '', 'x', 'rest', 'get', '/api', '', FALSE);
+                INSERT INTO producers VALUES ('a', 'sub', 'x', 'rest', 'get', '/api', '', TRUE);
+                CREATE TABLE fingerprints (component TEXT PRIMARY KEY, fingerprint TEXT NOT NULL);
+            ''')
+            cursor.execute(SQL_MIGRATE_FINGERPRINTS)
+            cursor.execute(SQL_MIGRATE_REGISTRY_GENERATION)
+            cursor.execute(SQL_MIGRATE_INTERFACE_IDS)
+            cursor.execute(SQL_MIGRATE_HISTORY)
+            cursor.execute(SQL_MIGRATE_C_COLLATION)
+            cursor.execute("SELECT DISTINCT collation_name FROM information_schema.columns "
+                           "WHERE column_name = 'component' AND table_schema = 'public'")
+            self.assertListEqual(cursor.fetchall(), [('C',)])
+        self.connection.commit()
+
+        self.assertEqual(get_components(self.connection), [
+            Component('a', [], [replace(producer('x', 'sub'), deprecated=True)]),
+            Component('b', [consumer('x')], []),
+        ])
+        with self.assertRaises(InterfaceEntryConflict):
+            set_interface(self.connection, 'a', [], [])
+
+
+class CheckInterfaceTest(DatabaseTestCase):
+    def test_reports_the_same_conflicts_as_set_interface(self):
+        set_interface(self.connection, 'a', [], [producer('x'), producer('y')])
+        set_interface(self.connection, 'b', [consumer('x'), consumer('y', optional=True)], [])
+        declaration = ('a', [consumer('z')], [producer('y')])
+
+        check = check_interface(self.connection, *declaration)
+        with self.assertRaises(InterfaceEntryConflict) as context:
+            set_interface(self.connection, *declaration)
+        self.assertFalse(check.unchanged)
+        self.assertListEqual(check.conflicts, context.exception.conflicts)
+        self.assertListEqual(check.conflicts, [unsatisfied('a', 'z'), unsatisfied('b', 'x')])
+
+    def test_accepted_declaration_is_not_written(self):
+        set_interface(self.connection, 'a', [], [producer('x')])
+        check = check_interface(self.connection, 'b', [consumer('x')], [])
+        self.assertListEqual(check.conflicts, [])
+        self.assertFalse(check.unchanged)
+        self.assertEqual(get_generation(self.connection), 1)
+        self.assertTrue(check_interface(self.connection, 'a', [], [producer('x')]).unchanged)
+
+    def test_does_not_wait_for_pending_uploads(self):
+        pending = self.connect()
+        _create_staging_tables(pending)
+        with pending.cursor() as cursor:
+            _write_interfaces(cursor, [build_declaration('a', [], [producer('x')])])
+        self.addCleanup(pending.rollback)
+
+        check = check_interface(self.connection, 'b', [consumer('x')], [])
+        self.assertListEqual(check.conflicts, [unsatisfied('b', 'x')])
+
+
+class SetInterfaceConcurrencyTest(DatabaseTestCase):
+    TIMEOUT = 10
+
+    def start_upload(self, component, consumers, producers) -> threading.Thread:
+        connection = self.connect()
+        thread = threading.Thread(target=set_interface, args=(connection, component, consumers, producers))
+        thread.start()
+        self.addCleanup(thread.join, self.TIMEOUT)
+        return thread
+
+    def open_upload(self, component, consumers, producers):
+        """
+        Writes the interface of the component without committing, so the transaction keeps holding its locks.
+        """
+        connection = self.connect()
+        _create_staging_tables(connection)
+        with connection.cursor() as cursor:
+            _write_interfaces(cursor, [build_declaration(component, consumers, producers)])
+        return connection
+
+    def test_uploads_of_unrelated_components_run_in_parallel(self):
+        pending = self.open_upload('a', [], [producer('service_a')])
+
+        uploads = [self.start_upload(c, [], [producer(f'service_{c}')]) for c in ('b', 'c', 'd')]
+        for upload in uploads:
+            upload.join(self.TIMEOUT)
+            self.assertFalse(upload.is_alive(), 'upload blocked by the pending upload of an unrelated component')
+        pending.commit()
+
+    def test_uploads_touching_the_same_interface_are_serialized(self):
+        pending = self.open_upload('a', [], [producer('service_a')])
+
+        upload = self.start_upload('b', [consumer('service_a')], [])
+        upload.join(0.5)
+        self.assertTrue(upload.is_alive(), 'upload did not wait for the pending producer of its interface')
+
+        pending.commit()
+        upload.join(self.TIMEOUT)
+        self.assertFalse(upload.is_alive())
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT component FROM consumers')
+            self.assertEqual(cursor.fetchall(), [('b',)])
+
+    def test_uploads_of_the_same_component_are_serialized(self):
+        pending = self.open_upload('a', [], [producer('service_a')])
+
+        upload = self.start_upload('a', [], [producer('service_b')])
+        upload.join(0.5)
+        self.assertTrue(upload.is_alive(), 'upload did not wait for the pending upload of the same component')
+
+        pending.commit()
+        upload.join(self.TIMEOUT)
+        self.assertFalse(upload.is_alive())
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT p.component, i.host FROM producers p JOIN interfaces i ON i.id = p.interface_id')
+            self.assertEqual(cursor.fetchall(), [('a', 'service_b')])
+
+    def test_identical_concurrent_upload_changes_nothing(self):
+        pending = self.open_upload('a', [], [producer('service_a')])
+        updates = []
+        connection = self.connect()
+        upload = threading.Thread(target=lambda: updates.append(
+            set_interface(connection, 'a', [], [producer('service_a')])))
+        upload.start()
+        self.addCleanup(upload.join, self.TIMEOUT)
+        upload.join(0.5)
+        self.assertTrue(upload.is_alive(), 'upload did not wait for the pending upload of the same component')
+
+        pending.commit()
+        upload.join(self.TIMEOUT)
+        update, = updates
+        self.assertTrue(update.unchanged)
+        self.assertIsNone(update.generation)
+        self.assertEqual(get_generation(self.connection), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import io
+import json
+
+from service.database.history import get_components_at, get_history
+from service.database.queries import (
+    InterfaceEntryConflict,
+    InterfaceEntryDuplication,
+    get_components,
+    get_generation,
+    set_interface,
+    build_declaration,
+)
+from service.database.snapshot import SnapshotFormatError, SnapshotHeader, export_snapshot, import_snapshot
+from test.database import DatabaseTestCase
+from test.test_set_interface import consumer, producer
+
+
+class SnapshotTest(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        set_interface(self.connection, 'a', [], [producer('x'), producer('y', 'sub')])
+        set_interface(self.connection, 'b', [consumer('x'), consumer('z', optional=True)], [])
+        # changes no rows, so it only stores the fingerprint
+        set_interface(self.connection, 'empty', [], [])
+        self.components = get_components(self.connection)
+        self.connection.commit()
+        self.snapshot = self.export()
+
+    def export(self) -> bytes:
+        file = io.BytesIO()
+        export_snapshot(self.connection, file)
+        return file.getvalue()
+
+    def import_snapshot(self, snapshot: bytes):
+        return import_snapshot(self.connection, io.BytesIO(snapshot))
+
+    def test_export(self):
+        header, *rows = self.snapshot.decode().splitlines()
+        self.assertEqual(json.loads(header), dict(
+            format='interfaces-snapshot', version=1, generation=2, consumers=2, producers=2, fingerprints=3))
+        self.assertEqual(rows[0], 'b\t\tx\trest\tget\t/api\t\tf')
+        self.assertEqual(len(rows), 7)
+
+    def test_round_trip(self):
+        set_interface(self.connection, 'b', [], [producer('w')])
+        set_interface(self.connection, 'c', [consumer('w')], [])
+        result = self.import_snapshot(self.snapshot)
+        self.assertEqual((result.source_generation, result.generation, result.components), (2, 5, ['b', 'c']))
+        self.assertEqual((result.removed, result.added), (2, 2))
+        self.assertEqual(get_components(self.connection), self.components)
+        self.connection.commit()
+        self.assertEqual(self.export().split(b'\n', 1)[1], self.snapshot.split(b'\n', 1)[1])
+        b = [consumer('x'), consumer('z', optional=True)]
+        self.assertTrue(set_interface(self.connection, 'b', b, []).unchanged)
+        self.assertTrue(set_interface(self.connection, 'empty', [], []).unchanged)
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT component FROM fingerprints ORDER BY component')
+            self.assertEqual(cursor.fetchall(), [('a',), ('b',), ('empty',)])
+
+        entries, _ = get_history(self.connection, before=6)
+        self.assertEqual([(e.generation, e.component) for e in entries[:2]], [(5, 'b'), (5, 'c')])
+        self.assertEqual(get_components_at(self.connection, 5), self.components)
+
+    def test_unchanged(self):
+        result = self.import_snapshot(self.snapshot)
+        self.assertEqual((result.generation, result.components, result.removed, result.added), (None, [], 0, 0))
+        self.assertEqual(get_generation(self.connection), 2)
+
+    def test_into_empty_database(self):
+        set_interface(self.connection, 'b', [], [])
+        set_interface(self.connection, 'a', [], [])
+        self.import_snapshot(self.snapshot)
+        self.assertEqual(get_components(self.connection), self.components)
+
+    def test_conflicts_change_nothing(self):
+        snapshot = self.snapshot.replace(b'b\t\tx\trest\tget\t/api\t\tf', b'b\t\tq\trest\tget\t/api\t\tf')
+        with self.assertRaises(InterfaceEntryConflict) as context:
+            self.import_snapshot(snapshot)
+        self.assertEqual([c.interface_host for c in context.exception.conflicts], ['q'])
+        with self.assertRaises(InterfaceEntryDuplication):
+            self.import_snapshot(self.snapshot.replace(b'\tz\t', b'\tx\t'))
+        self.assertEqual(get_components(self.connection), self.components)
+        self.assertEqual(get_generation(self.connection), 2)
+
+    def test_fingerprints_are_recomputed_from_the_rows(self):
+        stored = build_declaration('b', [consumer('x'), consumer('z', optional=True)], []).fingerprint
+        other = build_declaration('b', [consumer('x')], []).fingerprint
+        self.assertIn(stored.encode(), self.snapshot)
+        self.import_snapshot(self.snapshot.replace(stored.encode(), other.encode()))
+        self.assertFalse(set_interface(self.connection, 'b', [consumer('x')], []).unchanged)
+        self.assertEqual(get_components(self.connection)[1].consumers, [consumer('x')])
+
+    def test_invalid_files(self):
+        header, rows = self.snapshot.split(b'\n', 1)
+        for snapshot in (
+                b'',
+                b'{"format": "something else"}\n' + rows,
+                self.snapshot[:-10],
+                self.snapshot + b'more\trows\n',
+                self.snapshot.replace(b'\tf\n', b'\tmaybe\n', 1),
+                self.snapshot.replace(b'\tf\n', b'\t\\N\n', 1),
+        ):
+            with self.subTest(snapshot=snapshot):
+                with self.assertRaises(SnapshotFormatError):
+                    self.import_snapshot(snapshot)
+        self.assertEqual(get_components(self.connection), self.components)
+
+    def test_header(self):
+        file = io.BytesIO()
+        self.assertEqual(export_snapshot(self.connection, file), SnapshotHeader(2, 2, 2, 3))
@@ -0,0 +1,81 @@
+import copy
+import os
+import unittest
+
+import yaml
+from jsonschema import ValidationError
+
+from service.util.parse_interfaces import Parser
+from test.test_parse_yaml import TESTDATA_DIR, CONSUMER1_YAML, PRODUCER1_YAML, MIXED_YAML
+
+ODD_VALUES = (None, 0, 1, 2, 1.0, 1.5, True, False, '', 'x', 'InterfaceDeclaration', [], [{}], {}, {'x': 1})
+
+
+def load_declarations(filename: str) -> list:
+    with open(os.path.join(TESTDATA_DIR, filename), 'rb') as yaml_file:
+        return list(yaml.safe_load_all(yaml_file))
+
+
+def paths(value, path=()):
+    yield path
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from paths(item, path + (key,))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from paths(item, path + (i,))
+
+
+def replaced(document, path, new_value):
+    if not path:
+        return new_value
+    document = copy.deepcopy(document)
+    parent = document
+    for part in path[:-1]:
+        parent = parent[part]
+    if new_value is KeyError:
+        del parent[path[-1]]
+    else:
+        parent[path[-1]] = new_value
+    return document
+
+
+def mutations(document):
+    for path in paths(document):
+        for value in ODD_VALUES:
+            yield replaced(document, path, value)
+        if path and isinstance(path[-1], str):
+            yield replaced(document, path, KeyError)
+
+
+def error_summary(errors):
+    return sorted((tuple(e.absolute_path), e.validator, e.message) for e in errors)
+
+
+class ValidateInterfacesTest(unittest.TestCase):
+    def test_fast_validator_matches_jsonschema(self):
+        validator = Parser._schema_validator()
+        for filename in (CONSUMER1_YAML, PRODUCER1_YAML, MIXED_YAML):
+            for document in mutations(load_declarations(filename)):
+                with self.subTest(filename=filename, document=document):
+                    self.assertListEqual(
+                        error_summary(Parser._iter_errors_v1(document)),
+                        error_summary(validator.iter_errors(document)),
+                    )
+
+    def test_schema_validator_is_built_once(self):
+        self.assertIs(Parser._schema_validator(), Parser._schema_validator())
+
+    def test_reports_all_errors(self):
+        declarations = load_declarations(MIXED_YAML)
+        declarations[0]['apiVersion'] = 2
+        declarations[0]['consumers'][0]['values'][0]['optional'] = 'yes'
+        with self.assertRaises(ValidationError) as context:
+            Parser._validate_interfaces(declarations)
+        self.assertEqual(len(context.exception.context), 2)
+        self.assertIn('$[0].apiVersion: 2 is greater than the maximum of 1', str(context.exception))
+        self.assertIn("$[0].consumers[0].values[0].optional: 'yes' is not of type 'boolean'", str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()